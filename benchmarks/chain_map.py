@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import time
+from collections.abc import Mapping
+from copy import copy
+from typing import Any
+
+from xivo.chain_map import AccumulatingListChainMap, ChainMap
+
+REPEAT = 5
+PLUGIN_COUNT = 500
+
+
+class PreviousAccumulatingListChainMap(ChainMap):
+    # merge layer by layer, extending the lists of the previous layers
+    def _deep_update(self, original: dict, new: Mapping[str, Any]) -> dict:
+        updated = copy(original)
+
+        for key, value in new.items():
+            if key not in updated:
+                updated[key] = copy(value)
+            elif isinstance(updated[key], dict) and isinstance(value, dict):
+                updated[key] = self._deep_update(updated[key], value)
+            elif isinstance(updated[key], list) and isinstance(value, list):
+                updated[key].extend(copy(value))
+
+        return updated
+
+
+def _layer(i: int) -> dict[str, Any]:
+    return {
+        'enabled_plugins': [f'plugin_{i}_{j}' for j in range(PLUGIN_COUNT)],
+        'plugins': {
+            f'section_{j}': {'endpoints': [f'endpoint_{i}_{j}']} for j in range(50)
+        },
+        f'layer_{i}': {'value': i},
+    }
+
+
+def _build(chain_map_class: type[ChainMap], layer_count: int) -> float:
+    duration = 0.0
+    for _ in range(REPEAT):
+        # the previous implementation modifies the nested lists of the layers
+        layers = [_layer(i) for i in range(layer_count)]
+        start = time.perf_counter()
+        chain_map_class(*layers)
+        duration += time.perf_counter() - start
+    return duration / REPEAT
+
+
+def main() -> None:
+    print(f'accumulating {PLUGIN_COUNT} plugins per layer, previous and current')
+    for layer_count in (10, 100, 500):
+        previous = _build(PreviousAccumulatingListChainMap, layer_count)
+        current = _build(AccumulatingListChainMap, layer_count)
+        print(
+            f'{layer_count:>6} layers'
+            f' {previous * 1000:>10.1f} ms'
+            f' {current * 1000:>10.1f} ms'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import timeit
+
+from xivo.pubsub import Pubsub
+
+PUBLISH_COUNT = 10_000
+
+
+def _noop(message: str | None) -> None:
+    pass
+
+
+def wildcard_publish(subscription_count: int) -> float:
+    pubsub = Pubsub()
+    for i in range(subscription_count):
+        pubsub.subscribe(f'user.{i}.*', _noop)
+        pubsub.subscribe(f'call.{i}.#', _noop)
+
+    return timeit.timeit(
+        lambda: pubsub.publish('user.42.created', None), number=PUBLISH_COUNT
+    )
+
+
+def publish(subscriber_count: int, high_throughput: bool) -> float:
+    pubsub = Pubsub(high_throughput=high_throughput)
+    for _ in range(subscriber_count):
+        pubsub.subscribe('user.created', _noop)
+
+    return timeit.timeit(
+        lambda: pubsub.publish('user.created', None), number=PUBLISH_COUNT
+    )
+
+
+def main() -> None:
+    print('wildcard publish, 2 subscriptions per count')
+    for count in (10, 1_000, 10_000):
+        duration = wildcard_publish(count)
+        print(f'{count:>8} {PUBLISH_COUNT / duration:>12.0f} events/s')
+
+    print('publish, default and high throughput modes')
+    for count in (1, 100):
+        default = publish(count, high_throughput=False)
+        high_throughput = publish(count, high_throughput=True)
+        print(
+            f'{count:>8} subscribers'
+            f' {PUBLISH_COUNT / default:>12.0f} events/s'
+            f' {PUBLISH_COUNT / high_throughput:>12.0f} events/s'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import random
+import threading
+import time
+
+from xivo.moresynchro import POLICIES, RWLock
+
+OPERATION_COUNT = 20_000
+
+
+def _worker(lock: RWLock, read_ratio: float, barrier: threading.Barrier) -> None:
+    operations = [random.random() < read_ratio for _ in range(OPERATION_COUNT)]
+    barrier.wait()
+    for read in operations:
+        if read:
+            lock.acquire_read()
+        else:
+            lock.acquire_write()
+        lock.release()
+
+
+def contention(policy: str, thread_count: int, read_ratio: float) -> float:
+    lock = RWLock(policy)
+    barrier = threading.Barrier(thread_count + 1)
+    threads = [
+        threading.Thread(target=_worker, args=(lock, read_ratio, barrier))
+        for _ in range(thread_count)
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    for name, read_ratio in (('read heavy', 0.95), ('write heavy', 0.2)):
+        print(f'{name}, {read_ratio:.0%} reads')
+        for policy in POLICIES:
+            for thread_count in (1, 4, 16):
+                duration = contention(policy, thread_count, read_ratio)
+                operations = thread_count * OPERATION_COUNT
+                print(
+                    f'{policy:>16} {thread_count:>4} threads'
+                    f' {operations / duration:>12.0f} ops/s'
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,9 @@
 
 from __future__ import annotations
 
+import itertools
 from collections import UserDict
-from collections.abc import Mapping
+from collections.abc import Iterator, Mapping, Sequence
 from copy import copy
 from typing import Any
 
@@ -28,15 +29,99 @@ class ChainMap(UserDict):
 
 
 class AccumulatingListChainMap(ChainMap):
-    def _deep_update(self, original: dict, new: Mapping[str, Any]) -> dict:
-        updated = copy(original)
+    """
+    ChainMap concatenating the lists found under the same key in several
+    layers, in layer order.
 
-        for key, value in new.items():
-            if key not in updated:
-                updated[key] = copy(value)
-            elif isinstance(updated[key], dict) and isinstance(value, dict):
-                updated[key] = self._deep_update(updated[key], value)
-            elif isinstance(updated[key], list) and isinstance(value, list):
-                updated[key].extend(copy(value))
+    The values of every key are collected from all the layers before being
+    merged, so each list is built once and the layers are never modified.
+    """
 
-        return updated
+    def __init__(self, *dicts: Mapping[str, Any]) -> None:
+        self.data = self._accumulate(dicts)
+
+    def _accumulate(self, dicts: Sequence[Mapping[str, Any]]) -> dict:
+        values_by_key: dict[str, list[Any]] = {}
+        for d in dicts:
+            for key, value in d.items():
+                values_by_key.setdefault(key, []).append(value)
+
+        accumulated: dict[str, Any] = {}
+        for key, values in values_by_key.items():
+            first = values[0]
+            if isinstance(first, dict):
+                nested = [value for value in values if isinstance(value, dict)]
+                accumulated[key] = self._accumulate(nested)
+            elif isinstance(first, list):
+                lists = [value for value in values if isinstance(value, list)]
+                accumulated[key] = list(itertools.chain.from_iterable(lists))
+            else:
+                accumulated[key] = copy(first)
+        return accumulated
+
+
+class LazyChainMap(Mapping[str, Any]):
+    """
+    Read-only view of dicts merged like ChainMap, without copying them.
+
+    A value is looked up through the layers when it is first accessed.
+    Nested dicts found in several layers are returned as a LazyChainMap of
+    their own, and every resolved value is cached. Other values are shared
+    with the layers, which must not be modified while the view is in use.
+    materialize() returns the merged result as plain dicts.
+    """
+
+    def __init__(self, *dicts: Mapping[str, Any]) -> None:
+        self._dicts = dicts
+        self._resolved: dict[str, Any] = {}
+        self._keys: list[str] | None = None
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+
+        nested: list[dict] = []
+        for d in self._dicts:
+            if key not in d:
+                continue
+            value = d[key]
+            if isinstance(value, dict):
+                nested.append(value)
+            elif not nested:
+                break
+        else:
+            if not nested:
+                raise KeyError(key)
+            value = nested[0] if len(nested) == 1 else LazyChainMap(*nested)
+
+        self._resolved[key] = value
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return any(key in d for d in self._dicts)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._key_list())
+
+    def __len__(self) -> int:
+        return len(self._key_list())
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.materialize()!r})'
+
+    def _key_list(self) -> list[str]:
+        if self._keys is None:
+            self._keys = list(dict.fromkeys(key for d in self._dicts for key in d))
+        return self._keys
+
+    def materialize(self) -> dict[str, Any]:
+        result = {}
+        for key in self:
+            value = self[key]
+            if isinstance(value, LazyChainMap):
+                result[key] = value.materialize()
+            else:
+                result[key] = copy(value)
+        return result
@@ -3,10 +3,19 @@
 
 from __future__ import annotations
 
+import datetime
+import logging
+import marshal
 import os
 import subprocess
 import sys
-from collections.abc import Generator, Mapping, MutableMapping
+import tempfile
+import threading
+import time
+from collections.abc import Generator, Iterator, Mapping, MutableMapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
 from functools import partial
 from logging import Logger
 from typing import Any
@@ -15,25 +24,162 @@ import yaml
 
 from .chain_map import AccumulatingListChainMap, ChainMap
 
+logger = logging.getLogger(__name__)
+
+# (st_mtime_ns, st_size) of a file, None if it could not be read
+FileState = tuple[int, int] | None
+
 
 class _YAMLExecLoader(yaml.SafeLoader):
     pass
 
 
+_ExecLoader: type[yaml.SafeLoader | yaml.CSafeLoader] = _YAMLExecLoader
+_SafeLoader: type[yaml.SafeLoader | yaml.CSafeLoader] = yaml.SafeLoader
+
+if yaml.__with_libyaml__:
+
+    class _YAMLCExecLoader(yaml.CSafeLoader):
+        pass
+
+    # Same constructors as the pure Python loader, parsed by libyaml
+    _ExecLoader = _YAMLCExecLoader
+    _SafeLoader = yaml.CSafeLoader
+
+
 class _YAMLExecTag(yaml.YAMLObject):
     yaml_tag = '!exec'
-    yaml_loader = _YAMLExecLoader
+    yaml_loader = [_YAMLExecLoader, _ExecLoader]
 
     @classmethod
     def from_yaml(
-        cls, loader: yaml.SafeLoader | yaml.Loader | yaml.BaseLoader, node: yaml.Node
-    ) -> dict[str, Any] | None:
-        with open(os.devnull) as devnull:
-            for key, value in node.value:
-                if key.value == 'command':
-                    return yaml.safe_load(
-                        subprocess.check_output(value.value.split(' '), stderr=devnull)
-                    )
+        cls,
+        loader: yaml.SafeLoader | yaml.CSafeLoader | yaml.Loader | yaml.BaseLoader,
+        node: yaml.Node,
+    ) -> Any:
+        recorded_exec_tags = _recorded_exec_tags.get()
+        if recorded_exec_tags is not None:
+            recorded_exec_tags.append(node)
+
+        options = {key.value: value.value for key, value in node.value}
+        if 'command' not in options:
+            return None
+        command = options['command']
+        timeout = float(options['timeout']) if 'timeout' in options else None
+
+        runner = _deferring_runner.get()
+        if runner is None:
+            return yaml.load(_run_command(command, timeout), Loader=_SafeLoader)
+        return _PendingCommand(runner.submit(command, timeout))
+
+
+def _run_command(command: str, timeout: float | None) -> bytes:
+    return subprocess.run(
+        command.split(' '),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        timeout=timeout,
+        check=True,
+    ).stdout
+
+
+class _PendingCommand:
+    __slots__ = ('future',)
+
+    def __init__(self, future: Future[bytes]) -> None:
+        self.future = future
+
+
+class CommandRunner:
+    """
+    Run the commands of the !exec tags found in config files.
+
+    Within deferring(), a command starts in the background as soon as it is
+    parsed and the parsed value is a placeholder, so that all the commands
+    of a config hierarchy run concurrently. resolve() then waits for them
+    and replaces the placeholders with the parsed outputs.
+
+    Commands taking longer than timeout seconds are killed, a timeout key
+    next to the command overrides it. When cache_ttl is set, the output of
+    a command is reused for cache_ttl seconds.
+    """
+
+    DEFAULT_MAX_WORKERS = 8
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        timeout: float | None = None,
+        cache_ttl: float | None = None,
+    ) -> None:
+        self._max_workers = max_workers
+        self._timeout = timeout
+        self._cache_ttl = cache_ttl
+        self._cache: dict[str, tuple[float, bytes]] = {}
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def deferring(self) -> Iterator[None]:
+        token = _deferring_runner.set(self)
+        try:
+            yield
+        finally:
+            _deferring_runner.reset(token)
+
+    def submit(self, command: str, timeout: float | None = None) -> Future[bytes]:
+        with self._lock:
+            cached = self._cache.get(command)
+            if cached and cached[0] > time.monotonic():
+                future: Future[bytes] = Future()
+                future.set_result(cached[1])
+                return future
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self._max_workers, thread_name_prefix='ConfigCommand'
+                )
+            return self._executor.submit(self._run, command, timeout)
+
+    def resolve(self, data: Any) -> Any:
+        """Replace the placeholders in data, in place where possible"""
+        if isinstance(data, _PendingCommand):
+            return yaml.load(data.future.result(), Loader=_SafeLoader)
+        if isinstance(data, dict):
+            for key, value in data.items():
+                if isinstance(value, (_PendingCommand, dict, list)):
+                    data[key] = self.resolve(value)
+        elif isinstance(data, list):
+            for i, value in enumerate(data):
+                if isinstance(value, (_PendingCommand, dict, list)):
+                    data[i] = self.resolve(value)
+        return data
+
+    def _run(self, command: str, timeout: float | None) -> bytes:
+        output = _run_command(command, self._timeout if timeout is None else timeout)
+        if self._cache_ttl is not None:
+            with self._lock:
+                expiration = time.monotonic() + self._cache_ttl
+                self._cache[command] = (expiration, output)
+        return output
+
+
+_deferring_runner: ContextVar[CommandRunner | None] = ContextVar(
+    '_deferring_runner', default=None
+)
+# the !exec tags parsed within _recording_exec_tags()
+_recorded_exec_tags: ContextVar[list[yaml.Node] | None] = ContextVar(
+    '_recorded_exec_tags', default=None
+)
+
+
+@contextmanager
+def _recording_exec_tags() -> Iterator[list[yaml.Node]]:
+    exec_tags: list[yaml.Node] = []
+    token = _recorded_exec_tags.set(exec_tags)
+    try:
+        yield exec_tags
+    finally:
+        _recorded_exec_tags.reset(token)
 
 
 class ErrorHandler:
@@ -68,18 +214,142 @@ class PrintErrorHandler(ErrorHandler):
         print(f'Could not read config file {filename}: {e}', file=sys.stderr)
 
 
+def _file_state(path: str) -> FileState:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _is_config_filename(filename: str) -> bool:
+    return not filename.startswith('.') and filename.endswith('.yml')
+
+
+class ConfigSnapshotCache:
+    """
+    Keep the parsed files of a config hierarchy in a binary snapshot file,
+    so that an unchanged hierarchy is read without parsing any YAML.
+
+    The snapshot records the modification time and size of every file it
+    was built from, as well as of the extra config directory, and is
+    ignored as soon as one of them changes. Hierarchies using !exec are
+    never snapshotted, since the output of the commands may change.
+
+    The snapshot is written with marshal, which cannot run code when it is
+    loaded, unlike pickle.
+    """
+
+    VERSION = 3
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+
+    def load(self, key: tuple[Any, ...]) -> list[dict[str, Any]] | None:
+        try:
+            with open(self._path, 'rb') as f:
+                version, snapshot_key, states, tagged, configs = marshal.loads(f.read())
+            if tagged:
+                configs = _from_snapshot(configs)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.debug(
+                'ignoring invalid config snapshot %s', self._path, exc_info=True
+            )
+            return None
+
+        if version != self.VERSION or snapshot_key != key:
+            return None
+        for path, state in states:
+            if _file_state(path) != state:
+                return None
+        return configs
+
+    def save(
+        self,
+        key: tuple[Any, ...],
+        states: list[tuple[str, FileState]],
+        configs: list[dict[str, Any]],
+    ) -> None:
+        directory = os.path.dirname(self._path) or '.'
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.config-snapshot-')
+        except OSError as e:
+            logger.debug('could not write config snapshot %s: %s', self._path, e)
+            return
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                tagged_configs = _to_snapshot(configs)
+                # tags only need to be converted back when there are any
+                tagged = tagged_configs != configs
+                snapshot = (self.VERSION, key, states, tagged, tagged_configs)
+                marshal.dump(snapshot, f)
+            os.replace(tmp_path, self._path)
+        except Exception as e:
+            logger.debug('could not write config snapshot %s: %s', self._path, e)
+            os.unlink(tmp_path)
+
+
+# marshal has no timestamps, they are kept as 3-tuples starting with
+# _SNAPSHOT_TIMESTAMP. YAML only produces the 2-tuples of !!omap and !!pairs.
+_SNAPSHOT_TIMESTAMP = '!!timestamp'
+_SNAPSHOT_TIMESTAMP_TYPES: dict[str, type[datetime.date]] = {
+    'datetime': datetime.datetime,
+    'date': datetime.date,
+}
+
+
+def _to_snapshot(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {_to_snapshot(k): _to_snapshot(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_to_snapshot(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_to_snapshot(item) for item in value)
+    if isinstance(value, set):
+        return {_to_snapshot(item) for item in value}
+    if isinstance(value, datetime.datetime):
+        return (_SNAPSHOT_TIMESTAMP, 'datetime', value.isoformat())
+    if isinstance(value, datetime.date):
+        return (_SNAPSHOT_TIMESTAMP, 'date', value.isoformat())
+    return value
+
+
+def _from_snapshot(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {_from_snapshot(k): _from_snapshot(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_from_snapshot(item) for item in value]
+    if isinstance(value, tuple):
+        if len(value) == 3 and value[0] == _SNAPSHOT_TIMESTAMP:
+            _, name, text = value
+            return _SNAPSHOT_TIMESTAMP_TYPES[name].fromisoformat(text)
+        return tuple(_from_snapshot(item) for item in value)
+    if isinstance(value, set):
+        return {_from_snapshot(item) for item in value}
+    return value
+
+
 class ConfigParser:
-    def __init__(self, error_handler: ErrorHandler = PrintErrorHandler()) -> None:
+    def __init__(
+        self,
+        error_handler: ErrorHandler = PrintErrorHandler(),
+        snapshot_cache: ConfigSnapshotCache | None = None,
+        command_runner: CommandRunner | None = None,
+    ) -> None:
         self._error_handler = error_handler
+        self._snapshot_cache = snapshot_cache
+        self._command_runner = command_runner or CommandRunner()
 
     def parse_config_file(self, config_file_name: str) -> dict[str, Any]:
         try:
-            with open(config_file_name) as config_file:
-                data = yaml.load(config_file, Loader=_YAMLExecLoader)
-            return data if data else {}
+            data = self._load_config_file(config_file_name)
         except OSError as e:
             self._error_handler.on_parse_config_file_env_error(config_file_name, e)
             return {}
+        return self._resolve_config_file(config_file_name, data)
 
     def parse_config_dir(self, directory_name: str) -> list[dict[str, Any]]:
         """
@@ -95,19 +365,43 @@ class ConfigParser:
             self._error_handler.on_parse_config_dir_env_error(directory_name, e)
             return []
 
-        def _config_generator() -> Generator[dict[str, Any]]:
+        def _config_generator() -> Generator[tuple[str, Any]]:
             for filename in sorted(extra_config_filenames):
-                if filename.startswith('.'):
-                    continue
-                if not filename.endswith('.yml'):
+                if not _is_config_filename(filename):
                     continue
 
                 try:
-                    yield self.parse_config_file(full_path(filename))
+                    yield filename, self._load_config_file(full_path(filename))
+                except OSError as e:
+                    self._error_handler.on_parse_config_file_env_error(
+                        full_path(filename), e
+                    )
+                    yield filename, {}
                 except Exception as e:
                     self._error_handler.on_parse_config_dir_parse_exception(filename, e)
 
-        return list(_config_generator())
+        # parse every file before waiting for their commands, which then run
+        # concurrently
+        configs = []
+        for filename, data in list(_config_generator()):
+            try:
+                configs.append(self._resolve_config_file(full_path(filename), data))
+            except Exception as e:
+                self._error_handler.on_parse_config_dir_parse_exception(filename, e)
+        return configs
+
+    def _load_config_file(self, config_file_name: str) -> Any:
+        with open(config_file_name) as config_file:
+            with self._command_runner.deferring():
+                return yaml.load(config_file, Loader=_ExecLoader)
+
+    def _resolve_config_file(self, config_file_name: str, data: Any) -> dict[str, Any]:
+        try:
+            data = self._command_runner.resolve(data)
+        except OSError as e:
+            self._error_handler.on_parse_config_file_env_error(config_file_name, e)
+            return {}
+        return data if data else {}
 
     def read_config_file_hierarchy(
         self,
@@ -126,30 +420,81 @@ class ConfigParser:
         The extra config directory name is taken from
         config_file[extra_config_dir_key] else original_config[extra_config_dir_key].
         """
-
-        main_config_filename = original_config[config_file_key]
-        main_config = self.parse_config_file(main_config_filename)
-        extra_config_file_directory = ChainMap(main_config, original_config)[
-            extra_config_dir_key
-        ]
-        configs = self.parse_config_dir(extra_config_file_directory)
-        configs.append(main_config)
-
+        configs = self._read_config_files(
+            original_config, config_file_key, extra_config_dir_key, ChainMap
+        )
         return ChainMap(*configs)
 
     def read_config_file_hierarchy_accumulating_list(
         self, original_config: Mapping[str, Any]
     ) -> AccumulatingListChainMap:
-        main_config_filename = original_config['config_file']
-        main_config = self.parse_config_file(main_config_filename)
-        extra_config_file_directory = AccumulatingListChainMap(
-            main_config, original_config
-        )['extra_config_files']
-        configs = self.parse_config_dir(extra_config_file_directory)
-        configs.append(main_config)
-
+        configs = self._read_config_files(
+            original_config,
+            'config_file',
+            'extra_config_files',
+            AccumulatingListChainMap,
+        )
         return AccumulatingListChainMap(*configs)
 
+    def _read_config_files(
+        self,
+        original_config: Mapping[str, Any],
+        config_file_key: str,
+        extra_config_dir_key: str,
+        chain_map_class: type[ChainMap],
+    ) -> list[dict[str, Any]]:
+        main_config_filename = original_config[config_file_key]
+        snapshot_key = (main_config_filename, original_config.get(extra_config_dir_key))
+        if self._snapshot_cache:
+            snapshot = self._snapshot_cache.load(snapshot_key)
+            if snapshot is not None:
+                return snapshot
+
+        with _recording_exec_tags() as exec_tags:
+            main_config_state = _file_state(main_config_filename)
+            main_config = self.parse_config_file(main_config_filename)
+            extra_config_file_directory = chain_map_class(main_config, original_config)[
+                extra_config_dir_key
+            ]
+            states = [(main_config_filename, main_config_state)]
+            if self._snapshot_cache:
+                states.extend(_config_dir_states(extra_config_file_directory))
+            configs = self.parse_config_dir(extra_config_file_directory)
+            configs.append(main_config)
+
+        if (
+            self._snapshot_cache
+            and not exec_tags
+            and _can_snapshot(states, len(configs))
+        ):
+            self._snapshot_cache.save(snapshot_key, states, configs)
+        return configs
+
+
+def _config_dir_states(directory_name: str) -> list[tuple[str, FileState]]:
+    states = [(directory_name, _file_state(directory_name))]
+    try:
+        filenames = sorted(os.listdir(directory_name))
+    except OSError:
+        return states
+    for filename in filenames:
+        if _is_config_filename(filename):
+            path = os.path.join(directory_name, filename)
+            states.append((path, _file_state(path)))
+    return states
+
+
+def _can_snapshot(states: list[tuple[str, FileState]], config_count: int) -> bool:
+    # the main file and the directory are not config layers of their own,
+    # each other file must have been parsed successfully
+    if config_count != len(states) - 1:
+        return False
+
+    for path, state in states:
+        if state is None or _file_state(path) != state:
+            return False
+    return True
+
 
 class UUIDNotFound(RuntimeError):
     def __init__(self) -> None:
@@ -0,0 +1,316 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import threading
+from collections.abc import Callable, Mapping
+from typing import Any
+
+from .chain_map import ChainMap
+from .config_helper import (
+    ConfigParser,
+    ErrorHandler,
+    FileState,
+    PrintErrorHandler,
+    _file_state,
+    _is_config_filename,
+)
+
+logger = logging.getLogger(__name__)
+
+KeyPath = tuple[str, ...]
+ConfigChangeCallback = Callable[[ChainMap, list[KeyPath]], None]
+
+
+class _Inotify:
+    _IN_MODIFY = 0x2
+    _IN_ATTRIB = 0x4
+    _IN_CLOSE_WRITE = 0x8
+    _IN_MOVED_FROM = 0x40
+    _IN_MOVED_TO = 0x80
+    _IN_CREATE = 0x100
+    _IN_DELETE = 0x200
+    _IN_DELETE_SELF = 0x400
+    _IN_MOVE_SELF = 0x800
+    _MASK = (
+        _IN_MODIFY
+        | _IN_ATTRIB
+        | _IN_CLOSE_WRITE
+        | _IN_MOVED_FROM
+        | _IN_MOVED_TO
+        | _IN_CREATE
+        | _IN_DELETE
+        | _IN_DELETE_SELF
+        | _IN_MOVE_SELF
+    )
+    _IN_NONBLOCK = os.O_NONBLOCK
+    _IN_CLOEXEC = os.O_CLOEXEC
+
+    def __init__(self) -> None:
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError('libc not found')
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        try:
+            self._add_watch = self._libc.inotify_add_watch
+            fd = self._libc.inotify_init1(self._IN_NONBLOCK | self._IN_CLOEXEC)
+        except AttributeError:
+            raise OSError('inotify is not supported')
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._fd = fd
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def add_watch(self, path: str) -> bool:
+        return self._add_watch(self._fd, os.fsencode(path), self._MASK) >= 0
+
+    def wait(self, timeout: float) -> bool:
+        """Wait for events and discard them, return False on timeout"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self._fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class ConfigWatcher:
+    """
+    Keep the config read by ConfigParser.read_config_file_hierarchy up to
+    date with the config files.
+
+    reload() parses again only the files that changed since the last reload,
+    merges the layers again starting from the first changed one and notifies
+    subscribers of the merged config with the key paths that changed.
+    watch() calls reload() whenever the config file or the extra config
+    directory change, using inotify, or polling every poll_interval seconds
+    where inotify is not available.
+
+    A file that cannot be parsed anymore keeps its previous content until
+    it is fixed.
+    """
+
+    DEFAULT_POLL_INTERVAL = 2
+    _DEBOUNCE_INTERVAL = 0.2
+
+    def __init__(
+        self,
+        original_config: Mapping[str, Any],
+        error_handler: ErrorHandler = PrintErrorHandler(),
+        config_file_key: str = 'config_file',
+        extra_config_dir_key: str = 'extra_config_files',
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ) -> None:
+        self._original_config = original_config
+        self._error_handler = error_handler
+        self._parser = ConfigParser(error_handler)
+        self._config_file_key = config_file_key
+        self._extra_config_dir_key = extra_config_dir_key
+        self._poll_interval = poll_interval
+        self._files: dict[str, tuple[FileState, dict[str, Any]]] = {}
+        self._paths: list[str] = []
+        self._directories: set[str] = set()
+        self._unreadable_directory: str | None = None
+        # _merged[i] is the merge of the first i + 1 layers
+        self._merged: list[dict[str, Any]] = []
+        self._config: ChainMap | None = None
+        self._callbacks: list[ConfigChangeCallback] = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def config(self) -> ChainMap:
+        if self._config is None:
+            self.reload()
+        assert self._config is not None
+        return self._config
+
+    def reload(self) -> list[KeyPath]:
+        with self._lock:
+            previous = self._merged[-1] if self._merged else {}
+            self._update_layers()
+            current = self._merged[-1] if self._merged else {}
+            changed_keys = _changed_keys(previous, current)
+            if self._config is not None and not changed_keys:
+                return []
+            config = self._config = ChainMap(current)
+            callbacks = list(self._callbacks)
+
+        for callback in callbacks:
+            try:
+                callback(config, changed_keys)
+            except Exception:
+                logger.exception('unexpected exception from config callback')
+        return changed_keys
+
+    def subscribe(self, callback: ConfigChangeCallback) -> None:
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def unsubscribe(self, callback: ConfigChangeCallback) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def watch(self) -> None:
+        if self._thread:
+            return
+
+        inotify: _Inotify | None
+        try:
+            inotify = _Inotify()
+        except OSError as e:
+            logger.info('cannot use inotify, polling config files: %s', e)
+            inotify = None
+
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._watch_loop, args=(inotify,), name='ConfigWatcher', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        thread, self._thread = self._thread, None
+        if thread:
+            self._stopped.set()
+            thread.join()
+
+    def _watch_loop(self, inotify: _Inotify | None) -> None:
+        if inotify is None:
+            self._reload_safely()
+            while not self._stopped.wait(self._poll_interval):
+                self._reload_safely()
+            return
+
+        try:
+            self._reload_safely()
+            self._add_watches(inotify)
+            while not self._stopped.is_set():
+                if not inotify.wait(1):
+                    continue
+
+                # editors write files in several steps, reload once they settle
+                while inotify.wait(self._DEBOUNCE_INTERVAL):
+                    pass
+                self._reload_safely()
+                self._add_watches(inotify)
+        finally:
+            inotify.close()
+
+    def _reload_safely(self) -> None:
+        try:
+            self.reload()
+        except Exception:
+            logger.exception('failed to reload config')
+
+    def _add_watches(self, inotify: _Inotify) -> None:
+        # Directories are watched rather than files, to notice files that
+        # are replaced. Watching a directory again is a no-op.
+        with self._lock:
+            directories = set(self._directories)
+        for directory in directories:
+            if not inotify.add_watch(directory):
+                logger.debug('cannot watch config directory %s', directory)
+
+    def _update_layers(self) -> None:
+        main_config_filename = self._original_config[self._config_file_key]
+        main_config_changed = self._update_file(main_config_filename)
+        main_config = self._files[main_config_filename][1]
+        extra_config_file_directory = ChainMap(main_config, self._original_config)[
+            self._extra_config_dir_key
+        ]
+
+        self._directories = {
+            os.path.dirname(main_config_filename) or '.',
+            extra_config_file_directory,
+        }
+        paths = self._config_dir_paths(extra_config_file_directory)
+        changed = [self._update_file(path) for path in paths]
+        paths.append(main_config_filename)
+        changed.append(main_config_changed)
+
+        # the main config file is always the last layer, so adding or
+        # removing a file always moves a layer
+        first_changed = next(
+            (
+                i
+                for i, path in enumerate(paths)
+                if changed[i] or i >= len(self._paths) or self._paths[i] != path
+            ),
+            len(paths),
+        )
+
+        for path in set(self._files) - set(paths):
+            del self._files[path]
+        self._paths = paths
+        del self._merged[first_changed:]
+        for path in paths[first_changed:]:
+            layer = self._files[path][1]
+            if self._merged:
+                self._merged.append(ChainMap(self._merged[-1], layer).data)
+            else:
+                self._merged.append(ChainMap(layer).data)
+
+    def _config_dir_paths(self, directory_name: str) -> list[str]:
+        try:
+            filenames = os.listdir(directory_name)
+        except OSError as e:
+            # report once rather than on every reload
+            if directory_name != self._unreadable_directory:
+                self._error_handler.on_parse_config_dir_env_error(directory_name, e)
+                self._unreadable_directory = directory_name
+            return []
+        self._unreadable_directory = None
+        return [
+            os.path.join(directory_name, filename)
+            for filename in sorted(filenames)
+            if _is_config_filename(filename)
+        ]
+
+    def _update_file(self, path: str) -> bool:
+        state = _file_state(path)
+        previous = self._files.get(path)
+        if previous and previous[0] == state:
+            return False
+
+        try:
+            config = self._parser.parse_config_file(path)
+        except Exception as e:
+            self._error_handler.on_parse_config_dir_parse_exception(
+                os.path.basename(path), e
+            )
+            config = previous[1] if previous else {}
+        self._files[path] = (state, config)
+        return previous is None or previous[1] != config
+
+
+_MISSING = object()
+
+
+def _changed_keys(
+    old: Mapping[str, Any], new: Mapping[str, Any], prefix: KeyPath = ()
+) -> list[KeyPath]:
+    changed = []
+    for key in sorted(old.keys() | new.keys(), key=str):
+        old_value = old.get(key, _MISSING)
+        new_value = new.get(key, _MISSING)
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            changed.extend(_changed_keys(old_value, new_value, prefix + (key,)))
+        elif old_value != new_value:
+            changed.append(prefix + (key,))
+    return changed
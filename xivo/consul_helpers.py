@@ -3,16 +3,22 @@
 
 from __future__ import annotations
 
+import ipaddress
+import itertools
 import logging
+import socket
 import threading
-from collections.abc import Callable, Mapping
+import time
+from collections import deque
+from collections.abc import Callable, Iterator, Mapping
+from concurrent.futures import ThreadPoolExecutor
 from types import TracebackType
-from typing import Any, TypedDict, TypeVar
+from typing import Any, NamedTuple, TypedDict, TypeVar
 from uuid import uuid4
 
 import requests
 from consul import Check, Consul, ConsulException
-from requests.exceptions import ConnectionError
+from requests.exceptions import ConnectionError, RequestException
 from wazo_bus.resources.common.abstract import EventProtocol
 
 try:
@@ -38,6 +44,11 @@ class ConsulService(TypedDict):
     Tags: list[str]
 
 
+class HealthyServices(NamedTuple):
+    services: list[ConsulService]
+    failed_datacenters: dict[str, str]
+
+
 logger = logging.getLogger('service_discovery')
 VALID_SERVICE_DISCO_IFACE_PREFIX = ['eth', 'en']
 
@@ -55,6 +66,7 @@ class MissingConfigurationError(RegistererError):
 
 
 Self = TypeVar('Self', bound='ServiceCatalogRegistration')
+ManagedSelf = TypeVar('ManagedSelf', bound='ManagedRegistration')
 
 
 class ServiceCatalogRegistration:
@@ -80,6 +92,12 @@ class ServiceCatalogRegistration:
 
         self._retry_interval: int = service_discovery_config['retry_interval']
         self._refresh_interval: int = service_discovery_config['refresh_interval']
+        self._flush_timeout: float = service_discovery_config.get(
+            'flush_timeout', EventOutbox.DEFAULT_FLUSH_TIMEOUT
+        )
+        self._watch_address_changes: bool = service_discovery_config.get(
+            'watch_address_changes', False
+        )
 
         self._thread = threading.Thread(target=self._loop)
         self._sleep_event = threading.Event()
@@ -91,6 +109,9 @@ class ServiceCatalogRegistration:
 
     def __enter__(self: Self) -> Self:
         if self._enabled:
+            address_resolver.subscribe(self._on_address_change)
+            if self._watch_address_changes:
+                address_resolver.watch()
             self._thread.start()
         return self
 
@@ -106,6 +127,7 @@ class ServiceCatalogRegistration:
         if not self._enabled:
             return
 
+        address_resolver.unsubscribe(self._on_address_change)
         if self._thread.is_alive():
             logger.debug('waiting for the service discovery thread to complete')
             self._done = True
@@ -119,6 +141,8 @@ class ServiceCatalogRegistration:
         except Exception:
             logger.exception('failed to deregister')
 
+        self._registerer.close(self._flush_timeout)
+
     def _loop(self) -> None:
         while not self._done:
             if not self._registered:
@@ -133,10 +157,16 @@ class ServiceCatalogRegistration:
 
     def _sleep(self, interval: int) -> None:
         self._sleep_event.wait(interval)
+        self._sleep_event.clear()
 
     def _wake(self) -> None:
         self._sleep_event.set()
 
+    def _on_address_change(self, iface: str, address: str) -> None:
+        if self._registerer.refresh_address():
+            self._registered = False
+            self._wake()
+
     def _register(self) -> None:
         try:
             self._registerer.register()
@@ -152,6 +182,347 @@ class ServiceCatalogRegistration:
         return True
 
 
+class RegistrationManager:
+    """
+    Run many service registrations on one scheduler thread sharing one Consul
+    client.
+
+    Registrations due at about the same time are handled in the same tick, so
+    registrations with the same refresh interval send their TTL passes
+    together.
+
+    Service checks run on their own threads so that a slow check does not
+    delay the other registrations. A check that did not return after
+    check_timeout seconds counts as failed.
+
+    Registrations with the same UUID and bus config also share one bus
+    publisher and its event outbox.
+    """
+
+    DEFAULT_CHECK_TIMEOUT = 10
+    DEFAULT_STOP_TIMEOUT = 5
+
+    def __init__(
+        self,
+        consul_config: Mapping[str, Any],
+        check_timeout: float = DEFAULT_CHECK_TIMEOUT,
+    ) -> None:
+        self._consul_config = consul_config
+        self._consul_client = ConsulClient(consul_config)
+        self.check_timeout = check_timeout
+        self._outboxes: dict[tuple[str, str], EventOutbox] = {}
+        self._registrations: list[ManagedRegistration] = []
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def registration(
+        self,
+        service_name: str,
+        uuid: str | None,
+        service_discovery_config: Mapping[str, Any],
+        bus_config: Mapping[str, Any],
+        check: Callable[[], bool] | None = None,
+    ) -> ManagedRegistration:
+        return ManagedRegistration(
+            self, service_name, uuid, service_discovery_config, bus_config, check
+        )
+
+    def stop(self, timeout: float | None = DEFAULT_STOP_TIMEOUT) -> None:
+        """
+        Stop the scheduler thread and deregister the running registrations,
+        waiting at most timeout seconds for their events to be published.
+        Registrations entered afterwards start the scheduler again.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining() -> float | None:
+            if deadline is None:
+                return None
+            return max(deadline - time.monotonic(), 0)
+
+        with self._lock:
+            thread, self._thread = self._thread, None
+            registrations, self._registrations = self._registrations, []
+            outboxes = list(self._outboxes.values())
+            self._outboxes.clear()
+            self._stopped.set()
+
+        if thread:
+            self._wake_event.set()
+            thread.join(remaining())
+        # the shared outboxes are flushed once below, within the same deadline
+        for registration in registrations:
+            registration._stop(flush=False)
+        for outbox in outboxes:
+            outbox.close(remaining())
+
+    def _create_registerer(
+        self,
+        service_name: str,
+        uuid: str,
+        service_discovery_config: Mapping[str, Any],
+        bus_config: Mapping[str, Any],
+    ) -> NotifyingRegisterer:
+        return NotifyingRegisterer(
+            service_name,
+            uuid,
+            self._consul_config,
+            service_discovery_config,
+            bus_config,
+            consul_client=self._consul_client,
+            outbox=self._outbox(uuid, bus_config),
+        )
+
+    def _outbox(self, uuid: str, bus_config: Mapping[str, Any]) -> EventOutbox:
+        key = (uuid, repr(sorted(bus_config.items())))
+        with self._lock:
+            outbox = self._outboxes.get(key)
+            if outbox is None:
+                publisher = BusPublisher(
+                    name='consul-helper', service_uuid=uuid, **bus_config
+                )
+                outbox = self._outboxes[key] = EventOutbox(publisher)
+            return outbox
+
+    def _add(self, registration: ManagedRegistration) -> None:
+        with self._lock:
+            self._registrations.append(registration)
+            if self._thread is None:
+                self._stopped = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._loop,
+                    args=(self._stopped,),
+                    name='ServiceDiscoveryThread',
+                    daemon=True,
+                )
+                self._thread.start()
+        self._wake_event.set()
+
+    def _remove(self, registration: ManagedRegistration) -> None:
+        with self._lock:
+            if registration in self._registrations:
+                self._registrations.remove(registration)
+
+    def _loop(self, stopped: threading.Event) -> None:
+        while not stopped.is_set():
+            self._wake_event.clear()
+            self._tick(time.monotonic())
+
+            with self._lock:
+                next_run = min((r.next_run for r in self._registrations), default=None)
+            timeout = None if next_run is None else next_run - time.monotonic()
+            if timeout is None or timeout > 0:
+                self._wake_event.wait(timeout)
+
+    def _tick(self, now: float) -> None:
+        with self._lock:
+            registrations = list(self._registrations)
+
+        # running a registration a little early is harmless since its TTL is
+        # longer than its refresh interval, so coalesce anything nearly due
+        due = [r for r in registrations if r.next_run <= now + r.interval / 2]
+        if len(due) > 1:
+            logger.debug('running %s registrations in one tick', len(due))
+        for registration in due:
+            registration.run_once()
+
+
+class ManagedRegistration:
+    """
+    A service registration run by a RegistrationManager, with the same context
+    manager behavior as ServiceCatalogRegistration.
+    """
+
+    def __init__(
+        self,
+        manager: RegistrationManager,
+        service_name: str,
+        uuid: str | None,
+        service_discovery_config: Mapping[str, Any],
+        bus_config: Mapping[str, Any],
+        check: Callable[[], bool] | None = None,
+    ) -> None:
+        self._manager = manager
+        self._enabled = service_discovery_config.get('enabled', True)
+        if not self._enabled:
+            logger.debug('service discovery has been disabled')
+            return
+
+        assert uuid is not None
+        self._service_name = service_name
+        self._check = check or (lambda: True)
+        self._registerer = manager._create_registerer(
+            service_name, uuid, service_discovery_config, bus_config
+        )
+        self._retry_interval: int = service_discovery_config['retry_interval']
+        self._refresh_interval: int = service_discovery_config['refresh_interval']
+        self._flush_timeout: float = service_discovery_config.get(
+            'flush_timeout', EventOutbox.DEFAULT_FLUSH_TIMEOUT
+        )
+        self._watch_address_changes: bool = service_discovery_config.get(
+            'watch_address_changes', False
+        )
+        self._lock = threading.Lock()
+        self._registered = False
+        self._done = False
+        self._check_thread: threading.Thread | None = None
+        self._check_result: bool | None = None
+        self._check_deadline = 0.0
+        self.interval: float = self._retry_interval
+        self.next_run = 0.0
+
+    def __enter__(self: ManagedSelf) -> ManagedSelf:
+        if self._enabled:
+            self.next_run = time.monotonic()
+            address_resolver.subscribe(self._on_address_change)
+            if self._watch_address_changes:
+                address_resolver.watch()
+            self._manager._add(self)
+        return self
+
+    def __exit__(
+        self,
+        type: type[BaseException] | None,
+        value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if type:
+            logger.debug('An error occurred: %s %s %s', type, value, traceback)
+
+        if not self._enabled:
+            return
+
+        self._manager._remove(self)
+        self._stop()
+
+    def _stop(self, flush: bool = True) -> None:
+        address_resolver.unsubscribe(self._on_address_change)
+        with self._lock:
+            if self._done:
+                return
+            self._done = True
+            try:
+                self._registerer.deregister()
+            except RegistererError as e:
+                logger.info('failed to deregister %s', e)
+            except Exception:
+                logger.exception('failed to deregister')
+
+        if flush:
+            self._registerer.close(self._flush_timeout)
+
+    def _on_address_change(self, iface: str, address: str) -> None:
+        with self._lock:
+            if self._done:
+                return
+        # resolving the address may notify this callback again, so it must
+        # not hold the lock
+        if not self._registerer.refresh_address():
+            return
+        with self._lock:
+            if self._done:
+                return
+            self._registered = False
+            self.next_run = time.monotonic()
+        self._manager._wake_event.set()
+
+    def run_once(self) -> None:
+        with self._lock:
+            if self._done:
+                return
+
+            if not self._registered and self._check_passed():
+                try:
+                    self._registerer.register()
+                    self._registered = True
+                except RegistererError as e:
+                    logger.info(
+                        'registration failed, retrying in %s seconds %s',
+                        self._retry_interval,
+                        e,
+                    )
+
+            if self._registered and self._registerer.send_ttl():
+                self.interval = self._refresh_interval
+            else:
+                self.interval = self._retry_interval
+            self.next_run = time.monotonic() + self.interval
+
+    def _check_passed(self) -> bool:
+        """
+        Return the result of the last check, starting a new one if none is
+        running. Never waits for the check: it wakes the manager when done.
+        """
+        if self._check_result is not None:
+            result, self._check_result = self._check_result, None
+            return result
+
+        if self._check_thread is None:
+            self._check_deadline = time.monotonic() + self._manager.check_timeout
+            self._check_thread = threading.Thread(
+                target=self._run_check,
+                name=f'ServiceCheck-{self._service_name}',
+                daemon=True,
+            )
+            self._check_thread.start()
+        elif time.monotonic() >= self._check_deadline:
+            logger.warning(
+                '%s service check did not return after %s seconds',
+                self._service_name,
+                self._manager.check_timeout,
+            )
+        return False
+
+    def _run_check(self) -> None:
+        try:
+            result = bool(self._check())
+        except Exception:
+            logger.exception('unexpected exception from %s check', self._service_name)
+            result = False
+
+        with self._lock:
+            self._check_thread = None
+            if time.monotonic() > self._check_deadline:
+                logger.info('discarding late %s check result', self._service_name)
+                return
+            self._check_result = result
+            self.next_run = time.monotonic()
+        self._manager._wake_event.set()
+
+
+class ConsulClient:
+    """
+    Lazily build a Consul client, keeping its HTTP session alive until a
+    connection error happens. Can be shared by many registerers.
+    """
+
+    def __init__(self, consul_config: Mapping[str, Any]) -> None:
+        self._consul_config = consul_config
+        self._client: Consul | None = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Consul:
+        with self._lock:
+            if self._client is None:
+                logger.debug('Creating Consul client')
+                self._client = Consul(**self._consul_config)
+            return self._client
+
+    def reset(self) -> None:
+        with self._lock:
+            client, self._client = self._client, None
+        if client is None:
+            return
+
+        logger.debug('Discarding Consul client after a connection error')
+        try:
+            client.http.session.close()
+        except Exception:
+            logger.debug('Failed to close the Consul client session', exc_info=True)
+
+
 class Registerer:
     def __init__(
         self,
@@ -159,10 +530,12 @@ class Registerer:
         uuid: str,
         consul_config: Mapping[str, Any],
         service_discovery_config: Mapping[str, Any],
+        consul_client: ConsulClient | None = None,
     ) -> None:
         self._service_id = str(uuid4())
         self._service_name = name
         try:
+            self._service_discovery_config = service_discovery_config
             self._advertise_address = self._find_address(service_discovery_config)
             self._advertise_port = service_discovery_config['advertise_port']
             self._tags = [uuid, name] + service_discovery_config.get('extra_tags', [])
@@ -172,10 +545,14 @@ class Registerer:
             raise MissingConfigurationError(str(e))
         self._consul_config = consul_config
         self._check_id = f'service:{self._service_id}'
+        self._consul_client = consul_client or ConsulClient(consul_config)
 
     @property
     def _client(self) -> Consul:
-        return Consul(**self._consul_config)
+        return self._consul_client.get()
+
+    def _reset_client(self) -> None:
+        self._consul_client.reset()
 
     def register(self) -> None:
         logger.info(
@@ -201,7 +578,10 @@ class Registerer:
                     f'{self._service_name} registration on Consul failed'
                 )
 
-        except (ConnectionError, ConsulException) as e:
+        except ConnectionError as e:
+            self._reset_client()
+            raise RegistererError(str(e))
+        except ConsulException as e:
             raise RegistererError(str(e))
 
     def send_ttl(self) -> bool | None:
@@ -209,7 +589,10 @@ class Registerer:
 
         try:
             result = self._client.agent.check.ttl_pass(self._check_id)
-        except (ConnectionError, ConsulException) as e:
+        except ConnectionError as e:
+            self._reset_client()
+            logger.info('%s', e)
+        except ConsulException as e:
             logger.info('%s', e)
 
         if not result:
@@ -228,9 +611,27 @@ class Registerer:
             client = self._client
             client.agent.check.deregister(self._check_id)
             return client.agent.service.deregister(self._service_id)
-        except (ConnectionError, ConsulException) as e:
+        except ConnectionError as e:
+            self._reset_client()
+            raise RegistererError(str(e))
+        except ConsulException as e:
             raise RegistererError(str(e))
 
+    def refresh_address(self) -> bool:
+        """Update the advertised address, returning True if it changed"""
+        address = self._find_address(self._service_discovery_config)
+        if address == self._advertise_address:
+            return False
+
+        logger.info(
+            'Advertised address of %s changed from %s to %s',
+            self._service_name,
+            self._advertise_address,
+            address,
+        )
+        self._advertise_address = address
+        return True
+
     def _find_address(self, service_discovery_config: Mapping[str, Any]) -> str:
         return address_from_config(service_discovery_config)
 
@@ -239,7 +640,159 @@ def address_from_config(service_discovery_config: Mapping[str, Any]) -> str:
     advertise_address = service_discovery_config['advertise_address']
     if advertise_address != 'auto':
         return advertise_address
-    return _find_address(service_discovery_config['advertise_address_interface'])
+    return address_resolver.resolve(
+        service_discovery_config['advertise_address_interface']
+    )
+
+
+AddressChangeCallback = Callable[[str, str], None]
+
+
+class AddressResolver:
+    """
+    Cache the addresses found by _find_address for each main interface.
+
+    refresh() resolves the cached interfaces again and notifies subscribers of
+    the addresses that changed. watch() calls refresh() whenever the kernel
+    reports a link or IPv4 address change through netlink, until stop().
+    Service registrations call watch() when their service discovery config
+    sets watch_address_changes.
+
+    Loopback addresses are only fallbacks until an interface gets an address,
+    so they are looked up again on every resolve().
+    """
+
+    _RTMGRP_LINK = 0x1
+    _RTMGRP_IPV4_IFADDR = 0x10
+    _DEBOUNCE_INTERVAL = 0.5
+
+    def __init__(self) -> None:
+        self._addresses: dict[str, str] = {}
+        self._callbacks: list[AddressChangeCallback] = []
+        self._lock = threading.Lock()
+        # serializes starting and stopping the watch thread
+        self._watch_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def resolve(self, main_iface: str) -> str:
+        with self._lock:
+            address = self._addresses.get(main_iface)
+        if address is not None and not _is_loopback(address):
+            return address
+
+        new_address = _find_address(main_iface)
+        with self._lock:
+            self._addresses[main_iface] = new_address
+            callbacks = list(self._callbacks)
+        if address is not None and new_address != address:
+            self._notify(callbacks, {main_iface: new_address})
+        return new_address
+
+    def refresh(self) -> dict[str, str]:
+        with self._lock:
+            ifaces = list(self._addresses)
+            callbacks = list(self._callbacks)
+
+        changed = {}
+        for iface in ifaces:
+            address = _find_address(iface)
+            with self._lock:
+                if self._addresses.get(iface) != address:
+                    self._addresses[iface] = address
+                    changed[iface] = address
+
+        self._notify(callbacks, changed)
+        return changed
+
+    @staticmethod
+    def _notify(
+        callbacks: list[AddressChangeCallback], changed: dict[str, str]
+    ) -> None:
+        for iface, address in changed.items():
+            logger.debug('address of interface %s changed to %s', iface, address)
+            for callback in callbacks:
+                try:
+                    callback(iface, address)
+                except Exception:
+                    logger.exception('unexpected exception from address callback')
+
+    def subscribe(self, callback: AddressChangeCallback) -> None:
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def unsubscribe(self, callback: AddressChangeCallback) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def watch(self) -> bool:
+        """Refresh on network changes, return False if netlink is unavailable"""
+        with self._watch_lock:
+            return self._watch()
+
+    def _watch(self) -> bool:
+        if self._thread:
+            return True
+
+        try:
+            sock = socket.socket(
+                socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE
+            )
+            sock.bind((0, self._RTMGRP_LINK | self._RTMGRP_IPV4_IFADDR))
+        except (AttributeError, OSError) as e:
+            logger.info('cannot watch network changes: %s', e)
+            return False
+
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._watch_loop,
+            args=(sock, self._stopped),
+            name='AddressWatcher',
+            daemon=True,
+        )
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        with self._watch_lock:
+            thread, self._thread = self._thread, None
+            self._stopped.set()
+        # callbacks may stop the watch from the watch thread itself
+        if thread and thread is not threading.current_thread():
+            thread.join()
+
+    def _watch_loop(self, sock: socket.socket, stopped: threading.Event) -> None:
+        sock.settimeout(1)
+        with sock:
+            while not stopped.is_set():
+                if not self._receive(sock):
+                    continue
+
+                # network changes come in bursts, refresh once they settle
+                sock.settimeout(self._DEBOUNCE_INTERVAL)
+                while self._receive(sock):
+                    pass
+                sock.settimeout(1)
+                self.refresh()
+
+    @staticmethod
+    def _receive(sock: socket.socket) -> bool:
+        try:
+            sock.recv(65536)
+        except TimeoutError:
+            return False
+        return True
+
+
+address_resolver = AddressResolver()
+
+
+def _is_loopback(address: str) -> bool:
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
 
 
 def _find_address(main_iface: str) -> str:
@@ -273,10 +826,16 @@ class NotifyingRegisterer(Registerer):
         consul_config: Mapping[str, Any],
         service_discovery_config: Mapping[str, Any],
         bus_config: Mapping[str, Any],
+        consul_client: ConsulClient | None = None,
+        outbox: EventOutbox | None = None,
     ) -> None:
-        super().__init__(name, uuid, consul_config, service_discovery_config)
-        self._publisher = BusPublisher(
-            name='consul-helper', service_uuid=uuid, **bus_config
+        super().__init__(
+            name, uuid, consul_config, service_discovery_config, consul_client
+        )
+        # a shared outbox belongs to its creator, which closes it
+        self._owns_outbox = outbox is None
+        self._outbox = outbox or EventOutbox(
+            BusPublisher(name='consul-helper', service_uuid=uuid, **bus_config)
         )
 
     def register(self) -> None:
@@ -309,12 +868,122 @@ class NotifyingRegisterer(Registerer):
 
         return should_send_msg
 
+    def close(self, timeout: float | None = None) -> bool:
+        """Publish the pending events, waiting at most timeout seconds"""
+        if self._owns_outbox:
+            return self._outbox.close(timeout)
+        return self._outbox.flush(timeout)
+
     def _notify(self, event: EventProtocol) -> None:
-        self._publisher.publish(event)
+        self._outbox.put(event)
+
+
+class EventOutbox:
+    """
+    Publish events on a background thread so that a slow or unreachable bus
+    does not block the caller.
+
+    Failed publications are retried with a backoff. When more than max_size
+    events are pending, the oldest ones are dropped.
+    """
+
+    DEFAULT_MAX_SIZE = 100
+    DEFAULT_FLUSH_TIMEOUT = 5
+
+    def __init__(self, publisher: Any, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self._publisher = publisher
+        self._events: deque[EventProtocol] = deque()
+        self._max_size = max_size
+        self._condition = threading.Condition()
+        self._publishing = False
+        self._closed = False
+        self._thread: threading.Thread | None = None
+
+    def put(self, event: EventProtocol) -> None:
+        with self._condition:
+            if self._closed:
+                logger.info('event outbox closed, dropping %s', event)
+                return
+            if len(self._events) >= self._max_size:
+                dropped = self._events.popleft()
+                logger.warning('event outbox full, dropping %s', dropped)
+            self._events.append(event)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name='EventOutboxThread', daemon=True
+                )
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until all pending events are published, return False on timeout"""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._events and not self._publishing, timeout
+            )
+
+    def close(self, timeout: float | None = None) -> bool:
+        flushed = self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            if not flushed:
+                logger.warning(
+                    'event outbox not flushed, dropping %s events', len(self._events)
+                )
+                self._events.clear()
+            self._condition.notify_all()
+        return flushed
+
+    def _loop(self) -> None:
+        retry_intervals = self._new_retry_intervals()
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._events or self._closed)
+                if not self._events:
+                    return
+                event = self._events.popleft()
+                self._publishing = True
+
+            try:
+                self._publisher.publish(event)
+            except Exception as e:
+                retry_interval = next(retry_intervals)
+                logger.info(
+                    'failed to publish %s, retrying in %s seconds: %s',
+                    event,
+                    retry_interval,
+                    e,
+                )
+                with self._condition:
+                    if len(self._events) < self._max_size:
+                        self._events.appendleft(event)
+                    else:
+                        logger.warning('event outbox full, dropping %s', event)
+                    self._publishing = False
+                    self._condition.notify_all()
+                    self._condition.wait_for(lambda: self._closed, retry_interval)
+                continue
+
+            retry_intervals = self._new_retry_intervals()
+            with self._condition:
+                self._publishing = False
+                self._condition.notify_all()
+
+    @staticmethod
+    def _new_retry_intervals() -> Iterator[int]:
+        return itertools.chain((1, 2, 4, 8, 16), itertools.repeat(32))
 
 
 class ServiceFinder:
-    def __init__(self, consul_config: Mapping[str, Any]) -> None:
+    DEFAULT_MAX_WORKERS = 8
+    DEFAULT_TIMEOUT = 10
+
+    def __init__(
+        self,
+        consul_config: Mapping[str, Any],
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        timeout: float | None = DEFAULT_TIMEOUT,
+    ) -> None:
         self._dc_url = '{scheme}://{host}:{port}/v1/catalog/datacenters'.format(
             **consul_config
         )
@@ -326,18 +995,87 @@ class ServiceFinder:
         )
         self._verify = consul_config.get('verify', True)
         self._token = consul_config.get('token')
+        self._timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='consul-dc')
+        # requests does not guarantee that a Session is thread-safe, so each
+        # worker of the pool uses its own
+        self._local = threading.local()
+        self._sessions: list[requests.Session] = []
+        self._sessions_lock = threading.Lock()
 
     def list_healthy_services(
         self, service_name: str, xivo_uuid: str | None = None
     ) -> list[ConsulService]:
-        services = []
-        for dc in self._get_datacenters():
-            for service in self._list_running_services(service_name, dc, tag=xivo_uuid):
-                services.append(service)
-        return services
+        """
+        Return the healthy services of every datacenter that could be queried.
+
+        Datacenters that fail are left out of the result, see
+        find_healthy_services. ServiceDiscoveryError is raised only if no
+        datacenter could be queried.
+        """
+        return self.find_healthy_services(service_name, xivo_uuid).services
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+
+    def find_healthy_services(
+        self, service_name: str, xivo_uuid: str | None = None
+    ) -> HealthyServices:
+        """
+        Query every datacenter concurrently and return the healthy services
+        along with the datacenters that could not be queried.
+
+        ServiceDiscoveryError is raised only if no datacenter could be queried.
+        """
+        datacenters = self._fetch_datacenters()
+        if not datacenters:
+            return HealthyServices([], {})
+
+        futures = {
+            dc: self._executor.submit(
+                self._list_running_services, service_name, dc, xivo_uuid
+            )
+            for dc in datacenters
+        }
+
+        services: list[ConsulService] = []
+        failed_datacenters: dict[str, str] = {}
+        for dc, future in futures.items():
+            try:
+                services.extend(future.result())
+            except (ServiceDiscoveryError, RequestException) as e:
+                failed_datacenters[dc] = str(e) or type(e).__name__
+
+        if len(failed_datacenters) == len(datacenters):
+            raise ServiceDiscoveryError(f'all datacenters failed: {failed_datacenters}')
+        if failed_datacenters:
+            logger.warning(
+                'partial results for %s, datacenters failed: %s',
+                service_name,
+                failed_datacenters,
+            )
+
+        return HealthyServices(services, failed_datacenters)
+
+    def _fetch_datacenters(self) -> list[str]:
+        return self._executor.submit(self._get_datacenters).result()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
 
-    def _get_datacenters(self) -> dict[str, Any]:
-        response = requests.get(self._dc_url, verify=self._verify)
+    def _get_datacenters(self) -> list[str]:
+        response = self._session().get(
+            self._dc_url, verify=self._verify, timeout=self._timeout
+        )
         self._assert_ok(response)
         return response.json()
 
@@ -345,11 +1083,22 @@ class ServiceFinder:
         self, service_name: str, datacenter: str, tag: str | None
     ) -> list[ConsulService]:
         url = f'{self._health_url}/{service_name}'
-        params: dict[str, str | bool] = {'dc': datacenter, 'passing': True}
+        params = self._health_params(datacenter, tag)
+        response = self._session().get(
+            url, verify=self._verify, params=params, timeout=self._timeout
+        )
+        self._assert_ok(response)
+        return self._services_from_response(response)
+
+    @staticmethod
+    def _health_params(datacenter: str, tag: str | None) -> dict[str, str | bool | int]:
+        params: dict[str, str | bool | int] = {'dc': datacenter, 'passing': True}
         if tag:
             params['tag'] = tag
-        response = requests.get(url, verify=self._verify, params=params)
-        self._assert_ok(response)
+        return params
+
+    @staticmethod
+    def _services_from_response(response: requests.Response) -> list[ConsulService]:
         services = []
         for node in response.json():
             service: ConsulService | None = node.get('Service')
@@ -362,3 +1111,245 @@ class ServiceFinder:
         if response.status_code != code:
             msg = getattr(response, 'text', 'unknown error')
             raise ServiceDiscoveryError(msg)
+
+
+WatchKey = tuple[str, str | None]
+ServiceChangeCallback = Callable[[str, str | None, list[ConsulService]], None]
+
+
+class _ServiceWatch:
+    def __init__(self) -> None:
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.error: Exception | None = None
+        self.threads: list[threading.Thread] = []
+        self.datacenters: list[str] = []
+        # datacenters that did not report their first result yet
+        self.pending: set[str] = set()
+        self.by_datacenter: dict[str, list[ConsulService]] = {}
+        self.catalog: list[ConsulService] = []
+
+
+class ServiceWatcher(ServiceFinder):
+    """
+    Keep an in-memory catalog of healthy services, updated with Consul blocking
+    queries.
+
+    Once a (service_name, tag) pair is watched, list_healthy_services is served
+    from memory. Change callbacks receive (service_name, tag, services) and are
+    only called when the set of healthy services changes.
+
+    Watch threads blocked in a Consul query only notice unwatch() and stop()
+    when the query returns, up to wait seconds later. Both wait at most
+    timeout seconds for the threads to exit.
+    """
+
+    DEFAULT_WAIT = 300
+    DEFAULT_RETRY_INTERVAL = 5
+    DEFAULT_READY_TIMEOUT = 10
+    DEFAULT_STOP_TIMEOUT = 5
+
+    def __init__(
+        self,
+        consul_config: Mapping[str, Any],
+        wait: int = DEFAULT_WAIT,
+        retry_interval: float = DEFAULT_RETRY_INTERVAL,
+        ready_timeout: float = DEFAULT_READY_TIMEOUT,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(consul_config, **kwargs)
+        self._wait = wait
+        self._retry_interval = retry_interval
+        self._ready_timeout = ready_timeout
+        self._lock = threading.Lock()
+        self._watches: dict[WatchKey, _ServiceWatch] = {}
+        self._callbacks: list[ServiceChangeCallback] = []
+
+    def subscribe(self, callback: ServiceChangeCallback) -> None:
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def watch(self, service_name: str, tag: str | None = None) -> None:
+        """
+        Start watching a service if needed, then wait for at most ready_timeout
+        seconds until every datacenter has been queried once.
+        """
+        key = (service_name, tag)
+        with self._lock:
+            watch = self._watches.get(key)
+            starting = watch is None
+            if watch is None:
+                watch = self._watches[key] = _ServiceWatch()
+
+        if starting:
+            self._start(key, watch)
+        elif not watch.ready.wait(self._ready_timeout):
+            logger.info('timeout while waiting for %s to be watched', service_name)
+        if watch.error:
+            raise watch.error
+
+    def unwatch(
+        self,
+        service_name: str,
+        tag: str | None = None,
+        timeout: float | None = DEFAULT_STOP_TIMEOUT,
+    ) -> None:
+        with self._lock:
+            watch = self._watches.pop((service_name, tag), None)
+        if watch:
+            self._stop_watches([watch], timeout)
+
+    def list_healthy_services(
+        self, service_name: str, xivo_uuid: str | None = None
+    ) -> list[ConsulService]:
+        key = (service_name, xivo_uuid)
+        self.watch(service_name, xivo_uuid)
+        with self._lock:
+            watch = self._watches.get(key)
+            return list(watch.catalog) if watch else []
+
+    def stop(self, timeout: float | None = DEFAULT_STOP_TIMEOUT) -> None:
+        with self._lock:
+            watches = list(self._watches.values())
+            self._watches.clear()
+        self._stop_watches(watches, timeout)
+
+    def close(self) -> None:
+        self.stop()
+        super().close()
+
+    def _start(self, key: WatchKey, watch: _ServiceWatch) -> None:
+        service_name, _ = key
+        try:
+            datacenters = self._fetch_datacenters()
+        except (ServiceDiscoveryError, RequestException) as e:
+            with self._lock:
+                if self._watches.get(key) is watch:
+                    del self._watches[key]
+            watch.error = e
+            watch.ready.set()
+            raise
+
+        with self._lock:
+            watch.datacenters = datacenters
+            watch.pending = set(datacenters)
+        if not datacenters:
+            watch.ready.set()
+
+        for dc in datacenters:
+            thread = threading.Thread(
+                target=self._watch_loop,
+                args=(key, watch, dc),
+                name=f'consul-watch-{service_name}-{dc}',
+                daemon=True,
+            )
+            watch.threads.append(thread)
+            thread.start()
+
+        if not watch.ready.wait(self._ready_timeout):
+            logger.info('timeout while waiting for %s to be watched', service_name)
+
+    @staticmethod
+    def _stop_watches(watches: list[_ServiceWatch], timeout: float | None) -> None:
+        for watch in watches:
+            watch.stopped.set()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for watch in watches:
+            for thread in watch.threads:
+                remaining = None
+                if deadline is not None:
+                    remaining = max(deadline - time.monotonic(), 0)
+                thread.join(remaining)
+                if thread.is_alive():
+                    logger.debug('%s is still waiting for Consul', thread.name)
+
+    def _watch_loop(self, key: WatchKey, watch: _ServiceWatch, datacenter: str) -> None:
+        service_name, tag = key
+        session = requests.Session()
+        index = 0
+        try:
+            while not watch.stopped.is_set():
+                try:
+                    services, new_index = self._query_services(
+                        session, service_name, datacenter, tag, index
+                    )
+                except (ServiceDiscoveryError, RequestException, ValueError) as e:
+                    logger.info(
+                        'watching %s in %s failed: %s', service_name, datacenter, e
+                    )
+                    self._first_result(watch, datacenter)
+                    index = 0
+                    watch.stopped.wait(self._retry_interval)
+                    continue
+
+                # the index must be reset if it goes backward and must never be
+                # 0 after the first query, else queries stop blocking
+                index = max(new_index, 1) if new_index >= index else 0
+                self._update(key, watch, datacenter, services)
+                self._first_result(watch, datacenter)
+                if not new_index:
+                    logger.debug('no index for %s in %s', service_name, datacenter)
+                    watch.stopped.wait(self._retry_interval)
+        finally:
+            session.close()
+
+    def _first_result(self, watch: _ServiceWatch, datacenter: str) -> None:
+        with self._lock:
+            watch.pending.discard(datacenter)
+            if watch.pending:
+                return
+        watch.ready.set()
+
+    def _query_services(
+        self,
+        session: requests.Session,
+        service_name: str,
+        datacenter: str,
+        tag: str | None,
+        index: int,
+    ) -> tuple[list[ConsulService], int]:
+        url = f'{self._health_url}/{service_name}'
+        params = self._health_params(datacenter, tag)
+        timeout = None
+        if index:
+            params['index'] = index
+            params['wait'] = f'{self._wait}s'
+            # Consul adds up to wait / 16 of jitter to blocking queries
+            timeout = self._wait + self._wait / 16 + (self._timeout or 0)
+        elif self._timeout:
+            timeout = self._timeout
+        response = session.get(url, verify=self._verify, params=params, timeout=timeout)
+        self._assert_ok(response)
+        new_index = int(response.headers.get('X-Consul-Index', 0))
+        return self._services_from_response(response), new_index
+
+    def _update(
+        self,
+        key: WatchKey,
+        watch: _ServiceWatch,
+        datacenter: str,
+        services: list[ConsulService],
+    ) -> None:
+        services = sorted(services, key=lambda service: service['ID'])
+        with self._lock:
+            if watch.stopped.is_set():
+                return
+            watch.by_datacenter[datacenter] = services
+            catalog = [
+                service
+                for dc in watch.datacenters
+                for service in watch.by_datacenter.get(dc, [])
+            ]
+            if catalog == watch.catalog:
+                return
+            watch.catalog = catalog
+            callbacks = list(self._callbacks)
+
+        service_name, tag = key
+        logger.debug('healthy %s services changed: %s', service_name, catalog)
+        for callback in callbacks:
+            try:
+                callback(service_name, tag, list(catalog))
+            except Exception:
+                logger.exception('unexpected exception from service change callback')
@@ -0,0 +1,202 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from __future__ import annotations
+
+import itertools
+import logging
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .consul_helpers import ConsulService, ServiceFinder
+
+logger = logging.getLogger(__name__)
+
+
+class NoServiceAvailable(Exception):
+    def __init__(self, service_name: str) -> None:
+        super().__init__(f'no healthy {service_name} service available')
+        self.service_name = service_name
+
+
+class InstanceStats:
+    def __init__(self) -> None:
+        self.outstanding = 0
+        self.latency: float | None = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+
+class RoundRobinStrategy:
+    def __init__(self) -> None:
+        self._counter = itertools.count()
+
+    def choose(
+        self, services: list[ConsulService], stats: dict[str, InstanceStats]
+    ) -> ConsulService:
+        return services[next(self._counter) % len(services)]
+
+
+class _TieBreakingStrategy:
+    """Break ties between equally good instances in a round-robin way"""
+
+    def __init__(self) -> None:
+        self._counter = itertools.count()
+
+    def _rotated(self, services: list[ConsulService]) -> list[ConsulService]:
+        start = next(self._counter) % len(services)
+        return services[start:] + services[:start]
+
+
+class LeastOutstandingStrategy(_TieBreakingStrategy):
+    def choose(
+        self, services: list[ConsulService], stats: dict[str, InstanceStats]
+    ) -> ConsulService:
+        return min(
+            self._rotated(services),
+            key=lambda service: stats[service['ID']].outstanding,
+        )
+
+
+class EWMAStrategy(_TieBreakingStrategy):
+    """
+    Choose the instance with the lowest expected latency, i.e. its moving
+    average latency weighted by its outstanding requests. Instances without
+    any measure yet are preferred so that they get one, the least busy first.
+    """
+
+    def choose(
+        self, services: list[ConsulService], stats: dict[str, InstanceStats]
+    ) -> ConsulService:
+        def cost(service: ConsulService) -> tuple[int, float]:
+            instance = stats[service['ID']]
+            if instance.latency is None:
+                return 0, instance.outstanding
+            return 1, instance.latency * (instance.outstanding + 1)
+
+        return min(self._rotated(services), key=cost)
+
+
+Strategy = RoundRobinStrategy | LeastOutstandingStrategy | EWMAStrategy
+
+
+class LoadBalancer:
+    """
+    Spread requests over the healthy instances of a service.
+
+    Instances failing max_failures times in a row are ejected for
+    ejection_time seconds. When every instance is ejected, all healthy
+    instances are considered again rather than failing every request.
+    """
+
+    DEFAULT_MAX_FAILURES = 3
+    DEFAULT_EJECTION_TIME = 30
+    DEFAULT_EWMA_DECAY = 0.3
+
+    def __init__(
+        self,
+        finder: ServiceFinder,
+        service_name: str,
+        xivo_uuid: str | None = None,
+        strategy: Strategy | None = None,
+        max_failures: int = DEFAULT_MAX_FAILURES,
+        ejection_time: float = DEFAULT_EJECTION_TIME,
+        ewma_decay: float = DEFAULT_EWMA_DECAY,
+    ) -> None:
+        self._finder = finder
+        self._service_name = service_name
+        self._xivo_uuid = xivo_uuid
+        self._strategy = strategy or RoundRobinStrategy()
+        self._max_failures = max_failures
+        self._ejection_time = ejection_time
+        self._ewma_decay = ewma_decay
+        self._stats: dict[str, InstanceStats] = {}
+        self._lock = threading.Lock()
+
+    def select(self) -> ConsulService:
+        services = self._finder.list_healthy_services(
+            self._service_name, self._xivo_uuid
+        )
+        if not services:
+            raise NoServiceAvailable(self._service_name)
+
+        now = time.monotonic()
+        with self._lock:
+            # instances that are no longer healthy are forgotten, service IDs
+            # change whenever an instance restarts
+            stats = self._stats = {
+                service['ID']: self._stats.get(service['ID']) or InstanceStats()
+                for service in services
+            }
+            candidates = [
+                service
+                for service in services
+                if stats[service['ID']].ejected_until <= now
+            ]
+            if not candidates:
+                logger.warning(
+                    'all %s instances are ejected, ignoring ejections',
+                    self._service_name,
+                )
+                candidates = services
+            service = self._strategy.choose(candidates, stats)
+            stats[service['ID']].outstanding += 1
+        return service
+
+    def report_success(self, service: ConsulService, duration: float) -> None:
+        with self._lock:
+            instance = self._stats.setdefault(service['ID'], InstanceStats())
+            instance.outstanding = max(instance.outstanding - 1, 0)
+            instance.consecutive_failures = 0
+            if instance.latency is None:
+                instance.latency = duration
+            else:
+                instance.latency += self._ewma_decay * (duration - instance.latency)
+
+    def report_failure(self, service: ConsulService) -> None:
+        with self._lock:
+            instance = self._stats.setdefault(service['ID'], InstanceStats())
+            instance.outstanding = max(instance.outstanding - 1, 0)
+            instance.consecutive_failures += 1
+            if instance.consecutive_failures < self._max_failures:
+                return
+            instance.consecutive_failures = 0
+            instance.ejected_until = time.monotonic() + self._ejection_time
+
+        logger.warning(
+            'ejecting %s instance %s at %s:%s for %s seconds',
+            self._service_name,
+            service['ID'],
+            service['Address'],
+            service['Port'],
+            self._ejection_time,
+        )
+
+    @contextmanager
+    def instance(self) -> Iterator[ConsulService]:
+        """
+        Select an instance and report the outcome of the request made in the
+        with block: an exception counts as a failure.
+        """
+        service = self.select()
+        start = time.monotonic()
+        try:
+            yield service
+        except Exception:
+            self.report_failure(service)
+            raise
+        except BaseException:
+            # e.g. GeneratorExit or KeyboardInterrupt, the instance did not fail
+            self._release(service)
+            raise
+        self.report_success(service, time.monotonic() - start)
+
+    def _release(self, service: ConsulService) -> None:
+        with self._lock:
+            instance = self._stats.get(service['ID'])
+            if instance is not None:
+                instance.outstanding = max(instance.outstanding - 1, 0)
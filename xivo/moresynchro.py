@@ -1,9 +1,11 @@
-# Copyright 2007-2023 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2007-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 """Supplementary synchronization primitives not provided by 'threading'
 
-- RWLock                simple implementation with timeouts, without promotion
+- RWLock                simple implementation with timeouts, without promotion,
+                        optionally instrumented
+- AsyncRWLock           the same for asyncio tasks
 
     Highly inspired from
         http://code.activestate.com/recipes/502283/
@@ -17,35 +19,163 @@
 """
 from __future__ import annotations
 
+import asyncio
+import bisect
 import threading
 import time
-from threading import Thread
+from collections import deque
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from typing import TypedDict
+
+PREFER_WRITERS = 'prefer_writers'
+PREFER_READERS = 'prefer_readers'
+FIFO = 'fifo'
+POLICIES = (PREFER_WRITERS, PREFER_READERS, FIFO)
+
+HISTOGRAM_BOUNDS = (0.0001, 0.001, 0.01, 0.1, 1.0, 10.0)
+
+
+class DurationHistogram(TypedDict):
+    count: int
+    total: float
+    max: float
+    # number of durations up to each bound in HISTOGRAM_BOUNDS, then above
+    buckets: list[int]
+
+
+class LockStatistics(TypedDict):
+    readers: int
+    waiting_readers: int
+    pending_writers: int
+    read_timeouts: int
+    write_timeouts: int
+    read_wait: DurationHistogram
+    write_wait: DurationHistogram
+    read_hold: DurationHistogram
+    write_hold: DurationHistogram
+
+
+class _Histogram:
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+    def add(self, duration: float) -> None:
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.buckets[bisect.bisect_left(HISTOGRAM_BOUNDS, duration)] += 1
+
+    def snapshot(self) -> DurationHistogram:
+        return {
+            'count': self.count,
+            'total': self.total,
+            'max': self.max,
+            'buckets': list(self.buckets),
+        }
+
+
+class _Instruments:
+    __slots__ = ('read_wait', 'write_wait', 'read_hold', 'write_hold')
+
+    def __init__(self) -> None:
+        self.read_wait = _Histogram()
+        self.write_wait = _Histogram()
+        self.read_hold = _Histogram()
+        self.write_hold = _Histogram()
+
+
+def _lock_statistics(
+    instruments: _Instruments | None,
+    readers: int,
+    waiting_readers: int,
+    pending_writers: int,
+    read_timeouts: int,
+    write_timeouts: int,
+) -> LockStatistics:
+    instruments = instruments or _Instruments()
+    return {
+        'readers': readers,
+        'waiting_readers': waiting_readers,
+        'pending_writers': pending_writers,
+        'read_timeouts': read_timeouts,
+        'write_timeouts': write_timeouts,
+        'read_wait': instruments.read_wait.snapshot(),
+        'write_wait': instruments.write_wait.snapshot(),
+        'read_hold': instruments.read_hold.snapshot(),
+        'write_hold': instruments.write_hold.snapshot(),
+    }
+
+
+class _Waiter:
+    __slots__ = ('condition', 'writer')
+
+    def __init__(self, lock: threading.Lock, writer: bool) -> None:
+        self.condition = threading.Condition(lock)
+        self.writer = writer
 
 
 class RWLock:
     """
     Simple RWLock with timeouts, without promotion.
 
-    Writers are always preferred by this implementation: if there are
-    blocked threads waiting for a write lock, current readers may request
-    more read locks (which they eventually should free, as they starve the
-    waiting writers otherwise), but a new thread requesting a read lock
-    will not be granted one, and block. This might mean starvation for
-    readers if two writer threads interweave their calls to acquireWrite()
-    without leaving a window only for readers.
+    The policy decides which of the waiting threads get the lock:
+
+    - PREFER_WRITERS (the default): if there are blocked threads waiting
+      for a write lock, current readers may request more read locks (which
+      they eventually should free, as they starve the waiting writers
+      otherwise), but a new thread requesting a read lock will not be
+      granted one, and block. This might mean starvation for readers if
+      two writer threads interweave their calls to acquire_write() without
+      leaving a window only for readers.
+    - PREFER_READERS: readers are granted the lock as long as no writer
+      holds it, even if writers are waiting. Writers may starve under a
+      steady flow of readers.
+    - FIFO: threads are served in arrival order, consecutive readers
+      sharing the lock. Neither side starves, at the cost of less
+      concurrency for readers.
+
+    Pending writers are always served in arrival order. Each of them waits
+    on its own condition, so a release only wakes the threads that can
+    actually proceed. Nested read locks are counted in thread-local
+    storage and do not touch the shared state.
 
-    Maybe optimisations could be done by adding another condition to
-    distinguish between waiting readers and waiting writers?
+    When instrumented, the lock also measures how long threads wait for
+    it and hold it, see statistics().
     """
 
-    def __init__(self) -> None:
-        self.__condition = threading.Condition(threading.Lock())
-        self.__readers: dict[Thread, int] = {}
+    def __init__(
+        self, policy: str = PREFER_WRITERS, instrumented: bool = False
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f'unknown policy: {policy}')
+        self.__policy = policy
+        self.__instruments = _Instruments() if instrumented else None
+        self.__read_timeouts = 0
+        self.__write_timeouts = 0
+        self.__write_start = 0.0
+        self.__lock = threading.Lock()
+        self.__can_read = threading.Condition(self.__lock)
+        self.__local = threading.local()
+        self.__reader_count = 0
+        self.__waiting_readers = 0
         self.__writer_lock_count = 0
-        self.__writer: Thread | None = None
-        self.__pending_writers: list[Thread] = []
+        self.__writer: int | None = None
+        self.__queue: deque[_Waiter] = deque()
+
+    @property
+    def policy(self) -> str:
+        return self.__policy
 
-    def acquire_read(self, timeout: int | None = None) -> bool | None:
+    def __read_lock_count(self) -> int:
+        return getattr(self.__local, 'count', 0)
+
+    def acquire_read(self, timeout: float | None = None) -> bool | None:
         """
         Acquire a read lock for the current thread, waiting at most
         timeout seconds or doing a non-blocking check in case timeout
@@ -57,41 +187,40 @@ class RWLock:
         If the lock has been successfully acquired, this function
         returns True, on a timeout it returns None.
         """
-        end_time: float | None = None
-        if timeout is not None:
-            end_time = time.time() + timeout
-        me = threading.currentThread()
-        self.__condition.acquire()
-        try:
-            if self.__writer is me:
-                self.__writer_lock_count += 1
-                return True
-            while True:
-                if self.__writer is None:
-                    if self.__pending_writers:
-                        if me in self.__readers:
-                            # Grant the lock anyway if we already
-                            # hold one, because this would otherwise
-                            # cause a deadlock between the pending
-                            # writers and ourselves.
-                            self.__readers[me] += 1
-                            return True
-                        # else: does nothing, will wait below
-                        # writers are given priority
-                    else:
-                        self.__readers[me] = self.__readers.get(me, 0) + 1
-                        return True
-                if end_time is not None:
-                    remaining = end_time - time.time()
-                    if remaining <= 0:
-                        return None
-                    self.__condition.wait(remaining)
-                else:
-                    self.__condition.wait()
-        finally:
-            self.__condition.release()
+        me = threading.get_ident()
+        if self.__writer == me:
+            self.__writer_lock_count += 1
+            return True
+        count = self.__read_lock_count()
+        if count:
+            # Grant the lock anyway if we already hold one, because this
+            # would otherwise cause a deadlock between the pending writers
+            # and ourselves.
+            self.__local.count = count + 1
+            return True
 
-    def acquire_write(self, timeout: int | None = None) -> bool | None:
+        start = time.perf_counter() if self.__instruments else 0.0
+        end_time = None if timeout is None else time.monotonic() + timeout
+        with self.__lock:
+            if self.__policy == FIFO:
+                acquired = self.__wait_in_queue(False, end_time)
+            else:
+                acquired = self.__wait_to_read(end_time)
+            if not acquired:
+                self.__read_timeouts += 1
+                return None
+            self.__reader_count += 1
+            if self.__policy == FIFO:
+                # let the readers queued right behind us in
+                self.__wake_up()
+            if self.__instruments:
+                now = time.perf_counter()
+                self.__instruments.read_wait.add(now - start)
+                self.__local.start = now
+        self.__local.count = 1
+        return True
+
+    def acquire_write(self, timeout: float | None = None) -> bool | None:
         """
         Acquire a write lock for the current thread, waiting at most
         timeout seconds or doing a non-blocking check in case timeout
@@ -105,39 +234,26 @@ class RWLock:
         deadlock condition is detected (the current thread already hold
         a reader lock) it returns False.
         """
-        end_time: float | None = None
-        if timeout is not None:
-            end_time = time.time() + timeout
-        me = threading.currentThread()
-        self.__condition.acquire()
-        try:
-            if self.__writer is me:
-                self.__writer_lock_count += 1
-                return True
-            if me in self.__readers:
-                # trivial deadlock detected (we do not handle promotion)
-                return False
-            self.__pending_writers.append(me)
-            while True:
-                if (
-                    not self.__readers
-                    and self.__writer is None
-                    and self.__pending_writers[0] is me
-                ):
-                    self.__writer = me
-                    self.__writer_lock_count = 1
-                    self.__pending_writers = self.__pending_writers[1:]
-                    return True
-                if end_time is not None:
-                    remaining = end_time - time.time()
-                    if remaining <= 0:
-                        self.__pending_writers.remove(me)
-                        return None
-                    self.__condition.wait(remaining)
-                else:
-                    self.__condition.wait()
-        finally:
-            self.__condition.release()
+        me = threading.get_ident()
+        if self.__writer == me:
+            self.__writer_lock_count += 1
+            return True
+        if self.__read_lock_count():
+            # trivial deadlock detected (we do not handle promotion)
+            return False
+
+        start = time.perf_counter() if self.__instruments else 0.0
+        end_time = None if timeout is None else time.monotonic() + timeout
+        with self.__lock:
+            if not self.__wait_in_queue(True, end_time):
+                self.__write_timeouts += 1
+                return None
+            self.__writer = me
+            self.__writer_lock_count = 1
+            if self.__instruments:
+                self.__write_start = time.perf_counter()
+                self.__instruments.write_wait.add(self.__write_start - start)
+            return True
 
     def release(self) -> None:
         """
@@ -146,21 +262,405 @@ class RWLock:
         In case the current thread holds no lock, a RuntimeError
         is thrown.
         """
-        me = threading.currentThread()
-        self.__condition.acquire()
-        try:
-            if self.__writer is me:
-                self.__writer_lock_count -= 1
-                if self.__writer_lock_count == 0:
+        if self.__writer == threading.get_ident():
+            self.__writer_lock_count -= 1
+            if self.__writer_lock_count == 0:
+                with self.__lock:
+                    if self.__instruments:
+                        held = time.perf_counter() - self.__write_start
+                        self.__instruments.write_hold.add(held)
                     self.__writer = None
-                    self.__condition.notifyAll()
-            elif me in self.__readers:
-                self.__readers[me] -= 1
-                if self.__readers[me] == 0:
-                    del self.__readers[me]
-                    if not self.__readers:
-                        self.__condition.notifyAll()
+                    self.__wake_up()
+            return
+
+        count = self.__read_lock_count()
+        if not count:
+            raise RuntimeError("release unlocked lock")
+        self.__local.count = count - 1
+        if count == 1:
+            with self.__lock:
+                if self.__instruments:
+                    held = time.perf_counter() - self.__local.start
+                    self.__instruments.read_hold.add(held)
+                self.__reader_count -= 1
+                self.__wake_up()
+
+    @contextmanager
+    def read_locked(self, timeout: float | None = None) -> Iterator[None]:
+        """
+        Hold a read lock for the duration of the with block.
+
+        Raises TimeoutError if the lock could not be acquired in time.
+        """
+        if not self.acquire_read(timeout):
+            raise TimeoutError('timed out waiting for a read lock')
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextmanager
+    def write_locked(self, timeout: float | None = None) -> Iterator[None]:
+        """
+        Hold a write lock for the duration of the with block.
+
+        Raises TimeoutError if the lock could not be acquired in time and
+        RuntimeError if the current thread already holds a read lock.
+        """
+        acquired = self.acquire_write(timeout)
+        if acquired is False:
+            raise RuntimeError('cannot acquire a write lock while holding a read lock')
+        if not acquired:
+            raise TimeoutError('timed out waiting for a write lock')
+        try:
+            yield
+        finally:
+            self.release()
+
+    def statistics(self) -> LockStatistics:
+        """
+        Return a snapshot of the lock state and, if the lock is instrumented,
+        of the durations measured so far. Durations are in seconds.
+        """
+        with self.__lock:
+            if self.__policy == FIFO:
+                pending_writers = sum(waiter.writer for waiter in self.__queue)
+                waiting_readers = len(self.__queue) - pending_writers
+            else:
+                pending_writers = len(self.__queue)
+                waiting_readers = self.__waiting_readers
+            return _lock_statistics(
+                self.__instruments,
+                readers=self.__reader_count,
+                waiting_readers=waiting_readers,
+                pending_writers=pending_writers,
+                read_timeouts=self.__read_timeouts,
+                write_timeouts=self.__write_timeouts,
+            )
+
+    # The methods below must be called with the lock held
+
+    def __may_read(self) -> bool:
+        if self.__writer is not None:
+            return False
+        return self.__policy == PREFER_READERS or not self.__queue
+
+    def __may_write(self, waiter: _Waiter | None) -> bool:
+        if self.__writer is not None or self.__reader_count:
+            return False
+        if self.__policy == PREFER_READERS and self.__waiting_readers:
+            return False
+        if waiter is None:
+            return not self.__queue
+        return self.__queue[0] is waiter
+
+    def __wait_to_read(self, end_time: float | None) -> bool:
+        self.__waiting_readers += 1
+        while not self.__may_read():
+            if not self.__wait(self.__can_read, end_time):
+                self.__waiting_readers -= 1
+                self.__wake_up()
+                return False
+        self.__waiting_readers -= 1
+        return True
+
+    def __wait_in_queue(self, writer: bool, end_time: float | None) -> bool:
+        if writer and self.__may_write(None):
+            return True
+        if not writer and self.__writer is None and not self.__queue:
+            return True
+
+        waiter = _Waiter(self.__lock, writer)
+        self.__queue.append(waiter)
+        while not self.__may_proceed(waiter):
+            if not self.__wait(waiter.condition, end_time):
+                self.__queue.remove(waiter)
+                self.__wake_up()
+                return False
+        self.__queue.popleft()
+        return True
+
+    def __may_proceed(self, waiter: _Waiter) -> bool:
+        if waiter.writer:
+            return self.__may_write(waiter)
+        return self.__writer is None and self.__queue[0] is waiter
+
+    @staticmethod
+    def __wait(condition: threading.Condition, end_time: float | None) -> bool:
+        if end_time is None:
+            condition.wait()
+            return True
+        remaining = end_time - time.monotonic()
+        if remaining <= 0:
+            return False
+        condition.wait(remaining)
+        return True
+
+    def __wake_up(self) -> None:
+        if self.__writer is not None:
+            return
+        if self.__policy == PREFER_WRITERS and not self.__queue:
+            self.__can_read.notify_all()
+        elif self.__policy == PREFER_READERS and self.__waiting_readers:
+            self.__can_read.notify_all()
+        elif self.__queue:
+            head = self.__queue[0]
+            if not head.writer or not self.__reader_count:
+                head.condition.notify()
+
+
+class _AsyncWaiter:
+    __slots__ = ('future', 'task', 'writer')
+
+    def __init__(self, task: asyncio.Task, writer: bool) -> None:
+        self.future: asyncio.Future[None] = task.get_loop().create_future()
+        self.task = task
+        self.writer = writer
+
+
+class AsyncRWLock:
+    """
+    RWLock for asyncio tasks, with the same policies, timeouts and
+    statistics as the thread-based RWLock. Locks are held by tasks rather
+    than threads.
+
+    The lock is handed over directly to the waiting tasks when it is
+    released, so that a task woken up never finds it taken again.
+    """
+
+    def __init__(
+        self, policy: str = PREFER_WRITERS, instrumented: bool = False
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f'unknown policy: {policy}')
+        self.__policy = policy
+        self.__instruments = _Instruments() if instrumented else None
+        self.__readers: dict[asyncio.Task, int] = {}
+        self.__read_starts: dict[asyncio.Task, float] = {}
+        self.__writer: asyncio.Task | None = None
+        self.__writer_lock_count = 0
+        self.__write_start = 0.0
+        # pending writers, and readers as well with the FIFO policy
+        self.__queue: deque[_AsyncWaiter] = deque()
+        self.__read_waiters: deque[_AsyncWaiter] = deque()
+        self.__read_timeouts = 0
+        self.__write_timeouts = 0
+
+    @property
+    def policy(self) -> str:
+        return self.__policy
+
+    async def acquire_read(self, timeout: float | None = None) -> bool | None:
+        """
+        Acquire a read lock for the current task, waiting at most timeout
+        seconds or doing a non-blocking check in case timeout is <= 0.
+
+        Returns True once the lock is acquired and None on a timeout.
+        """
+        task = _current_task()
+        if self.__writer is task:
+            self.__writer_lock_count += 1
+            return True
+        if task in self.__readers:
+            self.__readers[task] += 1
+            return True
+
+        start = time.perf_counter() if self.__instruments else 0.0
+        if self.__writer is None and (
+            self.__policy == PREFER_READERS or not self.__queue
+        ):
+            self.__grant_read(task)
+        else:
+            waiter = _AsyncWaiter(task, writer=False)
+            if self.__policy == FIFO:
+                self.__queue.append(waiter)
             else:
-                raise RuntimeError("release unlocked lock")
+                self.__read_waiters.append(waiter)
+            if not await self.__wait(waiter, timeout):
+                self.__read_timeouts += 1
+                return None
+        if self.__instruments:
+            self.__instruments.read_wait.add(self.__read_starts[task] - start)
+        return True
+
+    async def acquire_write(self, timeout: float | None = None) -> bool | None:
+        """
+        Acquire a write lock for the current task, waiting at most timeout
+        seconds or doing a non-blocking check in case timeout is <= 0.
+
+        Returns True once the lock is acquired and None on a timeout. In
+        case the current task already holds a read lock, it returns False.
+        """
+        task = _current_task()
+        if self.__writer is task:
+            self.__writer_lock_count += 1
+            return True
+        if task in self.__readers:
+            # trivial deadlock detected (we do not handle promotion)
+            return False
+
+        start = time.perf_counter() if self.__instruments else 0.0
+        if self.__writer is None and not self.__readers and not self.__queue:
+            self.__grant_write(task)
+        else:
+            waiter = _AsyncWaiter(task, writer=True)
+            self.__queue.append(waiter)
+            if not await self.__wait(waiter, timeout):
+                self.__write_timeouts += 1
+                return None
+        if self.__instruments:
+            self.__instruments.write_wait.add(self.__write_start - start)
+        return True
+
+    def release(self) -> None:
+        """
+        Release the lock held by the current task.
+
+        In case the current task holds no lock, a RuntimeError is thrown.
+        """
+        task = _current_task()
+        if self.__writer is task:
+            self.__writer_lock_count -= 1
+            if self.__writer_lock_count == 0:
+                if self.__instruments:
+                    held = time.perf_counter() - self.__write_start
+                    self.__instruments.write_hold.add(held)
+                self.__writer = None
+                self.__wake_up()
+            return
+
+        count = self.__readers.get(task)
+        if not count:
+            raise RuntimeError("release unlocked lock")
+        if count > 1:
+            self.__readers[task] = count - 1
+            return
+        del self.__readers[task]
+        start = self.__read_starts.pop(task, None)
+        if self.__instruments and start is not None:
+            self.__instruments.read_hold.add(time.perf_counter() - start)
+        self.__wake_up()
+
+    @asynccontextmanager
+    async def read_locked(self, timeout: float | None = None) -> AsyncIterator[None]:
+        """
+        Hold a read lock for the duration of the async with block.
+
+        Raises TimeoutError if the lock could not be acquired in time.
+        """
+        if not await self.acquire_read(timeout):
+            raise TimeoutError('timed out waiting for a read lock')
+        try:
+            yield
         finally:
-            self.__condition.release()
+            self.release()
+
+    @asynccontextmanager
+    async def write_locked(self, timeout: float | None = None) -> AsyncIterator[None]:
+        """
+        Hold a write lock for the duration of the async with block.
+
+        Raises TimeoutError if the lock could not be acquired in time and
+        RuntimeError if the current task already holds a read lock.
+        """
+        acquired = await self.acquire_write(timeout)
+        if acquired is False:
+            raise RuntimeError('cannot acquire a write lock while holding a read lock')
+        if not acquired:
+            raise TimeoutError('timed out waiting for a write lock')
+        try:
+            yield
+        finally:
+            self.release()
+
+    def statistics(self) -> LockStatistics:
+        """
+        Return a snapshot of the lock state and, if the lock is instrumented,
+        of the durations measured so far. Durations are in seconds.
+        """
+        pending_writers = sum(waiter.writer for waiter in self.__queue)
+        waiting_readers = len(self.__queue) - pending_writers + len(self.__read_waiters)
+        return _lock_statistics(
+            self.__instruments,
+            readers=len(self.__readers),
+            waiting_readers=waiting_readers,
+            pending_writers=pending_writers,
+            read_timeouts=self.__read_timeouts,
+            write_timeouts=self.__write_timeouts,
+        )
+
+    async def __wait(self, waiter: _AsyncWaiter, timeout: float | None) -> bool:
+        if timeout is not None and timeout <= 0:
+            self.__forget(waiter)
+            return False
+        try:
+            async with asyncio.timeout(timeout):
+                await waiter.future
+        except TimeoutError:
+            # the lock may have been handed over just before the timeout
+            if self.__granted(waiter):
+                return True
+            self.__forget(waiter)
+            return False
+        except asyncio.CancelledError:
+            if self.__granted(waiter):
+                self.release()
+            else:
+                self.__forget(waiter)
+            raise
+        return True
+
+    @staticmethod
+    def __granted(waiter: _AsyncWaiter) -> bool:
+        return waiter.future.done() and not waiter.future.cancelled()
+
+    def __forget(self, waiter: _AsyncWaiter) -> None:
+        waiter.future.cancel()
+        for waiters in (self.__queue, self.__read_waiters):
+            if waiter in waiters:
+                waiters.remove(waiter)
+        self.__wake_up()
+
+    def __grant_read(self, task: asyncio.Task) -> None:
+        self.__readers[task] = 1
+        if self.__instruments:
+            self.__read_starts[task] = time.perf_counter()
+
+    def __grant_write(self, task: asyncio.Task) -> None:
+        self.__writer = task
+        self.__writer_lock_count = 1
+        if self.__instruments:
+            self.__write_start = time.perf_counter()
+
+    def __wake_up(self) -> None:
+        if self.__writer is not None:
+            return
+        while self.__queue and self.__queue[0].future.done():
+            self.__queue.popleft()
+        if self.__policy != PREFER_WRITERS or not self.__queue:
+            while self.__read_waiters:
+                waiter = self.__read_waiters.popleft()
+                if not waiter.future.done():
+                    self.__grant_read(waiter.task)
+                    waiter.future.set_result(None)
+        while self.__queue:
+            waiter = self.__queue[0]
+            if waiter.future.done():
+                self.__queue.popleft()
+            elif waiter.writer:
+                if not self.__readers:
+                    self.__queue.popleft()
+                    self.__grant_write(waiter.task)
+                    waiter.future.set_result(None)
+                return
+            else:
+                self.__queue.popleft()
+                self.__grant_read(waiter.task)
+                waiter.future.set_result(None)
+
+
+def _current_task() -> asyncio.Task:
+    task = asyncio.current_task()
+    if task is None:
+        raise RuntimeError('AsyncRWLock must be used from a task')
+    return task
@@ -1,29 +1,525 @@
-# Copyright 2007-2025 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2007-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from __future__ import annotations
 
+import asyncio
+import inspect
 import logging
 import threading
+import time
 import uuid
-from collections import defaultdict
-from collections.abc import Callable
+import weakref
+from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import Callable, Generator, Hashable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
 from functools import partial
-from typing import Any, DefaultDict
+from typing import Any, TypedDict
 
 logger = logging.getLogger(__name__)
 
 Callback = Callable[[str | None], None]
-ExceptionHandler = Callable[[Callback, str | None, Exception], None]
+BatchCallbackFunction = Callable[[list[str | None]], None]
+# handlers receive the list of messages when a BatchCallback fails
+ExceptionHandler = Callable[[Callable[..., None], Any, Exception], None]
+# dispatched messages are either one message or a list of messages
+Deliver = Callable[[Callback, Any], None]
+# queued deliveries keep the list of messages they were published with, if any
+_Queued = tuple[Deliver, Any, 'list[Any] | None']
 
 
-class Pubsub:
+class Dispatcher(ABC):
+    """Decide where and when subscribers are called with published messages"""
+
+    @abstractmethod
+    def dispatch(self, deliver: Deliver, callback: Callback, message: Any) -> None:
+        pass
+
+    def dispatch_many(
+        self, deliver: Deliver, callback: Callback, messages: list[Any]
+    ) -> None:
+        """deliver expects the list of messages"""
+        self.dispatch(deliver, callback, messages)
+
+    def close(self) -> None:
+        pass
+
+
+class InlineDispatcher(Dispatcher):
+    """Call subscribers in the publisher's thread"""
+
+    def dispatch(self, deliver: Deliver, callback: Callback, message: Any) -> None:
+        deliver(callback, message)
+
+
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_DROP_NEWEST = 'drop_newest'
+OVERFLOW_COALESCE = 'coalesce'
+OVERFLOW_POLICIES = (
+    OVERFLOW_BLOCK,
+    OVERFLOW_DROP_OLDEST,
+    OVERFLOW_DROP_NEWEST,
+    OVERFLOW_COALESCE,
+)
+
+
+class QueueStatistics(TypedDict):
+    depth: int
+    max_depth: int
+    dropped: int
+    coalesced: int
+
+
+class _QueueCounters:
+    __slots__ = ('max_depth', 'dropped', 'coalesced')
+
+    def __init__(self) -> None:
+        self.max_depth = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+
+class ThreadPoolDispatcher(Dispatcher):
+    """
+    Call subscribers on a bounded pool of threads.
+
+    Each subscriber receives its messages one at a time, in the order they
+    were published, so a slow subscriber only delays its own messages.
+
+    When max_queue_size is set, the messages waiting for a subscriber are
+    bounded and the overflow policy decides what happens to a message
+    published to a full queue:
+
+    - block: the publisher waits until the subscriber catches up
+    - drop_oldest: the oldest waiting message is dropped
+    - drop_newest: the published message is dropped
+    - coalesce: the published message replaces the waiting message with the
+      same coalesce_key(message), else the oldest waiting message is dropped
+
+    The messages of publish_many are queued one by one, and those still
+    waiting together are delivered together.
+
+    The statistics of a subscriber are kept until it is garbage collected.
+    Those of subscribers that cannot be weakly referenced are kept until
+    their queue is empty.
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        max_queue_size: int | None = None,
+        overflow: str = OVERFLOW_BLOCK,
+        coalesce_key: Callable[[Any], Hashable] | None = None,
+    ) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'unknown overflow policy: {overflow}')
+        if overflow == OVERFLOW_COALESCE and coalesce_key is None:
+            raise ValueError('coalesce_key is required to coalesce messages')
+
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='pubsub')
+        self._queues: dict[Callback, deque[_Queued]] = {}
+        self._counters: weakref.WeakKeyDictionary[
+            Callback, _QueueCounters
+        ] = weakref.WeakKeyDictionary()
+        self._queued_counters: dict[Callback, _QueueCounters] = {}
+        self._max_queue_size = max_queue_size
+        self._overflow = overflow
+        self._coalesce_key = coalesce_key
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+
+    def dispatch(self, deliver: Deliver, callback: Callback, message: Any) -> None:
+        self._enqueue(callback, [(deliver, message, None)])
+
+    def dispatch_many(
+        self, deliver: Deliver, callback: Callback, messages: list[Any]
+    ) -> None:
+        self._enqueue(callback, [(deliver, message, messages) for message in messages])
+
+    def _enqueue(self, callback: Callback, entries: list[_Queued]) -> None:
+        with self._lock:
+            counters = self._queue_counters(callback)
+            for entry in entries:
+                if not self._make_room(callback, entry, counters):
+                    continue
+                queue = self._queues.get(callback)
+                if queue is None:
+                    queue = self._queues[callback] = deque()
+                    self._executor.submit(self._drain, callback)
+                queue.append(entry)
+                counters.max_depth = max(counters.max_depth, len(queue))
+
+    def _make_room(
+        self, callback: Callback, entry: _Queued, counters: _QueueCounters
+    ) -> bool:
+        """Apply the overflow policy and return whether to queue the entry"""
+        while True:
+            queue = self._queues.get(callback)
+            if queue is None or not self._max_queue_size:
+                return True
+            if len(queue) < self._max_queue_size:
+                return True
+            if self._overflow == OVERFLOW_BLOCK:
+                self._not_full.wait()
+                continue
+            if self._overflow == OVERFLOW_DROP_NEWEST:
+                counters.dropped += 1
+                return False
+            if self._overflow == OVERFLOW_COALESCE and self._coalesce(queue, entry):
+                counters.coalesced += 1
+                return False
+            queue.popleft()
+            counters.dropped += 1
+            return True
+
+    def _queue_counters(self, callback: Callback) -> _QueueCounters:
+        try:
+            counters = self._counters.get(callback)
+            if counters is None:
+                counters = self._counters[callback] = _QueueCounters()
+        except TypeError:
+            counters = self._queued_counters.get(callback)
+            if counters is None:
+                counters = self._queued_counters[callback] = _QueueCounters()
+        return counters
+
+    def statistics(self) -> dict[Callback, QueueStatistics]:
+        with self._lock:
+            return {
+                callback: {
+                    'depth': len(self._queues.get(callback, ())),
+                    'max_depth': counters.max_depth,
+                    'dropped': counters.dropped,
+                    'coalesced': counters.coalesced,
+                }
+                for callback, counters in [
+                    *self._counters.items(),
+                    *self._queued_counters.items(),
+                ]
+            }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _coalesce(self, queue: deque[_Queued], entry: _Queued) -> bool:
+        assert self._coalesce_key is not None
+        key = self._coalesce_key(entry[1])
+        for i, (_, queued_message, _) in enumerate(queue):
+            if self._coalesce_key(queued_message) == key:
+                queue[i] = entry
+                return True
+        return False
+
+    def _drain(self, callback: Callback) -> None:
+        while True:
+            with self._lock:
+                queue = self._queues[callback]
+                if not queue:
+                    del self._queues[callback]
+                    self._queued_counters.pop(callback, None)
+                    self._not_full.notify_all()
+                    return
+                deliver, message, published = queue.popleft()
+                if published is not None:
+                    message = [message]
+                    while queue and queue[0][2] is published:
+                        message.append(queue.popleft()[1])
+                self._not_full.notify_all()
+            deliver(callback, message)
+
+
+class AsyncioDispatcher(Dispatcher):
+    """
+    Call subscribers from an asyncio event loop, which may run in another
+    thread than the publisher's.
+
+    Subscribers may be coroutine functions: their coroutines are run as tasks
+    of the loop and their exceptions are sent to the exception handler.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def dispatch(self, deliver: Deliver, callback: Callback, message: Any) -> None:
+        self._loop.call_soon_threadsafe(deliver, callback, message)
+
+
+class _TopicNode:
+    __slots__ = ('children', 'callbacks')
+
     def __init__(self) -> None:
-        self._subscribers: DefaultDict[str, list[Callback]] = defaultdict(list)
+        self.children: dict[str, _TopicNode] = {}
+        self.callbacks: tuple[Callback, ...] = ()
+
+
+class _TopicTrie:
+    """
+    Wildcard subscriptions indexed by topic words, with the AMQP topic
+    semantics: words are separated by dots, '*' matches exactly one word and
+    '#' matches zero or more words.
+
+    Writers must be serialized by the caller. Nodes are only ever looked up
+    and their callbacks replaced, never mutated, so match() is safe without
+    locking.
+    """
+
+    def __init__(self) -> None:
+        self._root = _TopicNode()
+
+    def __bool__(self) -> bool:
+        return bool(self._root.children)
+
+    def set(self, pattern: str, callbacks: tuple[Callback, ...]) -> None:
+        words = pattern.split('.')
+        if callbacks:
+            node = self._root
+            for word in words:
+                if (child := node.children.get(word)) is None:
+                    child = node.children[word] = _TopicNode()
+                node = child
+            node.callbacks = callbacks
+            return
+
+        path = [self._root]
+        for word in words:
+            child = path[-1].children.get(word)
+            if child is None:
+                return
+            path.append(child)
+
+        path[-1].callbacks = ()
+        for word, parent, node in zip(
+            reversed(words), reversed(path[:-1]), reversed(path)
+        ):
+            if node.callbacks or node.children:
+                break
+            del parent.children[word]
+
+    def match(self, topic: str) -> list[tuple[Callback, ...]]:
+        """Return the subscribers of each pattern matching the topic"""
+        matches: dict[int, _TopicNode] = {}
+        self._match(self._root, topic.split('.'), 0, matches)
+        return [node.callbacks for node in matches.values()]
+
+    def _match(
+        self,
+        node: _TopicNode,
+        words: list[str],
+        position: int,
+        matches: dict[int, _TopicNode],
+    ) -> None:
+        if hash_node := node.children.get('#'):
+            for next_position in range(position, len(words) + 1):
+                self._match(hash_node, words, next_position, matches)
+
+        if position == len(words):
+            if node.callbacks:
+                matches[id(node)] = node
+            return
+
+        if child := node.children.get(words[position]):
+            self._match(child, words, position + 1, matches)
+        if star_node := node.children.get('*'):
+            self._match(star_node, words, position + 1, matches)
+
+
+def _is_wildcard(topic: str) -> bool:
+    return any(word in ('*', '#') for word in topic.split('.'))
+
+
+def _merge_subscribers(groups: list[tuple[Callback, ...]]) -> tuple[Callback, ...]:
+    """
+    Merge the subscribers of several patterns matching a topic. Like an AMQP
+    queue with several bindings, a callback is called once however many
+    patterns it matches through, but as many times as it subscribed to one
+    of them.
+    """
+    counts: dict[Callback, int] = {}
+    for group in groups:
+        group_counts: dict[Callback, int] = {}
+        for callback in group:
+            group_counts[callback] = group_counts.get(callback, 0) + 1
+        for callback, count in group_counts.items():
+            if count > counts.get(callback, 0):
+                counts[callback] = count
+    return tuple(callback for callback, count in counts.items() for _ in range(count))
+
+
+class BatchCallback:
+    """
+    Wrap a callback taking a list of messages, so that publish_many calls it
+    once with all the messages. publish calls it with a list of one message.
+    """
+
+    def __init__(self, callback: BatchCallbackFunction) -> None:
+        self.batch = callback
+
+    def __call__(self, message: str | None) -> None:
+        self.batch([message])
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, BatchCallback) and other.batch == self.batch
+
+    def __hash__(self) -> int:
+        return hash(self.batch)
+
+    def __repr__(self) -> str:
+        return f'BatchCallback({self.batch!r})'
+
+
+# the duration of one delivery of a message in DURATION_SAMPLING is measured
+DURATION_SAMPLING = 16
+
+
+class TopicStatistics(TypedDict):
+    published: int
+    delivered: int
+    failed: int
+    average_duration: float
+
+
+class _TopicCounters:
+    """Counters of one topic, only ever changed by one thread"""
+
+    __slots__ = (
+        'published',
+        'messages',
+        'failed',
+        'sampled_messages',
+        'sampled_duration',
+    )
+
+    def __init__(self) -> None:
+        self.published = 0
+        self.messages = 0
+        self.failed = 0
+        self.sampled_messages = 0
+        self.sampled_duration = 0.0
+
+    def add(self, other: _TopicCounters) -> None:
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def snapshot(self) -> TopicStatistics:
+        sampled = self.sampled_messages
+        return {
+            'published': self.published,
+            'delivered': self.messages - self.failed,
+            'failed': self.failed,
+            'average_duration': self.sampled_duration / sampled if sampled else 0.0,
+        }
+
+
+class _CountedTopic:
+    """Deliver functions counting into the statistics of one topic"""
+
+    __slots__ = ('key', '_pubsub', '_local')
+
+    def __init__(self, pubsub: Pubsub, key: str) -> None:
+        self.key = key
+        self._pubsub = pubsub
+        # the counters of the current thread, to count without locking
+        self._local = threading.local()
+
+    def counters(self) -> _TopicCounters:
+        try:
+            return self._local.counters
+        except AttributeError:
+            counters = self._local.counters = self._pubsub._counters(self.key)
+            return counters
+
+    def deliver(self, callback: Callback, message: str | None) -> None:
+        try:
+            counters = self._local.counters
+        except AttributeError:
+            counters = self.counters()
+
+        counters.messages += 1
+        if counters.messages % DURATION_SAMPLING == 1:
+            self._deliver_timed(counters, callback, message)
+            return
+
+        try:
+            self._pubsub._call(callback, message)
+        except Exception as e:
+            counters.failed += 1
+            self._pubsub._exception_handler(callback, message, e)
+
+    def deliver_sequence(self, callback: Callback, messages: list[str | None]) -> None:
+        # the duration of a sequence is shared by its messages, so always measured
+        counters = self.counters()
+        counters.messages += len(messages)
+        start = time.perf_counter()
+        counters.failed += self._pubsub._run_sequence(callback, messages)
+        counters.sampled_duration += time.perf_counter() - start
+        counters.sampled_messages += len(messages)
+
+    def _deliver_timed(
+        self, counters: _TopicCounters, callback: Callback, message: str | None
+    ) -> None:
+        start = time.perf_counter()
+        try:
+            self._pubsub._call(callback, message)
+        except Exception as e:
+            counters.failed += 1
+            error: Exception | None = e
+        else:
+            error = None
+        counters.sampled_duration += time.perf_counter() - start
+        counters.sampled_messages += 1
+        if error is not None:
+            self._pubsub._exception_handler(callback, message, error)
+
+
+# statistics of the topics published past max_statistics_topics
+OTHER_TOPICS = '(other topics)'
+
+
+class Pubsub:
+    """
+    Topics may contain the wildcards of AMQP topic exchanges: '*' matches one
+    dot-separated word and '#' matches zero or more words. A callback matching
+    a published topic through several topics it subscribed to is called once.
+
+    In high throughput mode, nothing is logged when publishing. Per-topic
+    counters are kept instead and returned by statistics(). Each thread
+    counts in its own counters, which statistics() adds up, and the duration
+    of one message in DURATION_SAMPLING is measured. Topics published after
+    max_statistics_topics other topics are counted together as OTHER_TOPICS.
+    """
+
+    DEFAULT_MAX_STATISTICS_TOPICS = 1000
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher | None = None,
+        high_throughput: bool = False,
+        max_statistics_topics: int = DEFAULT_MAX_STATISTICS_TOPICS,
+    ) -> None:
+        # subscribers are copied on write so that publish never locks
+        self._subscribers: dict[str, tuple[Callback, ...]] = {}
+        self._wildcard_subscribers = _TopicTrie()
+        self._subscription_counts: dict[str, dict[Callback, int]] = {}
+        self._lock = threading.Lock()
         self._exception_handler: ExceptionHandler = self.default_exception_handler
+        self._dispatcher = dispatcher or InlineDispatcher()
+        self._high_throughput = high_throughput
+        self._max_statistics_topics = max_statistics_topics
+        self._counted_topics: dict[str, _CountedTopic] = {}
+        self._other_topics = _CountedTopic(self, OTHER_TOPICS)
+        self._local = threading.local()
+        self._thread_counters: list[
+            tuple[threading.Thread, dict[str, _TopicCounters]]
+        ] = []
+        # counters of the threads that exited
+        self._retired_counters: dict[str, _TopicCounters] = {}
+        # keeps the tasks of coroutine subscribers alive until they are done
+        self._tasks: set[asyncio.Future[Any]] = set()
 
     def default_exception_handler(
-        self, _: Callback, __: str | None, exception: Exception
+        self, _: Callable[..., None], __: Any, exception: Exception
     ) -> None:
         logger.exception(exception)
 
@@ -33,17 +529,153 @@ class Pubsub:
 
     def subscribe(self, topic: str, callback: Callback) -> None:
         logger.debug('Subscribing callback "%s" to topic "%s"', callback, topic)
-        self._subscribers[topic].append(callback)
+        with self._lock:
+            counts = self._subscription_counts.setdefault(topic, {})
+            counts[callback] = counts.get(callback, 0) + 1
+            self._update_subscribers(topic, counts)
 
     def publish(self, topic: str, message: str | None) -> None:
-        logger.debug('Publishing to topic "%s": "%s"', topic, message)
-        for callback in self._subscribers[topic]:
-            self.publish_one(callback, message)
+        callbacks = self._resolve(topic)
+
+        deliver: Deliver
+        if self._high_throughput:
+            counted_topic = self._counted_topics.get(topic) or self._counted_topic(
+                topic
+            )
+            counted_topic.counters().published += 1
+            deliver = counted_topic.deliver
+        else:
+            logger.debug('Publishing to topic "%s": "%s"', topic, message)
+            deliver = self.publish_one
+
+        for callback in callbacks:
+            self._dispatcher.dispatch(deliver, callback, message)
+
+    def publish_many(self, topic: str, messages: Iterable[str | None]) -> None:
+        """
+        Publish messages in order, resolving the subscribers of the topic once.
+        BatchCallback subscribers are called once with the list of messages.
+        """
+        messages = list(messages)
+        if not messages:
+            return
+        callbacks = self._resolve(topic)
+
+        deliver: Deliver
+        if self._high_throughput:
+            counted_topic = self._counted_topics.get(topic) or self._counted_topic(
+                topic
+            )
+            counted_topic.counters().published += len(messages)
+            deliver = counted_topic.deliver_sequence
+        else:
+            logger.debug('Publishing %s messages to topic "%s"', len(messages), topic)
+            deliver = self._deliver_sequence
+
+        for callback in callbacks:
+            self._dispatcher.dispatch_many(deliver, callback, messages)
+
+    def _resolve(self, topic: str) -> tuple[Callback, ...]:
+        callbacks = self._subscribers.get(topic, ())
+        if not self._wildcard_subscribers:
+            return callbacks
+
+        groups = self._wildcard_subscribers.match(topic)
+        if not groups:
+            return callbacks
+        if callbacks:
+            groups.append(callbacks)
+        elif len(groups) == 1:
+            return groups[0]
+        return _merge_subscribers(groups)
+
+    def _counted_topic(self, topic: str) -> _CountedTopic:
+        if len(self._counted_topics) >= self._max_statistics_topics:
+            return self._other_topics
+
+        with self._lock:
+            counted_topic = self._counted_topics.get(topic)
+            if counted_topic is None:
+                if len(self._counted_topics) >= self._max_statistics_topics:
+                    return self._other_topics
+                counted_topic = _CountedTopic(self, topic)
+                self._counted_topics = {**self._counted_topics, topic: counted_topic}
+            return counted_topic
+
+    def _counters(self, key: str) -> _TopicCounters:
+        try:
+            counters_by_key = self._local.counters
+        except AttributeError:
+            counters_by_key = self._local.counters = {}
+            with self._lock:
+                self._retire_thread_counters()
+                self._thread_counters.append(
+                    (threading.current_thread(), counters_by_key)
+                )
+
+        counters = counters_by_key.get(key)
+        if counters is None:
+            counters = counters_by_key[key] = _TopicCounters()
+        return counters
+
+    def _retire_thread_counters(self) -> None:
+        """Add the counters of exited threads to the retired ones"""
+        alive = []
+        for thread, counters_by_key in self._thread_counters:
+            if thread.is_alive():
+                alive.append((thread, counters_by_key))
+                continue
+            for key, counters in counters_by_key.items():
+                retired = self._retired_counters.get(key)
+                if retired is None:
+                    retired = self._retired_counters[key] = _TopicCounters()
+                retired.add(counters)
+        self._thread_counters = alive
+
+    def _deliver_sequence(self, callback: Callback, messages: list[str | None]) -> None:
+        self._run_sequence(callback, messages)
+
+    def _run_sequence(self, callback: Callback, messages: list[str | None]) -> int:
+        """Deliver messages to a callback and return the number of failures"""
+        if isinstance(callback, BatchCallback):
+            try:
+                self._call(callback.batch, messages)
+            except Exception as e:
+                self._exception_handler(callback, messages, e)
+                return len(messages)
+            return 0
+
+        failed = 0
+        for message in messages:
+            try:
+                self._call(callback, message)
+            except Exception as e:
+                failed += 1
+                self._exception_handler(callback, message, e)
+        return failed
+
+    def statistics(self) -> dict[str, TopicStatistics]:
+        with self._lock:
+            self._retire_thread_counters()
+            counters_by_thread = [c for _, c in self._thread_counters]
+            totals: dict[str, _TopicCounters] = {}
+            for key, retired in self._retired_counters.items():
+                totals[key] = _TopicCounters()
+                totals[key].add(retired)
+
+        for counters_by_key in counters_by_thread:
+            # the thread may add topics meanwhile, but never removes any
+            for key, counters in list(counters_by_key.items()):
+                total = totals.get(key)
+                if total is None:
+                    total = totals[key] = _TopicCounters()
+                total.add(counters)
+        return {key: total.snapshot() for key, total in totals.items()}
 
     def publish_one(self, callback: Callback, message: str | None) -> None:
         logger.debug('Publishing to callback "%s": "%s"', callback, message)
         try:
-            callback(message)
+            self._call(callback, message)
         except Exception as e:
             logger.debug(
                 'Publishing failed. Running exception handler "%s"',
@@ -51,45 +683,144 @@ class Pubsub:
             )
             self._exception_handler(callback, message, e)
 
+    def _call(self, callback: Callable[[Any], Any], message: Any) -> None:
+        result = callback(message)
+        if result is not None and inspect.isawaitable(result):
+            self._schedule(callback, message, result)
+
+    def _schedule(
+        self, callback: Callable[..., Any], message: Any, awaitable: Any
+    ) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            if inspect.iscoroutine(awaitable):
+                awaitable.close()
+            raise TypeError(
+                f'{callback} is a coroutine function but no event loop is running,'
+                ' use an AsyncioDispatcher'
+            )
+
+        task = asyncio.ensure_future(awaitable, loop=loop)
+        self._tasks.add(task)
+
+        def on_done(task: asyncio.Future[Any]) -> None:
+            self._tasks.discard(task)
+            if task.cancelled():
+                return
+            exception = task.exception()
+            if isinstance(exception, Exception):
+                self._exception_handler(callback, message, exception)
+
+        task.add_done_callback(on_done)
+
     def unsubscribe(self, topic: str, callback: Callback) -> None:
         logger.debug('Unsubscribing callback "%s" to topic "%s"', callback, topic)
-        try:
-            self._subscribers[topic].remove(callback)
-        except ValueError:
-            pass
+        with self._lock:
+            counts = self._subscription_counts.get(topic)
+            if not counts or callback not in counts:
+                return
+
+            counts[callback] -= 1
+            if not counts[callback]:
+                del counts[callback]
+            if not counts:
+                del self._subscription_counts[topic]
+            self._update_subscribers(topic, counts)
 
-        if not self._subscribers[topic]:
+    def _update_subscribers(self, topic: str, counts: dict[Callback, int]) -> None:
+        callbacks = tuple(
+            callback for callback, count in counts.items() for _ in range(count)
+        )
+        if _is_wildcard(topic):
+            self._wildcard_subscribers.set(topic, callbacks)
+        elif callbacks:
+            self._subscribers[topic] = callbacks
+        else:
             self._subscribers.pop(topic, None)
 
+    def close(self) -> None:
+        self._dispatcher.close()
+
 
 class CallbackCollector:
-    _TOPIC = 'callback-collector'
+    """
+    Call subscribers once every source callback has been called.
+
+    Works as a countdown: each new_source() adds one callback to wait for.
+    Completion can also be awaited through wait(), the future property or
+    directly with await from a coroutine.
+    """
 
     def __init__(self) -> None:
-        self._pubsub = Pubsub()
         self._sources: set[uuid.UUID] = set()
+        self._callbacks: list[Callable[[], None]] = []
+        self._completed = False
+        self._future: Future[None] = Future()
         self._lock = threading.Lock()
+        self._exception_handler: ExceptionHandler = self.default_exception_handler
+
+    def default_exception_handler(
+        self, _: Callable[..., None], __: Any, exception: Exception
+    ) -> None:
+        logger.exception(exception)
+
+    def set_exception_handler(self, exception_handler: ExceptionHandler) -> None:
+        """Expected handler interface: handler(listener, message, exception)"""
+        self._exception_handler = exception_handler
+
+    @property
+    def future(self) -> Future[None]:
+        return self._future
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Wait for all sources to be collected, return False on timeout"""
+        try:
+            self._future.result(timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    def __await__(self) -> Generator[Any, None, None]:
+        return asyncio.wrap_future(self._future).__await__()
 
     def _collect(self, source_id: uuid.UUID, *args: Any, **kwargs: Any) -> None:
         logger.debug('Collecting callback source "%s"', source_id)
-        if not self._sources:
-            logger.debug('Aborting collect')
-            return
-
         with self._lock:
+            if source_id not in self._sources:
+                logger.debug('Aborting collect')
+                return
+
             self._sources.discard(source_id)
-            if not self._sources:
-                logger.debug('Collecting callbacks finished, publishing')
-                self._publish()
+            if self._sources:
+                return
+            self._completed = True
+            callbacks, self._callbacks = self._callbacks, []
 
-    def _publish(self) -> None:
-        self._pubsub.publish(self._TOPIC, message=None)
+        logger.debug('Collecting callbacks finished, publishing')
+        self._future.set_result(None)
+        for callback in callbacks:
+            self._run(callback)
+
+    def _run(self, callback: Callable[[], None]) -> None:
+        try:
+            callback()
+        except Exception as e:
+            self._exception_handler(callback, None, e)
 
     def new_source(self) -> Callable[..., None]:
         source_id = uuid.uuid4()
         logger.debug('Creating new callback source "%s"', source_id)
-        self._sources.add(source_id)
+        with self._lock:
+            if self._completed:
+                raise RuntimeError('callback collector already completed')
+            self._sources.add(source_id)
         return partial(self._collect, source_id)
 
     def subscribe(self, callback: Callable[[], None]) -> None:
-        self._pubsub.subscribe(self._TOPIC, lambda arg: callback())
+        """Subscribers are called immediately when collecting is already done"""
+        with self._lock:
+            if not self._completed:
+                self._callbacks.append(callback)
+                return
+        self._run(callback)
@@ -0,0 +1,23 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import os
+import tempfile
+import unittest
+
+
+class BaseTmpDirTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def _path(self, *names):
+        return os.path.join(self.tmp_dir.name, *names)
+
+    def _write(self, filename, content, executable=False):
+        path = self._path(filename)
+        with open(path, 'w') as f:
+            f.write(content)
+        if executable:
+            os.chmod(path, 0o755)
+        return path
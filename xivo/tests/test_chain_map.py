@@ -1,4 +1,4 @@
-# Copyright 2014-2024 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2014-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from __future__ import annotations
@@ -6,10 +6,18 @@ from __future__ import annotations
 import operator
 import unittest
 
-from hamcrest import assert_that, equal_to, has_entry, is_, none
+from hamcrest import (
+    assert_that,
+    equal_to,
+    has_entries,
+    has_entry,
+    is_,
+    none,
+    same_instance,
+)
 
 from ..chain_map import AccumulatingListChainMap as ALChainMap
-from ..chain_map import ChainMap
+from ..chain_map import ChainMap, LazyChainMap
 
 
 class TestChainMap(unittest.TestCase):
@@ -94,3 +102,115 @@ class TestAccumulatingListChainMap(unittest.TestCase):
         assert ALChainMap(empty, two_items)['key'] == ['items', 'items']
         assert ALChainMap(one_item, two_items)['key'] == ['item', 'items', 'items']
         assert ALChainMap(two_items, two_items)['key'] == ['items'] * 4
+
+    def test_nested_lists_are_accumulated(self):
+        m = ALChainMap(
+            {'plugins': {'enabled': ['a'], 'options': {'x': 1}}},
+            {'plugins': {'enabled': ['b'], 'options': {'x': 2, 'y': [1]}}},
+            {'plugins': {'enabled': ['c'], 'options': {'y': [2]}}},
+        )
+
+        assert_that(
+            m,
+            equal_to(
+                {
+                    'plugins': {
+                        'enabled': ['a', 'b', 'c'],
+                        'options': {'x': 1, 'y': [1, 2]},
+                    }
+                }
+            ),
+        )
+
+    def test_first_value_type_wins(self):
+        m = ALChainMap(
+            {'list': ['a'], 'dict': {'a': 1}, 'scalar': None},
+            {'list': {'b': 2}, 'dict': ['b'], 'scalar': ['c']},
+            {'list': ['d'], 'dict': {'b': 3}},
+        )
+
+        assert_that(
+            m,
+            equal_to({'list': ['a', 'd'], 'dict': {'a': 1, 'b': 3}, 'scalar': None}),
+        )
+
+    def test_layers_are_not_modified(self):
+        first = {'nested': {'key': ['a']}, 'key': ['b']}
+        second = {'nested': {'key': ['c']}, 'key': ['d']}
+
+        m = ALChainMap(first, second)
+        m['key'].append('e')
+        m['nested']['key'].append('f')
+
+        assert_that(first, equal_to({'nested': {'key': ['a']}, 'key': ['b']}))
+        assert_that(second, equal_to({'nested': {'key': ['c']}, 'key': ['d']}))
+
+
+LAYERS = [
+    (),
+    ({}, {}),
+    ({'key': 2}, {'key': 3, 'test': 42}, {'key': 4}),
+    ({'key': None}, {'key': {'subkey': 'value'}}),
+    ({'key': {'subkey': 'value'}}, {'key': None}, {'key': {'other': 1}}),
+    ({'key': {'a': 1}}, {'key': [1, 2]}),
+    ({'key': [1]}, {'key': [2]}),
+    (
+        {'key': {'host': 'test-host'}},
+        {'key': {'host': 'other-host', 'password': 'not-secret'}},
+        {
+            'key': {
+                'host': 'localhost',
+                'port': 1234,
+                'nested': {'a': {'b': 1}},
+                'password': 'secret',
+            }
+        },
+        {'key': {'nested': {'a': {'c': 2}, 'd': 3}}, 'other': True},
+    ),
+]
+
+
+class TestLazyChainMap(unittest.TestCase):
+    def test_same_result_as_chain_map(self):
+        for layers in LAYERS:
+            expected = ChainMap(*layers)
+
+            lazy = LazyChainMap(*layers)
+
+            assert_that(lazy.materialize(), equal_to(expected.data), layers)
+            assert_that(lazy, equal_to(expected.data), layers)
+            assert_that(list(lazy), equal_to(list(expected)), layers)
+            assert_that(len(lazy), equal_to(len(expected)), layers)
+
+    def test_access_no_result(self):
+        m = LazyChainMap({}, {'other': 1})
+
+        self.assertRaises(KeyError, operator.getitem, m, 'key')
+        assert_that(m.get('key'), is_(none()))
+        assert_that('key' in m, is_(False))
+
+    def test_values_are_shared_with_layers(self):
+        only_here = {'subkey': 'value'}
+        values = [1, 2]
+
+        m = LazyChainMap({'a': only_here}, {'b': values}, {'b': [3]})
+
+        assert_that(m['a'], is_(same_instance(only_here)))
+        assert_that(m['b'], is_(same_instance(values)))
+
+    def test_merged_subtrees_are_cached(self):
+        m = LazyChainMap({'key': {'a': 1}}, {'key': {'b': 2}})
+
+        assert_that(m['key'], is_(same_instance(m['key'])))
+        assert_that(m['key'], has_entries(a=1, b=2))
+
+    def test_materialize_does_not_alias_layers(self):
+        first = {'key': {'a': 1}}
+        second = {'key': {'b': {'c': 2}}, 'list': [1]}
+
+        result = LazyChainMap(first, second).materialize()
+        result['key']['a'] = 'changed'
+        result['list'].append(2)
+
+        assert_that(first, equal_to({'key': {'a': 1}}))
+        assert_that(second, equal_to({'key': {'b': {'c': 2}}, 'list': [1]}))
@@ -1,10 +1,14 @@
-# Copyright 2014-2023 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2014-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import datetime
 import os.path
+import pickle
 import random
 import string
+import subprocess
 import tempfile
+import time
 import unittest
 from operator import itemgetter
 from unittest.mock import ANY, Mock, patch
@@ -15,20 +19,28 @@ from hamcrest import (
     contains_exactly,
     contains_inanyorder,
     equal_to,
+    has_entries,
     has_entry,
+    has_key,
     is_not,
+    less_than,
     raises,
+    same_instance,
 )
 from yaml.parser import ParserError
 
 from ..config_helper import (
+    CommandRunner,
     ConfigParser,
+    ConfigSnapshotCache,
     ErrorHandler,
     PrintErrorHandler,
     UUIDNotFound,
+    _YAMLExecLoader,
     get_xivo_uuid,
     set_xivo_uuid,
 )
+from .helpers import BaseTmpDirTestCase
 
 XIVO_UUID = '08c56466-8f29-45c7-9856-92bf1ba89b82'
 
@@ -101,6 +113,19 @@ class TestParseConfigFile(unittest.TestCase):
 
         assert_that(result, equal_to({'foo': 'bar', 'bar': 'baz'}))
 
+    @patch('xivo.config_helper._ExecLoader', _YAMLExecLoader)
+    def test_exec_tag_without_libyaml(self):
+        with tempfile.NamedTemporaryFile('w+t') as other_file:
+            other_file.write('foo: bar\n')
+            other_file.flush()
+            with tempfile.NamedTemporaryFile('w+t') as config_file:
+                config_file.write(f'!exec\ncommand: cat {other_file.name}\n')
+                config_file.flush()
+
+                result = self.parser.parse_config_file(config_file.name)
+
+        assert_that(result, equal_to({'foo': 'bar'}))
+
     def test_exec_tag_command_not_found(self):
         config_file_content = """\
         !exec
@@ -261,6 +286,106 @@ class TestParseConfigDir(unittest.TestCase):
             os.unlink(filename)
 
 
+class TestCommandRunner(BaseTmpDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.error_handler = Mock(ErrorHandler)
+
+    def _script(self, name, output, delay=0):
+        count_file = self._path(f'{name}.count')
+        return self._write(
+            name,
+            f'#!/bin/sh\necho run >> {count_file}\nsleep {delay}\necho "{output}"\n',
+            executable=True,
+        )
+
+    def _run_count(self, name):
+        with open(self._path(f'{name}.count')) as f:
+            return len(f.readlines())
+
+    def test_commands_of_a_directory_run_concurrently(self):
+        os.mkdir(self._path('conf.d'))
+        for name in ('one', 'two', 'three'):
+            script = self._script(name, f'{name}: {name}', delay=0.5)
+            self._write(f'conf.d/{name}.yml', f'!exec\ncommand: {script}\n')
+        parser = ConfigParser(self.error_handler)
+
+        start = time.monotonic()
+        result = parser.parse_config_dir(self._path('conf.d'))
+
+        assert_that(time.monotonic() - start, less_than(1.2))
+        assert_that(
+            result,
+            contains_exactly({'one': 'one'}, {'three': 'three'}, {'two': 'two'}),
+        )
+
+    def test_nested_commands(self):
+        script = self._script('script', 'value: 42')
+        config_file = self._write(
+            'config.yml',
+            f'first: !exec {{command: {script}}}\n'
+            f'nested:\n  - second: !exec {{command: {script}}}\n',
+        )
+
+        result = ConfigParser(self.error_handler).parse_config_file(config_file)
+
+        assert_that(
+            result,
+            equal_to({'first': {'value': 42}, 'nested': [{'second': {'value': 42}}]}),
+        )
+
+    def test_command_timeout(self):
+        os.mkdir(self._path('conf.d'))
+        slow = self._script('slow', 'slow: true', delay=5)
+        fast = self._script('fast', 'fast: true')
+        self._write('conf.d/slow.yml', f'!exec\ncommand: {slow}\ntimeout: 0.1\n')
+        self._write('conf.d/fast.yml', f'!exec\ncommand: {fast}\n')
+        parser = ConfigParser(self.error_handler)
+
+        result = parser.parse_config_dir(self._path('conf.d'))
+
+        assert_that(result, contains_exactly({'fast': True}))
+        self.error_handler.on_parse_config_dir_parse_exception.assert_called_once_with(
+            'slow.yml', ANY
+        )
+
+    def test_default_timeout(self):
+        slow = self._script('slow', 'slow: true', delay=5)
+        config_file = self._write('config.yml', f'!exec\ncommand: {slow}\n')
+        parser = ConfigParser(
+            self.error_handler, command_runner=CommandRunner(timeout=0.1)
+        )
+
+        assert_that(
+            calling(parser.parse_config_file).with_args(config_file),
+            raises(subprocess.TimeoutExpired),
+        )
+
+    def test_cached_output(self):
+        script = self._script('script', 'value: 42')
+        config_file = self._write('config.yml', f'!exec\ncommand: {script}\n')
+        runner = CommandRunner(cache_ttl=60)
+        parser = ConfigParser(self.error_handler, command_runner=runner)
+
+        first = parser.parse_config_file(config_file)
+        second = parser.parse_config_file(config_file)
+
+        assert_that(first, equal_to({'value': 42}))
+        assert_that(second, equal_to(first))
+        assert_that(second, is_not(same_instance(first)))
+        assert_that(self._run_count('script'), equal_to(1))
+
+    def test_output_is_not_cached_by_default(self):
+        script = self._script('script', 'value: 42')
+        config_file = self._write('config.yml', f'!exec\ncommand: {script}\n')
+        parser = ConfigParser(self.error_handler)
+
+        parser.parse_config_file(config_file)
+        parser.parse_config_file(config_file)
+
+        assert_that(self._run_count('script'), equal_to(2))
+
+
 class TestReadConfigFileHierarchy(unittest.TestCase):
     def setUp(self):
         self.error_handler = Mock(ErrorHandler)
@@ -354,3 +479,163 @@ class TestSetXiVOUUID(unittest.TestCase):
         set_xivo_uuid(config, Mock())
 
         assert_that(config, has_entry('uuid', XIVO_UUID))
+
+
+class TestConfigSnapshotCache(BaseTmpDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.extra_dir = self._path('conf.d')
+        os.mkdir(self.extra_dir)
+        self.config_file = self._write('config.yml', 'sentinel: main\nmain: true\n')
+        self._write('conf.d/10-extra.yml', 'sentinel: extra\n')
+        self.snapshot_path = self._path('config.snapshot')
+        self.original_config = {
+            'config_file': self.config_file,
+            'extra_config_files': self.extra_dir,
+        }
+
+    def _read(self):
+        cache = ConfigSnapshotCache(self.snapshot_path)
+        parser = ConfigParser(Mock(ErrorHandler), snapshot_cache=cache)
+        return parser.read_config_file_hierarchy(self.original_config)
+
+    def test_unchanged_hierarchy_is_not_parsed_again(self):
+        expected = self._read()
+
+        with patch('xivo.config_helper.yaml.load') as load:
+            result = self._read()
+
+        load.assert_not_called()
+        assert_that(result, equal_to(expected))
+        assert_that(result, has_entries(sentinel='extra', main=True))
+
+    def test_changed_file_invalidates_the_snapshot(self):
+        self._read()
+        self._write('conf.d/10-extra.yml', 'sentinel: changed\n')
+
+        result = self._read()
+
+        assert_that(result, has_entries(sentinel='changed'))
+
+    def test_new_file_invalidates_the_snapshot(self):
+        self._read()
+        self._write('conf.d/00-extra.yml', 'sentinel: new\n')
+
+        result = self._read()
+
+        assert_that(result, has_entries(sentinel='new'))
+
+    def test_different_config_file_does_not_use_the_snapshot(self):
+        self._read()
+        self.original_config['config_file'] = self._write('other.yml', 'other: 1\n')
+
+        result = self._read()
+
+        assert_that(result, has_entries(sentinel='extra', other=1))
+        assert_that(result, is_not(has_key('main')))
+
+    def test_hierarchy_with_exec_tag_is_not_snapshotted(self):
+        self._write('conf.d/20-exec.yml', f'!exec\ncommand: cat {self.config_file}\n')
+
+        self._read()
+
+        assert_that(os.path.exists(self.snapshot_path), equal_to(False))
+
+    def test_hierarchy_quoting_the_exec_tag_is_snapshotted(self):
+        self._write('conf.d/20-quoted.yml', 'comment: "!exec"\n')
+
+        self._read()
+
+        assert_that(os.path.exists(self.snapshot_path), equal_to(True))
+
+    def test_hierarchy_with_invalid_file_is_not_snapshotted(self):
+        self._write('conf.d/20-invalid.yml', 'test: [:one :two]')
+
+        self._read()
+
+        assert_that(os.path.exists(self.snapshot_path), equal_to(False))
+
+    def test_invalid_snapshot_is_ignored(self):
+        with open(self.snapshot_path, 'wb') as f:
+            f.write(b'not a snapshot')
+
+        result = self._read()
+
+        assert_that(result, has_entries(sentinel='extra', main=True))
+        assert_that(os.path.exists(self.snapshot_path), equal_to(True))
+
+    def test_snapshot_keeps_yaml_values(self):
+        self._write(
+            'conf.d/20-values.yml',
+            'created: 2026-01-02 03:04:05+01:00\n'
+            'day: 2026-01-02\n'
+            'data: !!binary aGVsbG8=\n'
+            'tags: !!set {a, b}\n'
+            '1: one\n',
+        )
+        expected = self._read()
+
+        with patch('xivo.config_helper.yaml.load') as load:
+            result = self._read()
+
+        load.assert_not_called()
+        assert_that(result, equal_to(expected))
+        assert_that(
+            result,
+            has_entries(
+                created=datetime.datetime(
+                    2026,
+                    1,
+                    2,
+                    3,
+                    4,
+                    5,
+                    tzinfo=datetime.timezone(datetime.timedelta(hours=1)),
+                ),
+                day=datetime.date(2026, 1, 2),
+                data=b'hello',
+                tags={'a', 'b'},
+            ),
+        )
+        assert_that(result[1], equal_to('one'))
+
+    def test_snapshot_keeps_ordered_maps_with_timestamps(self):
+        self._write(
+            'conf.d/20-values.yml',
+            'day: 2026-01-02\n'
+            'ordered: !!omap [{first: 2026-01-03}, {second: 2}]\n'
+            'pairs: !!pairs [{a: 1}, {a: 2}]\n',
+        )
+        expected = self._read()
+
+        with patch('xivo.config_helper.yaml.load') as load:
+            result = self._read()
+
+        load.assert_not_called()
+        assert_that(result, equal_to(expected))
+        assert_that(
+            result,
+            has_entries(
+                day=datetime.date(2026, 1, 2),
+                ordered=[('first', datetime.date(2026, 1, 3)), ('second', 2)],
+                pairs=[('a', 1), ('a', 2)],
+            ),
+        )
+
+    def test_pickled_snapshot_is_not_unpickled(self):
+        sentinel = self._write('sentinel', '')
+        with open(self.snapshot_path, 'wb') as f:
+            pickle.dump(_RemoveOnUnpickle(sentinel), f)
+
+        result = self._read()
+
+        assert_that(os.path.exists(sentinel), equal_to(True))
+        assert_that(result, has_entries(sentinel='extra', main=True))
+
+
+class _RemoveOnUnpickle:
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return os.remove, (self.path,)
@@ -0,0 +1,125 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import os
+import threading
+from unittest.mock import Mock, patch
+
+from hamcrest import assert_that, contains_exactly, equal_to, has_entries
+
+from ..config_helper import ConfigParser, ErrorHandler
+from ..config_watcher import ConfigWatcher
+from .helpers import BaseTmpDirTestCase
+
+TIMEOUT = 5
+
+
+class TestConfigWatcher(BaseTmpDirTestCase):
+    def setUp(self):
+        super().setUp()
+        os.mkdir(self._path('conf.d'))
+        self.config_file = self._write('config.yml', 'rest_api: {port: 9500}\n')
+        self._write('conf.d/10-extra.yml', 'rest_api: {listen: 0.0.0.0}\n')
+        self.original_config = {
+            'config_file': self.config_file,
+            'extra_config_files': self._path('conf.d'),
+        }
+        self.error_handler = Mock(ErrorHandler)
+        self.watcher = ConfigWatcher(self.original_config, self.error_handler)
+        self.addCleanup(self.watcher.stop)
+
+    def _expected_config(self):
+        parser = ConfigParser(self.error_handler)
+        return parser.read_config_file_hierarchy(self.original_config)
+
+    def test_config_is_the_config_file_hierarchy(self):
+        self.original_config['extra_config_files'] = 'ignored'
+        self._write(
+            'config.yml',
+            f'extra_config_files: {self.tmp_dir.name}/conf.d\nrest_api: {{port: 9500}}\n',
+        )
+
+        assert_that(self.watcher.config, equal_to(self._expected_config()))
+        assert_that(
+            self.watcher.config['rest_api'],
+            equal_to({'listen': '0.0.0.0', 'port': 9500}),
+        )
+
+    def test_reload_reports_changed_keys(self):
+        callback = Mock()
+        self.watcher.subscribe(callback)
+        self.watcher.config
+
+        self._write('conf.d/10-extra.yml', 'rest_api: {listen: 127.0.0.1}\nnew: 1\n')
+        changed_keys = self.watcher.reload()
+
+        assert_that(changed_keys, contains_exactly(('new',), ('rest_api', 'listen')))
+        callback.assert_called_with(self.watcher.config, changed_keys)
+        assert_that(self.watcher.config, equal_to(self._expected_config()))
+
+    def test_reload_without_changes(self):
+        callback = Mock()
+        self.watcher.config
+        self.watcher.subscribe(callback)
+
+        with patch.object(ConfigParser, 'parse_config_file') as parse_config_file:
+            changed_keys = self.watcher.reload()
+
+        assert_that(changed_keys, equal_to([]))
+        parse_config_file.assert_not_called()
+        callback.assert_not_called()
+
+    def test_only_changed_files_are_parsed(self):
+        self.watcher.config
+        self._write('conf.d/20-extra.yml', 'other: value\n')
+
+        with patch.object(
+            ConfigParser, 'parse_config_file', return_value={'other': 'value'}
+        ) as parse_config_file:
+            self.watcher.reload()
+
+        parse_config_file.assert_called_once_with(self._path('conf.d', '20-extra.yml'))
+        assert_that(self.watcher.config, has_entries(other='value'))
+
+    def test_removed_file(self):
+        path = self._write('conf.d/00-extra.yml', 'rest_api: {port: 1234}\n')
+        assert_that(self.watcher.config['rest_api'], has_entries(port=1234))
+
+        os.unlink(path)
+        changed_keys = self.watcher.reload()
+
+        assert_that(changed_keys, contains_exactly(('rest_api', 'port')))
+        assert_that(self.watcher.config, equal_to(self._expected_config()))
+
+    def test_invalid_file_keeps_its_previous_content(self):
+        self.watcher.config
+
+        self._write('conf.d/10-extra.yml', 'rest_api: [:one :two]')
+        changed_keys = self.watcher.reload()
+
+        assert_that(changed_keys, equal_to([]))
+        assert_that(self.watcher.config['rest_api'], has_entries(listen='0.0.0.0'))
+        self.error_handler.on_parse_config_dir_parse_exception.assert_called_once()
+
+    def test_watch(self):
+        self._watch_and_change()
+
+    @patch('xivo.config_watcher._Inotify', Mock(side_effect=OSError))
+    def test_watch_without_inotify(self):
+        self.watcher = ConfigWatcher(
+            self.original_config, self.error_handler, poll_interval=0.05
+        )
+        self.addCleanup(self.watcher.stop)
+
+        self._watch_and_change()
+
+    def _watch_and_change(self):
+        changed = threading.Event()
+        self.watcher.config
+        self.watcher.subscribe(lambda config, keys: changed.set())
+        self.watcher.watch()
+
+        self._write('conf.d/20-extra.yml', 'other: value\n')
+
+        assert_that(changed.wait(TIMEOUT), equal_to(True))
+        assert_that(self.watcher.config, has_entries(other='value'))
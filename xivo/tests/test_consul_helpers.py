@@ -1,21 +1,31 @@
-# Copyright 2015-2024 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2015-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import itertools
+import threading
+import time
 import unittest
 import uuid
-from unittest.mock import ANY, Mock, call, patch
+from unittest.mock import ANY, MagicMock, Mock, call, patch
 from unittest.mock import sentinel as s
 
-from hamcrest import assert_that, calling, contains_exactly, equal_to, raises
+from hamcrest import assert_that, calling, contains_exactly, equal_to, less_than, raises
+from requests.exceptions import ConnectionError
 from wazo_bus.resources.services import event
 
 from ..consul_helpers import (
+    AddressResolver,
+    EventOutbox,
     NotifyingRegisterer,
     Registerer,
     RegistererError,
+    RegistrationManager,
+    ServiceCatalogRegistration,
     ServiceDiscoveryError,
     ServiceFinder,
+    ServiceWatcher,
     _find_address,
+    _ServiceWatch,
 )
 
 UUID = str(uuid.uuid4())
@@ -129,6 +139,244 @@ class TestFindIpAddress(unittest.TestCase):
         mock.assert_has_calls(expected_calls)
 
 
+@patch('xivo.consul_helpers._find_address')
+class TestAddressResolver(unittest.TestCase):
+    def setUp(self):
+        self.resolver = AddressResolver()
+        watch = patch.object(self.resolver, 'watch')
+        self.watch = watch.start()
+        self.addCleanup(watch.stop)
+
+    def test_that_addresses_are_cached(self, find_address):
+        find_address.return_value = s.eth0_ip
+
+        self.resolver.resolve('eth0')
+        result = self.resolver.resolve('eth0')
+
+        assert_that(result, equal_to(s.eth0_ip))
+        find_address.assert_called_once_with('eth0')
+
+    def test_that_refresh_notifies_changed_addresses(self, find_address):
+        find_address.side_effect = [s.eth0_ip, s.eth1_ip, s.new_eth0_ip, s.eth1_ip]
+        callback = Mock()
+        self.resolver.resolve('eth0')
+        self.resolver.resolve('eth1')
+        self.resolver.subscribe(callback)
+
+        result = self.resolver.refresh()
+
+        assert_that(result, equal_to({'eth0': s.new_eth0_ip}))
+        callback.assert_called_once_with('eth0', s.new_eth0_ip)
+        assert_that(self.resolver.resolve('eth0'), equal_to(s.new_eth0_ip))
+
+    def test_that_unsubscribed_callbacks_are_not_notified(self, find_address):
+        find_address.side_effect = [s.eth0_ip, s.new_eth0_ip]
+        callback = Mock()
+        self.resolver.resolve('eth0')
+        self.resolver.subscribe(callback)
+        self.resolver.unsubscribe(callback)
+
+        self.resolver.refresh()
+
+        callback.assert_not_called()
+
+    def test_that_loopback_fallbacks_are_resolved_again(self, find_address):
+        find_address.side_effect = ['127.0.0.1', '127.0.0.1', s.eth0_ip]
+        callback = Mock()
+        self.resolver.resolve('eth0')
+        self.resolver.subscribe(callback)
+
+        assert_that(self.resolver.resolve('eth0'), equal_to('127.0.0.1'))
+        callback.assert_not_called()
+        assert_that(self.resolver.resolve('eth0'), equal_to(s.eth0_ip))
+        callback.assert_called_once_with('eth0', s.eth0_ip)
+        assert_that(self.resolver.resolve('eth0'), equal_to(s.eth0_ip))
+        assert_that(find_address.call_count, equal_to(3))
+
+    def test_that_subscribers_do_not_start_the_watch(self, find_address):
+        callback = Mock()
+
+        with patch.object(self.resolver, 'stop') as stop:
+            self.resolver.subscribe(callback)
+            self.resolver.unsubscribe(callback)
+
+        self.watch.assert_not_called()
+        stop.assert_not_called()
+
+    def test_that_network_changes_are_debounced_into_one_refresh(self, find_address):
+        stopped = threading.Event()
+        received = [b'link', b'address', TimeoutError()]
+
+        def recv(size):
+            if not received:
+                stopped.set()
+                raise TimeoutError()
+            data = received.pop(0)
+            if isinstance(data, Exception):
+                raise data
+            return data
+
+        sock = MagicMock()
+        sock.recv.side_effect = recv
+
+        with patch.object(self.resolver, 'refresh') as refresh:
+            self.resolver._watch_loop(sock, stopped)
+
+        refresh.assert_called_once_with()
+        sock.__exit__.assert_called_once()
+
+
+class TestRegistrationAddressChange(unittest.TestCase):
+    def setUp(self):
+        self.service_discovery_config = {
+            'retry_interval': 2,
+            'refresh_interval': 10,
+        }
+
+    @patch('xivo.consul_helpers.NotifyingRegisterer')
+    def test_that_catalog_registrations_register_again(self, NotifyingRegisterer):
+        registerer = NotifyingRegisterer.return_value
+        registration = ServiceCatalogRegistration(
+            'foobar', UUID, {}, self.service_discovery_config, BUS_CONFIG
+        )
+        registration._registered = True
+
+        registerer.refresh_address.return_value = False
+        registration._on_address_change('eth0', s.ip)
+        assert_that(registration._registered, equal_to(True))
+        assert_that(registration._sleep_event.is_set(), equal_to(False))
+
+        registerer.refresh_address.return_value = True
+        registration._on_address_change('eth0', s.ip)
+        assert_that(registration._registered, equal_to(False))
+        assert_that(registration._sleep_event.is_set(), equal_to(True))
+
+    @patch('xivo.consul_helpers.NotifyingRegisterer')
+    def test_that_managed_registrations_register_again(self, NotifyingRegisterer):
+        registerer = NotifyingRegisterer.return_value
+        registerer.refresh_address.return_value = True
+        manager = RegistrationManager({})
+        registration = manager.registration(
+            'foobar', UUID, self.service_discovery_config, BUS_CONFIG
+        )
+        registration._registered = True
+        registration.next_run = time.monotonic() + 10
+
+        registration._on_address_change('eth0', s.ip)
+
+        assert_that(registration._registered, equal_to(False))
+        assert_that(registration.next_run <= time.monotonic(), equal_to(True))
+        assert_that(manager._wake_event.is_set(), equal_to(True))
+
+    @patch('xivo.consul_helpers.NotifyingRegisterer')
+    def test_that_exited_registrations_ignore_address_changes(
+        self, NotifyingRegisterer
+    ):
+        registerer = NotifyingRegisterer.return_value
+        registerer.refresh_address.return_value = True
+        manager = RegistrationManager({})
+        registration = manager.registration(
+            'foobar', UUID, self.service_discovery_config, BUS_CONFIG
+        )
+        registration._registered = True
+        registration._done = True
+
+        registration._on_address_change('eth0', s.ip)
+
+        assert_that(registration._registered, equal_to(True))
+        registerer.refresh_address.assert_not_called()
+
+    @patch('xivo.consul_helpers.NotifyingRegisterer')
+    @patch('xivo.consul_helpers._find_address')
+    def test_that_address_changes_resolving_a_fallback_do_not_deadlock(
+        self, find_address, NotifyingRegisterer
+    ):
+        resolver = AddressResolver()
+        find_address.return_value = '127.0.0.1'
+        resolver.resolve('eth0')
+        find_address.return_value = s.eth0_ip
+        registerer = NotifyingRegisterer.return_value
+        registerer.refresh_address.side_effect = (
+            lambda: resolver.resolve('eth0') == s.eth0_ip
+        )
+        manager = RegistrationManager({})
+        registration = manager.registration(
+            'foobar', UUID, self.service_discovery_config, BUS_CONFIG
+        )
+        resolver.subscribe(registration._on_address_change)
+
+        notifying = threading.Thread(
+            target=resolver._notify,
+            args=([registration._on_address_change], {'eth1': s.eth1_ip}),
+            daemon=True,
+        )
+        notifying.start()
+        notifying.join(5)
+
+        assert_that(notifying.is_alive(), equal_to(False))
+        assert_that(registration._registered, equal_to(False))
+
+    @patch('xivo.consul_helpers.NotifyingRegisterer', Mock())
+    @patch('xivo.consul_helpers.address_resolver')
+    def test_that_registrations_watch_address_changes_when_enabled(
+        self, address_resolver
+    ):
+        config = dict(self.service_discovery_config, enabled=True)
+        check = Mock(return_value=False)
+
+        with ServiceCatalogRegistration('foobar', UUID, {}, config, BUS_CONFIG, check):
+            address_resolver.watch.assert_not_called()
+
+        config['watch_address_changes'] = True
+        with ServiceCatalogRegistration('foobar', UUID, {}, config, BUS_CONFIG, check):
+            address_resolver.watch.assert_called_once_with()
+
+        manager = RegistrationManager({})
+        with manager.registration('foobar', UUID, config, BUS_CONFIG, check):
+            assert_that(address_resolver.watch.call_count, equal_to(2))
+        manager.stop()
+
+    @patch('xivo.consul_helpers.NotifyingRegisterer', Mock())
+    @patch('xivo.consul_helpers.address_resolver')
+    def test_that_registrations_subscribe_to_address_changes(self, address_resolver):
+        registration = ServiceCatalogRegistration(
+            'foobar',
+            UUID,
+            {},
+            dict(self.service_discovery_config, enabled=True),
+            BUS_CONFIG,
+            check=Mock(return_value=False),
+        )
+
+        with registration:
+            address_resolver.subscribe.assert_called_once_with(
+                registration._on_address_change
+            )
+
+        address_resolver.unsubscribe.assert_called_once_with(
+            registration._on_address_change
+        )
+
+
+class TestRegistererRefreshAddress(unittest.TestCase):
+    @patch('xivo.consul_helpers.address_resolver')
+    def test_that_the_advertised_address_is_refreshed(self, address_resolver):
+        address_resolver.resolve.return_value = s.old_ip
+        service_discovery_config = {
+            'advertise_address': 'auto',
+            'advertise_address_interface': 'eth0',
+            'advertise_port': 4242,
+            'ttl_interval': 10,
+        }
+        registerer = Registerer('foobar', UUID, {}, service_discovery_config)
+
+        assert_that(registerer.refresh_address(), equal_to(False))
+
+        address_resolver.resolve.return_value = s.new_ip
+        assert_that(registerer.refresh_address(), equal_to(True))
+        assert_that(registerer._advertise_address, equal_to(s.new_ip))
+
+
 class TestNotifyingRegisterer(unittest.TestCase):
     def setUp(self):
         self.service_name = 'foobar'
@@ -190,6 +438,77 @@ class TestNotifyingRegisterer(unittest.TestCase):
             self.registerer.deregister()
             assert_that(send_msg.call_count, equal_to(0))
 
+    def test_that_a_shared_outbox_is_flushed_but_not_closed(self):
+        outbox = Mock(EventOutbox)
+        registerer = NotifyingRegisterer(
+            self.service_name,
+            UUID,
+            {},
+            {
+                'advertise_port': 4242,
+                'advertise_address': 'localhost',
+                'ttl_interval': 10,
+            },
+            BUS_CONFIG,
+            outbox=outbox,
+        )
+
+        registerer.close(5)
+
+        outbox.flush.assert_called_once_with(5)
+        outbox.close.assert_not_called()
+
+
+class TestEventOutbox(unittest.TestCase):
+    def setUp(self):
+        self.publisher = Mock()
+        self.outbox = EventOutbox(self.publisher, max_size=2)
+
+    def test_that_events_are_published_in_order(self):
+        self.outbox.put(s.event_1)
+        self.outbox.put(s.event_2)
+
+        assert_that(self.outbox.close(timeout=5), equal_to(True))
+        self.publisher.publish.assert_has_calls([call(s.event_1), call(s.event_2)])
+
+    @patch.object(
+        EventOutbox, '_new_retry_intervals', staticmethod(lambda: itertools.repeat(0))
+    )
+    def test_that_failed_publications_are_retried(self):
+        self.publisher.publish.side_effect = [Exception(), None]
+
+        self.outbox.put(s.event)
+
+        assert_that(self.outbox.flush(timeout=5), equal_to(True))
+        self.publisher.publish.assert_has_calls([call(s.event), call(s.event)])
+
+    def test_that_oldest_events_are_dropped_when_full(self):
+        publishing, release = threading.Event(), threading.Event()
+
+        def publish(_):
+            publishing.set()
+            release.wait()
+
+        self.publisher.publish.side_effect = publish
+        self.outbox.put(s.event_1)
+        publishing.wait(timeout=5)
+        for pending_event in (s.event_2, s.event_3, s.event_4):
+            self.outbox.put(pending_event)
+        release.set()
+
+        assert_that(self.outbox.close(timeout=5), equal_to(True))
+        self.publisher.publish.assert_has_calls(
+            [call(s.event_1), call(s.event_3), call(s.event_4)]
+        )
+        assert_that(self.publisher.publish.call_count, equal_to(3))
+
+    def test_that_close_gives_up_after_the_deadline(self):
+        self.publisher.publish.side_effect = Exception()
+
+        self.outbox.put(s.event)
+
+        assert_that(self.outbox.close(timeout=0.1), equal_to(False))
+
 
 class TestConsulRegisterer(unittest.TestCase):
     def setUp(self):
@@ -259,6 +578,198 @@ class TestConsulRegisterer(unittest.TestCase):
             self.registerer._check_id
         )
 
+    @patch('xivo.consul_helpers.Consul')
+    def test_that_the_consul_client_is_reused(self, Consul):
+        self.registerer.register()
+        self.registerer.send_ttl()
+        self.registerer.deregister()
+
+        Consul.assert_called_once_with(
+            host=s.consul_host, port=s.consul_port, token=s.consul_token
+        )
+
+    @patch('xivo.consul_helpers.Consul')
+    def test_that_the_consul_client_is_rebuilt_after_a_connection_error(self, Consul):
+        broken_client, new_client = Mock(), Mock()
+        broken_client.agent.check.ttl_pass.side_effect = ConnectionError()
+        Consul.side_effect = [broken_client, new_client]
+
+        self.registerer.send_ttl()
+        self.registerer.send_ttl()
+
+        broken_client.http.session.close.assert_called_once_with()
+        new_client.agent.check.ttl_pass.assert_called_once_with(
+            self.registerer._check_id
+        )
+        assert_that(Consul.call_count, equal_to(2))
+
+
+@patch('xivo.consul_helpers.NotifyingRegisterer')
+class TestRegistrationManager(unittest.TestCase):
+    def setUp(self):
+        self.consul_config = {'host': s.consul_host}
+        self.service_discovery_config = {
+            'retry_interval': 2,
+            'refresh_interval': 10,
+        }
+        self.manager = RegistrationManager(self.consul_config)
+
+    def _registration(self, check=None):
+        return self.manager.registration(
+            'foobar', UUID, self.service_discovery_config, BUS_CONFIG, check
+        )
+
+    def test_that_registerers_share_one_consul_client(self, NotifyingRegisterer):
+        self._registration()
+        self._registration()
+
+        client = self.manager._consul_client
+        clients = [
+            c.kwargs['consul_client'] for c in NotifyingRegisterer.call_args_list
+        ]
+        assert_that(clients, contains_exactly(client, client))
+
+    def _run_with_check(self, registration):
+        registration.run_once()
+        if check_thread := registration._check_thread:
+            check_thread.join(5)
+        registration.run_once()
+
+    def test_that_registerers_share_one_outbox(self, NotifyingRegisterer):
+        self._registration()
+        self._registration()
+        with patch.dict(BUS_CONFIG, host='other-host'):
+            self._registration()
+
+        outboxes = [c.kwargs['outbox'] for c in NotifyingRegisterer.call_args_list]
+        assert_that(outboxes[0], equal_to(outboxes[1]))
+        assert_that(outboxes[0] is outboxes[2], equal_to(False))
+
+    def test_that_registration_waits_for_check(self, NotifyingRegisterer):
+        registerer = NotifyingRegisterer.return_value
+        registration = self._registration(check=Mock(return_value=False))
+
+        self._run_with_check(registration)
+
+        registerer.register.assert_not_called()
+        assert_that(registration.interval, equal_to(2))
+
+    def test_that_registered_services_use_refresh_interval(self, NotifyingRegisterer):
+        registerer = NotifyingRegisterer.return_value
+        registerer.send_ttl.return_value = True
+        registration = self._registration()
+
+        self._run_with_check(registration)
+        registration.run_once()
+
+        registerer.register.assert_called_once_with()
+        assert_that(registerer.send_ttl.call_count, equal_to(2))
+        assert_that(registration.interval, equal_to(10))
+
+    def test_that_checks_do_not_block_the_scheduler(self, NotifyingRegisterer):
+        registerer = NotifyingRegisterer.return_value
+        release = threading.Event()
+        self.addCleanup(release.set)
+        registration = self._registration(check=lambda: release.wait(5))
+
+        registration.run_once()
+        registration.run_once()
+
+        registerer.register.assert_not_called()
+        assert_that(registration._check_thread.is_alive(), equal_to(True))
+
+        release.set()
+        registration._check_thread.join(5)
+        registration.run_once()
+
+        registerer.register.assert_called_once_with()
+
+    def test_that_late_check_results_are_discarded(self, NotifyingRegisterer):
+        registerer = NotifyingRegisterer.return_value
+        self.manager.check_timeout = 0
+        registration = self._registration(check=lambda: time.sleep(0.01) or True)
+
+        self._run_with_check(registration)
+
+        registerer.register.assert_not_called()
+
+    def test_that_finished_checks_wake_the_manager(self, NotifyingRegisterer):
+        registration = self._registration()
+
+        registration.run_once()
+        if check_thread := registration._check_thread:
+            check_thread.join(5)
+
+        assert_that(self.manager._wake_event.is_set(), equal_to(True))
+        assert_that(registration.next_run <= time.monotonic(), equal_to(True))
+
+    def test_that_stop_deregisters_running_registrations(self, NotifyingRegisterer):
+        registerer = NotifyingRegisterer.return_value
+        registration = self._registration(check=Mock(return_value=False))
+        registration.__enter__()
+
+        self.manager.stop()
+
+        registerer.deregister.assert_called_once_with()
+        assert_that(self.manager._registrations, equal_to([]))
+
+        registration.__exit__(None, None, None)
+        registerer.deregister.assert_called_once_with()
+
+    @patch('xivo.consul_helpers.BusPublisher')
+    def test_that_stop_honors_its_timeout_when_the_bus_is_unreachable(
+        self, BusPublisher, NotifyingRegisterer
+    ):
+        BusPublisher.return_value.publish.side_effect = Exception('unreachable')
+        for _ in range(4):
+            self._registration(check=Mock(return_value=False)).__enter__()
+        outbox = NotifyingRegisterer.call_args.kwargs['outbox']
+        outbox.put(Mock())
+        # like the real registerers, flush the shared outbox when closed
+        NotifyingRegisterer.return_value.close.side_effect = outbox.flush
+
+        start = time.monotonic()
+        self.manager.stop(timeout=0.5)
+
+        assert_that(time.monotonic() - start, less_than(2))
+
+    def test_that_registrations_restart_a_stopped_manager(self, NotifyingRegisterer):
+        with self._registration(check=Mock(return_value=False)):
+            first_thread = self.manager._thread
+            self.manager.stop()
+
+        with self._registration(check=Mock(return_value=False)):
+            assert_that(self.manager._thread.is_alive(), equal_to(True))
+            assert_that(self.manager._thread is first_thread, equal_to(False))
+        self.manager.stop()
+
+        assert_that(first_thread.is_alive(), equal_to(False))
+
+    def test_that_nearly_due_registrations_are_coalesced(self, NotifyingRegisterer):
+        due, nearly_due, later = Mock(), Mock(), Mock()
+        due.next_run, due.interval = 100, 10
+        nearly_due.next_run, nearly_due.interval = 104, 10
+        later.next_run, later.interval = 106, 10
+        self.manager._registrations = [due, nearly_due, later]
+
+        self.manager._tick(100)
+
+        due.run_once.assert_called_once_with()
+        nearly_due.run_once.assert_called_once_with()
+        later.run_once.assert_not_called()
+
+    def test_that_exit_deregisters_and_removes_the_registration(
+        self, NotifyingRegisterer
+    ):
+        registerer = NotifyingRegisterer.return_value
+        with patch.object(self.manager, '_add') as add:
+            with self._registration() as registration:
+                add.assert_called_once_with(registration)
+                self.manager._registrations.append(registration)
+
+        registerer.deregister.assert_called_once_with()
+        assert_that(self.manager._registrations, equal_to([]))
+
 
 class BaseFinderTestCase(unittest.TestCase):
     def setUp(self):
@@ -274,7 +785,8 @@ class BaseFinderTestCase(unittest.TestCase):
 @patch('xivo.consul_helpers.requests')
 class TestRemoteServiceFinderGetDatacenters(BaseFinderTestCase):
     def test_that_the_url_matches_the_config(self, requests):
-        requests.get.return_value = Mock(status_code=200)
+        session = requests.Session.return_value
+        session.get.return_value = Mock(status_code=200)
         url_and_configs = [
             ('http://localhost:8500/v1/catalog/datacenters', self.consul_config),
             (
@@ -286,18 +798,20 @@ class TestRemoteServiceFinderGetDatacenters(BaseFinderTestCase):
         for url, config in url_and_configs:
             finder = ServiceFinder(config)
             finder._get_datacenters()
-            requests.get.assert_called_once_with(url, verify=ANY)
-            requests.reset_mock()
+            session.get.assert_called_once_with(url, verify=ANY, timeout=ANY)
+            session.reset_mock()
 
     def test_that_raises_if_not_200(self, requests):
-        requests.get.return_value = Mock(status_code=403, text='some error')
+        session = requests.Session.return_value
+        session.get.return_value = Mock(status_code=403, text='some error')
 
         finder = ServiceFinder(self.consul_config)
 
         assert_that(calling(finder._get_datacenters), raises(ServiceDiscoveryError))
 
     def test_that_health_uses_the_configured_verify(self, requests):
-        requests.get.return_value = Mock(status_code=200)
+        session = requests.Session.return_value
+        session.get.return_value = Mock(status_code=200)
         verify_and_configs = [
             (True, self.consul_config),
             (
@@ -314,14 +828,15 @@ class TestRemoteServiceFinderGetDatacenters(BaseFinderTestCase):
         for verify, config in verify_and_configs:
             finder = ServiceFinder(config)
             finder._get_datacenters()
-            requests.get.assert_called_once_with(ANY, verify=verify)
-            requests.reset_mock()
+            session.get.assert_called_once_with(ANY, verify=verify, timeout=ANY)
+            session.reset_mock()
 
 
 @patch('xivo.consul_helpers.requests')
 class TestRemoteServiceFinderListRunningServices(BaseFinderTestCase):
     def test_that_the_health_url_matches_the_config(self, requests):
-        requests.get.return_value = Mock(status_code=200, json=Mock(return_value=[]))
+        session = requests.Session.return_value
+        session.get.return_value = Mock(status_code=200, json=Mock(return_value=[]))
         url_and_configs = [
             ('http://localhost:8500/v1/health/service/foobar', self.consul_config),
             (
@@ -333,11 +848,14 @@ class TestRemoteServiceFinderListRunningServices(BaseFinderTestCase):
         for url, config in url_and_configs:
             finder = ServiceFinder(config)
             finder._list_running_services('foobar', s.dc, None)
-            requests.get.assert_called_once_with(url, verify=ANY, params=ANY)
-            requests.reset_mock()
+            session.get.assert_called_once_with(
+                url, verify=ANY, params=ANY, timeout=ANY
+            )
+            session.reset_mock()
 
     def test_that_the_verify_config_is_user(self, requests):
-        requests.get.return_value = Mock(status_code=200, json=Mock(return_value=[]))
+        session = requests.Session.return_value
+        session.get.return_value = Mock(status_code=200, json=Mock(return_value=[]))
         verify_and_configs = [
             (True, self.consul_config),
             (
@@ -354,31 +872,40 @@ class TestRemoteServiceFinderListRunningServices(BaseFinderTestCase):
         for verify, config in verify_and_configs:
             finder = ServiceFinder(config)
             finder._list_running_services('foobar', s.dc, None)
-            requests.get.assert_called_once_with(ANY, verify=verify, params=ANY)
-            requests.reset_mock()
+            session.get.assert_called_once_with(
+                ANY, verify=verify, params=ANY, timeout=ANY
+            )
+            session.reset_mock()
 
     def test_that_params_are_based_on_the_datacenter(self, requests):
-        requests.get.return_value = Mock(status_code=200, json=Mock(return_value=[]))
+        session = requests.Session.return_value
+        session.get.return_value = Mock(status_code=200, json=Mock(return_value=[]))
 
         finder = ServiceFinder(self.consul_config)
 
         for dc in ['dc1', 'dc2']:
             finder._list_running_services('foobar', dc, None)
             expected = {'dc': dc, 'passing': True}
-            requests.get.assert_called_once_with(ANY, verify=ANY, params=expected)
-            requests.reset_mock()
+            session.get.assert_called_once_with(
+                ANY, verify=ANY, params=expected, timeout=ANY
+            )
+            session.reset_mock()
 
     def test_that_param_contains_the_optional_tag(self, requests):
-        requests.get.return_value = Mock(status_code=200, json=Mock(return_value=[]))
+        session = requests.Session.return_value
+        session.get.return_value = Mock(status_code=200, json=Mock(return_value=[]))
 
         finder = ServiceFinder(self.consul_config)
 
         finder._list_running_services('foobar', s.db, tag=s.tag)
         expected = {'dc': s.db, 'passing': True, 'tag': s.tag}
-        requests.get.assert_called_once_with(ANY, verify=ANY, params=expected)
+        session.get.assert_called_once_with(
+            ANY, verify=ANY, params=expected, timeout=ANY
+        )
 
     def test_that_raises_if_not_200(self, requests):
-        requests.get.return_value = Mock(status_code=403, text='some error')
+        session = requests.Session.return_value
+        session.get.return_value = Mock(status_code=403, text='some error')
 
         finder = ServiceFinder(self.consul_config)
 
@@ -388,6 +915,7 @@ class TestRemoteServiceFinderListRunningServices(BaseFinderTestCase):
         )
 
     def test_that_returns_services_from_each_nodes(self, requests):
+        session = requests.Session.return_value
         node_0_service = {
             "ID": "1c8c13d8-adca-4715-8bf3-04e51509f141",
             "Service": "wazo-calld",
@@ -417,7 +945,7 @@ class TestRemoteServiceFinderListRunningServices(BaseFinderTestCase):
                 "Checks": [],
             },
         ]
-        requests.get.return_value = Mock(
+        session.get.return_value = Mock(
             status_code=200, json=Mock(return_value=response)
         )
 
@@ -425,3 +953,294 @@ class TestRemoteServiceFinderListRunningServices(BaseFinderTestCase):
         result = finder._list_running_services('wazo-calld', 'dc1', None)
 
         assert_that(result, contains_exactly(node_0_service, node_1_service))
+
+
+@patch('xivo.consul_helpers.requests', Mock())
+class TestRemoteServiceFinderListHealthyServices(BaseFinderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.finder = ServiceFinder(self.consul_config)
+        self.services = {'dc1': [s.dc1_service], 'dc2': [s.dc2_service]}
+
+    def _list_running_services(self, service_name, dc, tag):
+        if dc not in self.services:
+            raise ServiceDiscoveryError(f'{dc} is down')
+        return self.services[dc]
+
+    def test_that_services_from_all_datacenters_are_returned_in_order(self):
+        with patch.multiple(
+            self.finder,
+            _get_datacenters=Mock(return_value=['dc1', 'dc2']),
+            _list_running_services=Mock(side_effect=self._list_running_services),
+        ):
+            result = self.finder.list_healthy_services('foobar', s.uuid)
+
+            self.finder._list_running_services.assert_has_calls(
+                [call('foobar', 'dc1', s.uuid), call('foobar', 'dc2', s.uuid)],
+                any_order=True,
+            )
+
+        assert_that(result, contains_exactly(s.dc1_service, s.dc2_service))
+
+    def test_that_failed_datacenters_are_reported(self):
+        with patch.multiple(
+            self.finder,
+            _get_datacenters=Mock(return_value=['dc1', 'dc3', 'dc2']),
+            _list_running_services=Mock(side_effect=self._list_running_services),
+        ):
+            result = self.finder.find_healthy_services('foobar')
+
+        assert_that(result.services, contains_exactly(s.dc1_service, s.dc2_service))
+        assert_that(result.failed_datacenters, equal_to({'dc3': 'dc3 is down'}))
+
+    def test_that_raises_if_all_datacenters_failed(self):
+        with patch.multiple(
+            self.finder,
+            _get_datacenters=Mock(return_value=['dc3', 'dc4']),
+            _list_running_services=Mock(side_effect=self._list_running_services),
+        ):
+            assert_that(
+                calling(self.finder.list_healthy_services).with_args('foobar'),
+                raises(ServiceDiscoveryError),
+            )
+
+    def test_that_the_pool_is_reused(self):
+        with patch.multiple(
+            self.finder,
+            _get_datacenters=Mock(return_value=['dc1', 'dc2']),
+            _list_running_services=Mock(side_effect=self._list_running_services),
+        ):
+            self.finder.list_healthy_services('foobar')
+            executor = self.finder._executor
+            self.finder.list_healthy_services('foobar')
+
+        assert_that(self.finder._executor, equal_to(executor))
+        self.finder.close()
+        assert_that(
+            calling(self.finder.list_healthy_services).with_args('foobar'),
+            raises(RuntimeError),
+        )
+
+
+@patch('xivo.consul_helpers.requests')
+class TestServiceFinderSessions(BaseFinderTestCase):
+    def test_that_each_thread_uses_its_own_session(self, requests):
+        requests.Session.side_effect = lambda: Mock()
+        finder = ServiceFinder(self.consul_config)
+        sessions = []
+
+        def get_session():
+            sessions.append(finder._session())
+            sessions.append(finder._session())
+
+        thread = threading.Thread(target=get_session)
+        thread.start()
+        thread.join()
+        get_session()
+
+        assert_that(sessions[0], equal_to(sessions[1]))
+        assert_that(sessions[2], equal_to(sessions[3]))
+        assert_that(sessions[0] is sessions[2], equal_to(False))
+
+        finder.close()
+
+        sessions[0].close.assert_called_once_with()
+        sessions[2].close.assert_called_once_with()
+
+
+@patch('xivo.consul_helpers.requests')
+class TestServiceWatcher(BaseFinderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service_1 = {'ID': '1', 'Service': 'foobar'}
+        self.service_2 = {'ID': '2', 'Service': 'foobar'}
+
+    def _response(self, index, *services):
+        headers = {} if index is None else {'X-Consul-Index': str(index)}
+        return Mock(
+            status_code=200,
+            headers=headers,
+            json=Mock(return_value=[{'Service': service} for service in services]),
+        )
+
+    def _watch(self, *datacenters):
+        watch = _ServiceWatch()
+        watch.datacenters = list(datacenters)
+        watch.pending = set(datacenters)
+        return watch
+
+    def _blocking_watcher(self, **kwargs):
+        watcher = ServiceWatcher(self.consul_config, **kwargs)
+        released = threading.Event()
+
+        def query(session, service_name, datacenter, tag, index):
+            if index:
+                released.wait(5)
+            return [self.service_1], 42
+
+        watcher._query_services = Mock(side_effect=query)
+        watcher._fetch_datacenters = Mock(return_value=['dc1'])
+
+        def cleanup():
+            watcher.stop(timeout=0)
+            released.set()
+
+        self.addCleanup(cleanup)
+        return watcher, released
+
+    def _query_params(self, session):
+        return [kwargs['params'] for _, kwargs in session.get.call_args_list]
+
+    def test_that_blocking_queries_use_the_last_index(self, requests):
+        watcher = ServiceWatcher(self.consul_config, wait=30)
+        session = requests.Session.return_value
+        watch = self._watch('dc1')
+
+        def get(*args, **kwargs):
+            response = responses.pop(0)
+            if not responses:
+                watch.stopped.set()
+            return response
+
+        responses = [self._response(42, self.service_1)] * 2
+        session.get.side_effect = get
+
+        watcher._watch_loop(('foobar', None), watch, 'dc1')
+
+        assert_that(
+            session.get.call_args_list,
+            contains_exactly(
+                call(
+                    ANY,
+                    verify=ANY,
+                    params={'dc': 'dc1', 'passing': True},
+                    timeout=ANY,
+                ),
+                call(
+                    ANY,
+                    verify=ANY,
+                    params={'dc': 'dc1', 'passing': True, 'index': 42, 'wait': '30s'},
+                    timeout=ANY,
+                ),
+            ),
+        )
+        assert_that(watch.ready.is_set(), equal_to(True))
+
+    def test_that_queries_block_when_consul_sends_no_index(self, requests):
+        watcher = ServiceWatcher(self.consul_config, wait=30, retry_interval=0)
+        session = requests.Session.return_value
+        watch = self._watch('dc1')
+
+        def get(*args, **kwargs):
+            response = responses.pop(0)
+            if not responses:
+                watch.stopped.set()
+            return response
+
+        responses = [self._response(None, self.service_1)] * 2
+        session.get.side_effect = get
+
+        with patch.object(watch.stopped, 'wait') as wait:
+            watcher._watch_loop(('foobar', None), watch, 'dc1')
+
+        assert_that(
+            self._query_params(session),
+            contains_exactly(
+                {'dc': 'dc1', 'passing': True},
+                {'dc': 'dc1', 'passing': True, 'index': 1, 'wait': '30s'},
+            ),
+        )
+        wait.assert_called_with(0)
+
+    def test_that_callbacks_are_called_only_when_services_change(self, requests):
+        watcher = ServiceWatcher(self.consul_config)
+        key = ('foobar', s.tag)
+        watch = self._watch('dc1', 'dc2')
+        callback = Mock()
+        watcher.subscribe(callback)
+
+        watcher._update(key, watch, 'dc1', [self.service_1])
+        callback.assert_called_once_with('foobar', s.tag, [self.service_1])
+        callback.reset_mock()
+
+        watcher._update(key, watch, 'dc1', [self.service_1])
+        callback.assert_not_called()
+
+        watcher._update(key, watch, 'dc2', [])
+        callback.assert_not_called()
+
+        watcher._update(key, watch, 'dc2', [self.service_2])
+        callback.assert_called_once_with(
+            'foobar', s.tag, [self.service_1, self.service_2]
+        )
+
+    def test_that_watched_services_are_served_from_memory(self, requests):
+        watcher = ServiceWatcher(self.consul_config)
+        key = ('foobar', s.tag)
+        watch = watcher._watches[key] = self._watch('dc1')
+        watcher._update(key, watch, 'dc1', [self.service_2, self.service_1])
+        watch.ready.set()
+
+        result = watcher.list_healthy_services('foobar', s.tag)
+
+        assert_that(result, contains_exactly(self.service_1, self.service_2))
+        requests.Session.return_value.get.assert_not_called()
+
+    def test_that_concurrent_callers_wait_for_the_first_result(self, requests):
+        watcher, _ = self._blocking_watcher()
+        fetching = threading.Event()
+        fetched = threading.Event()
+
+        def fetch_datacenters():
+            fetching.set()
+            fetched.wait(5)
+            return ['dc1']
+
+        watcher._fetch_datacenters.side_effect = fetch_datacenters
+        first = threading.Thread(target=watcher.watch, args=('foobar',))
+        first.start()
+        assert_that(fetching.wait(5), equal_to(True))
+
+        results = []
+        second = threading.Thread(
+            target=lambda: results.append(watcher.list_healthy_services('foobar'))
+        )
+        second.start()
+        fetched.set()
+        second.join(5)
+        first.join(5)
+
+        assert_that(results, contains_exactly([self.service_1]))
+        watcher._fetch_datacenters.assert_called_once_with()
+
+    def test_that_concurrent_callers_get_the_datacenters_error(self, requests):
+        watcher = ServiceWatcher(self.consul_config)
+        watch = watcher._watches[('foobar', None)] = _ServiceWatch()
+        watch.error = ServiceDiscoveryError('consul is down')
+        watch.ready.set()
+
+        assert_that(
+            calling(watcher.list_healthy_services).with_args('foobar'),
+            raises(ServiceDiscoveryError),
+        )
+
+    def test_that_unwatch_stops_the_watch_threads(self, requests):
+        watcher, released = self._blocking_watcher()
+        watcher.watch('foobar')
+        watch = watcher._watches[('foobar', None)]
+        released.set()
+
+        watcher.unwatch('foobar')
+
+        assert_that(watcher._watches, equal_to({}))
+        assert_that([t.is_alive() for t in watch.threads], equal_to([False]))
+
+    def test_that_stop_does_not_wait_for_blocking_queries_forever(self, requests):
+        watcher, _ = self._blocking_watcher()
+        watcher.watch('foobar')
+        watch = watcher._watches[('foobar', None)]
+
+        watcher.stop(timeout=0.1)
+
+        assert_that(watcher._watches, equal_to({}))
+        assert_that(watch.stopped.is_set(), equal_to(True))
@@ -0,0 +1,168 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+from unittest.mock import Mock, patch
+
+from hamcrest import assert_that, calling, contains_exactly, equal_to, is_not, raises
+
+from ..load_balancer import (
+    EWMAStrategy,
+    LeastOutstandingStrategy,
+    LoadBalancer,
+    NoServiceAvailable,
+)
+
+SERVICE_NAME = 'wazo-calld'
+
+
+def _service(id_):
+    return {
+        'ID': id_,
+        'Service': SERVICE_NAME,
+        'Address': f'10.0.0.{id_}',
+        'Port': 9500,
+        'Tags': [],
+    }
+
+
+class TestLoadBalancer(unittest.TestCase):
+    def setUp(self):
+        self.services = [_service('1'), _service('2'), _service('3')]
+        self.finder = Mock()
+        self.finder.list_healthy_services.return_value = self.services
+
+    def _select_ids(self, load_balancer, count):
+        return [load_balancer.select()['ID'] for _ in range(count)]
+
+    def test_round_robin_is_the_default(self):
+        load_balancer = LoadBalancer(self.finder, SERVICE_NAME, 'some-uuid')
+
+        result = self._select_ids(load_balancer, 4)
+
+        assert_that(result, contains_exactly('1', '2', '3', '1'))
+        self.finder.list_healthy_services.assert_called_with(SERVICE_NAME, 'some-uuid')
+
+    def test_no_service_available(self):
+        self.finder.list_healthy_services.return_value = []
+        load_balancer = LoadBalancer(self.finder, SERVICE_NAME)
+
+        assert_that(calling(load_balancer.select), raises(NoServiceAvailable))
+
+    def test_least_outstanding(self):
+        load_balancer = LoadBalancer(
+            self.finder, SERVICE_NAME, strategy=LeastOutstandingStrategy()
+        )
+
+        first, second, third = (load_balancer.select() for _ in range(3))
+        load_balancer.report_success(second, 0.1)
+
+        assert_that(load_balancer.select(), equal_to(second))
+
+    def test_ewma_prefers_unmeasured_then_fastest_instances(self):
+        load_balancer = LoadBalancer(self.finder, SERVICE_NAME, strategy=EWMAStrategy())
+        for service, duration in zip(self.services, (0.3, 0.1, 0.2)):
+            assert_that(load_balancer.select(), equal_to(service))
+            load_balancer.report_success(service, duration)
+
+        assert_that(load_balancer.select(), equal_to(self.services[1]))
+
+    def test_least_outstanding_spreads_sequential_requests(self):
+        load_balancer = LoadBalancer(
+            self.finder, SERVICE_NAME, strategy=LeastOutstandingStrategy()
+        )
+        selected = []
+
+        for _ in range(30):
+            with load_balancer.instance() as service:
+                selected.append(service['ID'])
+
+        assert_that(
+            [selected.count(service['ID']) for service in self.services],
+            equal_to([10, 10, 10]),
+        )
+
+    def test_ewma_spreads_a_burst_before_any_measure(self):
+        load_balancer = LoadBalancer(self.finder, SERVICE_NAME, strategy=EWMAStrategy())
+
+        selected = self._select_ids(load_balancer, 9)
+
+        assert_that(
+            [selected.count(service['ID']) for service in self.services],
+            equal_to([3, 3, 3]),
+        )
+
+    def test_instance_is_ejected_after_consecutive_failures(self):
+        load_balancer = LoadBalancer(self.finder, SERVICE_NAME, max_failures=2)
+        load_balancer.report_failure(self.services[0])
+        load_balancer.report_failure(self.services[0])
+
+        result = self._select_ids(load_balancer, 4)
+
+        assert_that(result, contains_exactly('2', '3', '2', '3'))
+
+    def test_success_resets_consecutive_failures(self):
+        load_balancer = LoadBalancer(self.finder, SERVICE_NAME, max_failures=2)
+        load_balancer.report_failure(self.services[0])
+        load_balancer.report_success(self.services[0], 0.1)
+        load_balancer.report_failure(self.services[0])
+
+        result = self._select_ids(load_balancer, 3)
+
+        assert_that(result, contains_exactly('1', '2', '3'))
+
+    @patch('xivo.load_balancer.time')
+    def test_ejected_instance_comes_back_after_ejection_time(self, time):
+        time.monotonic.return_value = 100
+        load_balancer = LoadBalancer(
+            self.finder, SERVICE_NAME, max_failures=1, ejection_time=30
+        )
+        load_balancer.report_failure(self.services[0])
+
+        time.monotonic.return_value = 131
+        result = self._select_ids(load_balancer, 3)
+
+        assert_that(result, contains_exactly('1', '2', '3'))
+
+    def test_all_instances_ejected_falls_back_to_healthy_instances(self):
+        load_balancer = LoadBalancer(self.finder, SERVICE_NAME, max_failures=1)
+        for service in self.services:
+            load_balancer.report_failure(service)
+
+        result = self._select_ids(load_balancer, 3)
+
+        assert_that(result, contains_exactly('1', '2', '3'))
+
+    def test_instance_context_reports_failures(self):
+        load_balancer = LoadBalancer(self.finder, SERVICE_NAME, max_failures=1)
+
+        def failing_request():
+            with load_balancer.instance():
+                raise Exception()
+
+        assert_that(calling(failing_request), raises(Exception))
+        with load_balancer.instance() as service:
+            assert_that(service['ID'], is_not(equal_to('1')))
+
+    def test_stats_of_instances_no_longer_healthy_are_dropped(self):
+        load_balancer = LoadBalancer(self.finder, SERVICE_NAME)
+        self._select_ids(load_balancer, 3)
+
+        self.finder.list_healthy_services.return_value = [_service('4')]
+        load_balancer.select()
+
+        assert_that(list(load_balancer._stats), contains_exactly('4'))
+
+    def test_instance_context_releases_interrupted_requests(self):
+        load_balancer = LoadBalancer(
+            self.finder, SERVICE_NAME, strategy=LeastOutstandingStrategy()
+        )
+
+        def interrupted_request():
+            with load_balancer.instance():
+                raise KeyboardInterrupt()
+
+        assert_that(calling(interrupted_request), raises(KeyboardInterrupt))
+        stats = load_balancer._stats['1']
+        assert_that(stats.outstanding, equal_to(0))
+        assert_that(stats.consecutive_failures, equal_to(0))
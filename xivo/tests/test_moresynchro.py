@@ -0,0 +1,463 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import asyncio
+import threading
+import time
+import unittest
+
+from hamcrest import (
+    assert_that,
+    calling,
+    contains_exactly,
+    contains_inanyorder,
+    equal_to,
+    has_entries,
+    instance_of,
+    is_,
+    raises,
+)
+
+from ..moresynchro import FIFO, PREFER_READERS, AsyncRWLock, RWLock
+
+TIMEOUT = 5
+
+
+def _in_thread(function, *args):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function(*args)))
+    thread.start()
+    thread.join(TIMEOUT)
+    return result[0]
+
+
+def _try_read(lock):
+    acquired = lock.acquire_read(0)
+    if acquired:
+        lock.release()
+    return acquired
+
+
+def _wait_for_pending_writer(lock):
+    for _ in range(500):
+        if not _in_thread(_try_read, lock):
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _start_locking_thread(acquire, name, order, timeout=None, hold=None):
+    lock = acquire.__self__
+    acquiring = threading.Event()
+
+    def run():
+        acquiring.set()
+        if acquire(timeout):
+            order.append(name)
+            if hold:
+                hold()
+            lock.release()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    acquiring.wait(TIMEOUT)
+    return thread
+
+
+class TestRWLock(unittest.TestCase):
+    def setUp(self):
+        self.lock = RWLock()
+
+    def _start_writer(self, name, order, timeout=None):
+        return _start_locking_thread(self.lock.acquire_write, name, order, timeout)
+
+    def test_readers_share_the_lock(self):
+        assert_that(self.lock.acquire_read(), is_(True))
+
+        assert_that(_in_thread(self.lock.acquire_read, 0), is_(True))
+
+    def test_writer_excludes_readers_and_writers(self):
+        self.lock.acquire_write()
+
+        assert_that(_in_thread(self.lock.acquire_read, 0.01), is_(None))
+        assert_that(_in_thread(self.lock.acquire_write, 0), is_(None))
+
+    def test_reader_excludes_writers(self):
+        self.lock.acquire_read()
+
+        assert_that(_in_thread(self.lock.acquire_write, 0.01), is_(None))
+
+    def test_writer_can_reacquire(self):
+        self.lock.acquire_write()
+
+        assert_that(self.lock.acquire_write(0), is_(True))
+        assert_that(self.lock.acquire_read(0), is_(True))
+
+        for _ in range(3):
+            self.lock.release()
+        assert_that(_in_thread(self.lock.acquire_write, 0), is_(True))
+
+    def test_no_promotion(self):
+        self.lock.acquire_read()
+
+        assert_that(self.lock.acquire_write(0), is_(False))
+
+    def test_release_unlocked_lock(self):
+        assert_that(calling(self.lock.release), raises(RuntimeError))
+
+    def test_release_after_all_read_locks_released(self):
+        self.lock.acquire_read()
+        self.lock.acquire_read()
+        self.lock.release()
+        self.lock.release()
+
+        assert_that(calling(self.lock.release), raises(RuntimeError))
+        assert_that(_in_thread(self.lock.acquire_write, 0), is_(True))
+
+    def test_pending_writer_blocks_new_readers_only(self):
+        order = []
+        self.lock.acquire_read()
+        writer = self._start_writer('writer', order)
+
+        assert_that(_wait_for_pending_writer(self.lock), is_(True))
+        assert_that(self.lock.acquire_read(0), is_(True))
+
+        self.lock.release()
+        self.lock.release()
+        writer.join(TIMEOUT)
+        assert_that(order, contains_exactly('writer'))
+
+    def test_pending_writers_are_served_in_order(self):
+        order = []
+        self.lock.acquire_write()
+        writers = []
+        for name in ('first', 'second', 'third'):
+            writers.append(self._start_writer(name, order))
+            # let the writer queue up before starting the next one
+            time.sleep(0.05)
+
+        self.lock.release()
+        for writer in writers:
+            writer.join(TIMEOUT)
+
+        assert_that(order, contains_exactly('first', 'second', 'third'))
+
+    def test_timed_out_writer_lets_readers_in(self):
+        order = []
+        self.lock.acquire_read()
+        reader_result = []
+        writer = self._start_writer('writer', order, timeout=0.1)
+        _wait_for_pending_writer(self.lock)
+        reader = threading.Thread(
+            target=lambda: reader_result.append(self.lock.acquire_read())
+        )
+        reader.start()
+
+        writer.join(TIMEOUT)
+        reader.join(TIMEOUT)
+
+        assert_that(order, equal_to([]))
+        assert_that(reader_result, contains_exactly(True))
+
+
+class TestRWLockPolicies(unittest.TestCase):
+    def test_unknown_policy(self):
+        assert_that(calling(RWLock).with_args('unknown'), raises(ValueError))
+
+    def test_prefer_readers_lets_readers_pass_pending_writers(self):
+        lock = RWLock(PREFER_READERS)
+        order = []
+        lock.acquire_read()
+        writer = _start_locking_thread(lock.acquire_write, 'writer', order)
+        time.sleep(0.05)
+
+        assert_that(_in_thread(_try_read, lock), is_(True))
+
+        lock.release()
+        writer.join(TIMEOUT)
+        assert_that(order, contains_exactly('writer'))
+
+    def test_fifo_serves_readers_and_writers_in_arrival_order(self):
+        lock = RWLock(FIFO)
+        order = []
+        lock.acquire_write()
+        threads = []
+        for name in ('reader-1', 'writer', 'reader-2'):
+            acquire = lock.acquire_write if name == 'writer' else lock.acquire_read
+            threads.append(_start_locking_thread(acquire, name, order))
+            time.sleep(0.05)
+
+        lock.release()
+        for thread in threads:
+            thread.join(TIMEOUT)
+
+        assert_that(order, contains_exactly('reader-1', 'writer', 'reader-2'))
+
+    def test_fifo_consecutive_readers_share_the_lock(self):
+        lock = RWLock(FIFO)
+        order = []
+        both_reading = threading.Barrier(2, timeout=TIMEOUT)
+        lock.acquire_write()
+        threads = [
+            _start_locking_thread(
+                lock.acquire_read, name, order, hold=both_reading.wait
+            )
+            for name in ('reader-1', 'reader-2')
+        ]
+
+        lock.release()
+        for thread in threads:
+            thread.join(TIMEOUT)
+
+        assert_that(both_reading.broken, is_(False))
+        assert_that(order, contains_inanyorder('reader-1', 'reader-2'))
+
+    def test_fifo_timed_out_writer_lets_queued_readers_in(self):
+        lock = RWLock(FIFO)
+        order = []
+        lock.acquire_read()
+        writer = _start_locking_thread(lock.acquire_write, 'writer', order, 0.1)
+        time.sleep(0.05)
+        reader = _start_locking_thread(lock.acquire_read, 'reader', order)
+
+        writer.join(TIMEOUT)
+        reader.join(TIMEOUT)
+
+        assert_that(order, contains_exactly('reader'))
+
+
+class TestRWLockStatistics(unittest.TestCase):
+    def test_current_state(self):
+        lock = RWLock()
+        lock.acquire_read()
+        writer = _start_locking_thread(lock.acquire_write, 'writer', [])
+        _wait_for_pending_writer(lock)
+
+        assert_that(
+            lock.statistics(),
+            has_entries(readers=1, waiting_readers=0, pending_writers=1),
+        )
+
+        lock.release()
+        writer.join(TIMEOUT)
+        assert_that(lock.statistics(), has_entries(readers=0, pending_writers=0))
+
+    def test_timeouts(self):
+        lock = RWLock()
+        lock.acquire_write()
+
+        _in_thread(lock.acquire_read, 0)
+        _in_thread(lock.acquire_write, 0)
+        _in_thread(lock.acquire_write, 0.01)
+
+        assert_that(lock.statistics(), has_entries(read_timeouts=1, write_timeouts=2))
+
+    def test_durations_are_measured_when_instrumented(self):
+        lock = RWLock(instrumented=True)
+
+        with lock.read_locked():
+            with lock.read_locked():
+                pass
+        with lock.write_locked():
+            pass
+
+        statistics = lock.statistics()
+        for name in ('read_wait', 'read_hold', 'write_wait', 'write_hold'):
+            assert_that(statistics[name], has_entries(count=1))
+            assert_that(sum(statistics[name]['buckets']), equal_to(1))
+
+    def test_durations_are_not_measured_by_default(self):
+        lock = RWLock()
+
+        with lock.write_locked():
+            pass
+
+        assert_that(lock.statistics()['write_hold'], has_entries(count=0, total=0))
+
+
+class TestRWLockContextManagers(unittest.TestCase):
+    def setUp(self):
+        self.lock = RWLock()
+
+    def test_lock_is_released_on_exception(self):
+        def fail():
+            with self.lock.read_locked():
+                raise ValueError()
+
+        assert_that(calling(fail), raises(ValueError))
+        assert_that(_in_thread(self.lock.acquire_write, 0), is_(True))
+
+    def test_timeout(self):
+        self.lock.acquire_write()
+
+        def locking(locked, timeout):
+            try:
+                with locked(timeout=timeout):
+                    return None
+            except TimeoutError as e:
+                return e
+
+        for locked in (self.lock.read_locked, self.lock.write_locked):
+            for timeout in (0, 0.01):
+                result = _in_thread(locking, locked, timeout)
+                assert_that(result, instance_of(TimeoutError))
+
+    def test_no_promotion(self):
+        def promote():
+            with self.lock.read_locked():
+                with self.lock.write_locked():
+                    pass
+
+        assert_that(calling(promote), raises(RuntimeError))
+        assert_that(_in_thread(self.lock.acquire_write, 0), is_(True))
+
+
+class TestAsyncRWLock(unittest.IsolatedAsyncioTestCase):
+    async def _in_task(self, function, *args):
+        return await asyncio.create_task(function(*args))
+
+    async def _try_read(self, lock):
+        acquired = await lock.acquire_read(0)
+        if acquired:
+            lock.release()
+        return acquired
+
+    def _start_locking_task(self, acquire, name, order, timeout=None):
+        lock = acquire.__self__
+
+        async def run():
+            if await acquire(timeout):
+                order.append(name)
+                lock.release()
+
+        return asyncio.create_task(run())
+
+    async def test_readers_share_the_lock(self):
+        lock = AsyncRWLock()
+        await lock.acquire_read()
+
+        assert_that(await self._in_task(lock.acquire_read, 0), is_(True))
+
+    async def test_writer_excludes_readers_and_writers(self):
+        lock = AsyncRWLock()
+        await lock.acquire_write()
+
+        assert_that(await self._in_task(lock.acquire_read, 0.01), is_(None))
+        assert_that(await self._in_task(lock.acquire_write, 0), is_(None))
+        assert_that(lock.statistics(), has_entries(read_timeouts=1, write_timeouts=1))
+
+    async def test_writer_can_reacquire(self):
+        lock = AsyncRWLock()
+        await lock.acquire_write()
+
+        assert_that(await lock.acquire_write(0), is_(True))
+        assert_that(await lock.acquire_read(0), is_(True))
+
+        for _ in range(3):
+            lock.release()
+        assert_that(await self._in_task(lock.acquire_write, 0), is_(True))
+
+    async def test_no_promotion(self):
+        lock = AsyncRWLock()
+        await lock.acquire_read()
+
+        assert_that(await lock.acquire_write(0), is_(False))
+
+    async def test_release_unlocked_lock(self):
+        lock = AsyncRWLock()
+
+        assert_that(calling(lock.release), raises(RuntimeError))
+
+    async def test_pending_writer_blocks_new_readers_only(self):
+        lock = AsyncRWLock()
+        order = []
+        await lock.acquire_read()
+        writer = self._start_locking_task(lock.acquire_write, 'writer', order)
+        await asyncio.sleep(0)
+
+        assert_that(await self._in_task(self._try_read, lock), is_(None))
+        assert_that(await lock.acquire_read(0), is_(True))
+
+        lock.release()
+        lock.release()
+        await writer
+        assert_that(order, contains_exactly('writer'))
+
+    async def test_prefer_readers_lets_readers_pass_pending_writers(self):
+        lock = AsyncRWLock(PREFER_READERS)
+        order = []
+        await lock.acquire_read()
+        writer = self._start_locking_task(lock.acquire_write, 'writer', order)
+        await asyncio.sleep(0)
+
+        assert_that(await self._in_task(self._try_read, lock), is_(True))
+
+        lock.release()
+        await writer
+        assert_that(order, contains_exactly('writer'))
+
+    async def test_fifo_serves_readers_and_writers_in_arrival_order(self):
+        lock = AsyncRWLock(FIFO)
+        order = []
+        await lock.acquire_write()
+        tasks = []
+        for name in ('reader-1', 'reader-2', 'writer', 'reader-3'):
+            acquire = lock.acquire_write if name == 'writer' else lock.acquire_read
+            tasks.append(self._start_locking_task(acquire, name, order))
+            await asyncio.sleep(0)
+        assert_that(
+            lock.statistics(), has_entries(waiting_readers=3, pending_writers=1)
+        )
+
+        lock.release()
+        await asyncio.gather(*tasks)
+
+        assert_that(
+            order, contains_exactly('reader-1', 'reader-2', 'writer', 'reader-3')
+        )
+
+    async def test_timed_out_writer_lets_readers_in(self):
+        lock = AsyncRWLock()
+        order = []
+        await lock.acquire_read()
+        writer = self._start_locking_task(lock.acquire_write, 'writer', order, 0.01)
+        await asyncio.sleep(0)
+        reader = self._start_locking_task(lock.acquire_read, 'reader', order)
+
+        await asyncio.gather(writer, reader)
+
+        assert_that(order, contains_exactly('reader'))
+
+    async def test_cancelled_writer_lets_readers_in(self):
+        lock = AsyncRWLock()
+        order = []
+        await lock.acquire_read()
+        writer = self._start_locking_task(lock.acquire_write, 'writer', order)
+        await asyncio.sleep(0)
+        reader = self._start_locking_task(lock.acquire_read, 'reader', order)
+        await asyncio.sleep(0)
+
+        writer.cancel()
+        await reader
+
+        assert_that(order, contains_exactly('reader'))
+        assert_that(lock.statistics(), has_entries(pending_writers=0))
+
+    async def test_context_managers(self):
+        lock = AsyncRWLock(instrumented=True)
+
+        async with lock.read_locked():
+            assert_that(lock.statistics(), has_entries(readers=1))
+        async with lock.write_locked():
+            pass
+
+        async def write():
+            async with lock.write_locked(timeout=0):
+                pass
+
+        async with lock.read_locked():
+            with self.assertRaises(TimeoutError):
+                await asyncio.create_task(write())
+        statistics = lock.statistics()
+        assert_that(statistics['read_hold'], has_entries(count=2))
+        assert_that(statistics['write_wait'], has_entries(count=1))
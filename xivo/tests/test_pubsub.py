@@ -1,12 +1,37 @@
-# Copyright 2013-2023 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import asyncio
+import gc
+import threading
 import unittest
-from unittest.mock import Mock, patch
-
-from hamcrest import assert_that, is_
-
-from ..pubsub import CallbackCollector, Pubsub
+from unittest.mock import ANY, Mock, patch
+
+from hamcrest import (
+    assert_that,
+    calling,
+    contains_exactly,
+    equal_to,
+    has_entries,
+    has_key,
+    is_,
+    is_not,
+    raises,
+)
+
+from ..pubsub import (
+    OTHER_TOPICS,
+    OVERFLOW_BLOCK,
+    OVERFLOW_COALESCE,
+    OVERFLOW_DROP_NEWEST,
+    OVERFLOW_DROP_OLDEST,
+    AsyncioDispatcher,
+    BatchCallback,
+    CallbackCollector,
+    Dispatcher,
+    Pubsub,
+    ThreadPoolDispatcher,
+)
 
 SOME_TOPIC = 'abcd'
 SOME_MESSAGE = 'defg'
@@ -119,6 +144,620 @@ class TestPubsub(unittest.TestCase):
         assert_that(callback_1.called)
         assert_that(callback_3.called)
 
+    def test_subscribing_twice_delivers_twice_until_unsubscribed(self):
+        callback = Mock()
+        self.pubsub.subscribe(SOME_TOPIC, callback)
+        self.pubsub.subscribe(SOME_TOPIC, callback)
+
+        self.pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+        assert_that(callback.call_count, equal_to(2))
+
+        self.pubsub.unsubscribe(SOME_TOPIC, callback)
+        self.pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+        assert_that(callback.call_count, equal_to(3))
+
+    def test_unsubscribe_during_publish_does_not_affect_current_delivery(self):
+        callback_2 = Mock()
+
+        def callback_1(message):
+            self.pubsub.unsubscribe(SOME_TOPIC, callback_2)
+
+        self.pubsub.subscribe(SOME_TOPIC, callback_1)
+        self.pubsub.subscribe(SOME_TOPIC, callback_2)
+
+        self.pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+        self.pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+
+        callback_2.assert_called_once_with(SOME_MESSAGE)
+
+    def test_concurrent_subscribe_and_unsubscribe(self):
+        topics = ['topic.a', 'topic.*', 'topic.#']
+        received = []
+        permanent = received.append
+        for topic in topics:
+            self.pubsub.subscribe(topic, permanent)
+        errors = []
+
+        def churn(worker):
+            try:
+                for i in range(500):
+                    callback = Mock()
+                    topic = topics[(worker + i) % len(topics)]
+                    self.pubsub.subscribe(topic, callback)
+                    self.pubsub.publish('topic.a', SOME_MESSAGE)
+                    self.pubsub.unsubscribe(topic, callback)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=churn, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert_that(errors, equal_to([]))
+        # permanent matches each publication through three topics, once
+        assert_that(len(received), equal_to(4 * 500))
+        assert_that(self.pubsub._subscribers, equal_to({'topic.a': (permanent,)}))
+        assert_that(
+            self.pubsub._subscription_counts,
+            equal_to({topic: {permanent: 1} for topic in topics}),
+        )
+
+
+class TestPubsubPublishMany(unittest.TestCase):
+    def setUp(self):
+        self.pubsub = Pubsub()
+        self.messages = ['one', 'two', 'three']
+
+    def test_messages_are_delivered_in_order(self):
+        received = []
+        self.pubsub.subscribe(SOME_TOPIC, received.append)
+        self.pubsub.subscribe('some.*', received.append)
+
+        self.pubsub.publish_many(SOME_TOPIC, self.messages)
+        self.pubsub.publish_many('some.topic', iter(self.messages))
+
+        assert_that(received, equal_to(self.messages * 2))
+
+    def test_batch_callbacks_receive_all_messages(self):
+        batch = Mock()
+        self.pubsub.subscribe(SOME_TOPIC, BatchCallback(batch))
+
+        self.pubsub.publish_many(SOME_TOPIC, self.messages)
+        self.pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+
+        batch.assert_any_call(self.messages)
+        batch.assert_called_with([SOME_MESSAGE])
+        assert_that(batch.call_count, equal_to(2))
+
+    def test_batch_callbacks_can_be_unsubscribed(self):
+        batch = Mock()
+        self.pubsub.subscribe(SOME_TOPIC, BatchCallback(batch))
+
+        self.pubsub.unsubscribe(SOME_TOPIC, BatchCallback(batch))
+        self.pubsub.publish_many(SOME_TOPIC, self.messages)
+
+        batch.assert_not_called()
+
+    def test_when_exception_then_other_messages_are_delivered(self):
+        callback = Mock(side_effect=[None, Exception(), None])
+        handler = Mock()
+        self.pubsub.set_exception_handler(handler)
+        self.pubsub.subscribe(SOME_TOPIC, callback)
+
+        self.pubsub.publish_many(SOME_TOPIC, self.messages)
+
+        assert_that(callback.call_count, equal_to(3))
+        handler.assert_called_once_with(callback, 'two', ANY)
+
+    def test_statistics_count_each_message(self):
+        pubsub = Pubsub(high_throughput=True)
+        pubsub.subscribe(SOME_TOPIC, Mock())
+        pubsub.subscribe(SOME_TOPIC, BatchCallback(Mock()))
+
+        pubsub.publish_many(SOME_TOPIC, self.messages)
+
+        assert_that(
+            pubsub.statistics()[SOME_TOPIC],
+            has_entries(published=3, delivered=6, failed=0),
+        )
+
+
+class TestPubsubHighThroughput(unittest.TestCase):
+    def setUp(self):
+        self.pubsub = Pubsub(high_throughput=True)
+
+    def test_nothing_is_logged_when_publishing(self):
+        self.pubsub.subscribe(SOME_TOPIC, Mock())
+
+        with patch('xivo.pubsub.logger') as logger:
+            self.pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+
+        logger.debug.assert_not_called()
+
+    def test_statistics_are_counted_per_topic(self):
+        failing = Mock(side_effect=Exception())
+        handler = Mock()
+        self.pubsub.set_exception_handler(handler)
+        self.pubsub.subscribe(SOME_TOPIC, Mock())
+        self.pubsub.subscribe(SOME_TOPIC, failing)
+        self.pubsub.subscribe('other', Mock())
+
+        self.pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+        self.pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+        self.pubsub.publish('nobody', SOME_MESSAGE)
+
+        statistics = self.pubsub.statistics()
+        assert_that(
+            statistics[SOME_TOPIC],
+            has_entries(published=2, delivered=2, failed=2),
+        )
+        assert_that(statistics['nobody'], has_entries(published=1, delivered=0))
+        assert_that(statistics, is_not(has_key('other')))
+        assert_that(handler.call_count, equal_to(2))
+
+    def test_statistics_are_counted_with_a_thread_pool(self):
+        pubsub = Pubsub(ThreadPoolDispatcher(max_workers=2), high_throughput=True)
+        pubsub.set_exception_handler(Mock())
+        pubsub.subscribe(SOME_TOPIC, Mock())
+        pubsub.subscribe(SOME_TOPIC, Mock(side_effect=Exception()))
+
+        pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+        pubsub.close()
+
+        assert_that(
+            pubsub.statistics()[SOME_TOPIC],
+            has_entries(published=1, delivered=1, failed=1),
+        )
+
+    def test_statistics_of_exited_threads_are_kept(self):
+        self.pubsub.subscribe(SOME_TOPIC, Mock())
+        thread = threading.Thread(
+            target=self.pubsub.publish, args=(SOME_TOPIC, SOME_MESSAGE)
+        )
+        thread.start()
+        thread.join()
+
+        self.pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+
+        assert_that(
+            self.pubsub.statistics()[SOME_TOPIC],
+            has_entries(published=2, delivered=2),
+        )
+
+    def test_statistics_topics_are_bounded(self):
+        pubsub = Pubsub(high_throughput=True, max_statistics_topics=2)
+
+        for topic in ('a', 'b', 'c', 'd', 'a'):
+            pubsub.publish(topic, SOME_MESSAGE)
+
+        statistics = pubsub.statistics()
+        assert_that(set(statistics), equal_to({'a', 'b', OTHER_TOPICS}))
+        assert_that(statistics['a'], has_entries(published=2))
+        assert_that(statistics[OTHER_TOPICS], has_entries(published=2))
+
+    def test_statistics_are_not_kept_by_default(self):
+        pubsub = Pubsub()
+        pubsub.subscribe(SOME_TOPIC, Mock())
+
+        pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+
+        assert_that(pubsub.statistics(), equal_to({}))
+
+
+class TestPubsubWildcards(unittest.TestCase):
+    def setUp(self):
+        self.pubsub = Pubsub()
+
+    def _matches(self, pattern, topic):
+        callback = Mock()
+        self.pubsub.subscribe(pattern, callback)
+        self.pubsub.publish(topic, SOME_MESSAGE)
+        self.pubsub.unsubscribe(pattern, callback)
+        return callback.called
+
+    def test_star_matches_exactly_one_word(self):
+        assert_that(self._matches('call.*', 'call.created'), is_(True))
+        assert_that(self._matches('call.*.updated', 'call.1.updated'), is_(True))
+        assert_that(self._matches('call.*', 'call'), is_(False))
+        assert_that(self._matches('call.*', 'call.created.now'), is_(False))
+        assert_that(self._matches('call.*', 'user.created'), is_(False))
+
+    def test_hash_matches_zero_or_more_words(self):
+        assert_that(self._matches('user.#', 'user'), is_(True))
+        assert_that(self._matches('user.#', 'user.created'), is_(True))
+        assert_that(self._matches('user.#', 'user.1.line.created'), is_(True))
+        assert_that(self._matches('#.created', 'user.1.created'), is_(True))
+        assert_that(self._matches('#', 'anything.at.all'), is_(True))
+        assert_that(self._matches('user.#', 'call.created'), is_(False))
+
+    def test_callback_is_called_once_when_pattern_matches_many_ways(self):
+        callback = Mock()
+        self.pubsub.subscribe('#.#', callback)
+
+        self.pubsub.publish('a.b.c', SOME_MESSAGE)
+
+        callback.assert_called_once_with(SOME_MESSAGE)
+
+    def test_callback_is_called_once_when_many_patterns_match(self):
+        callback = Mock()
+        self.pubsub.subscribe('a.*', callback)
+        self.pubsub.subscribe('a.#', callback)
+        self.pubsub.subscribe('a.b', callback)
+
+        self.pubsub.publish('a.b', SOME_MESSAGE)
+
+        callback.assert_called_once_with(SOME_MESSAGE)
+
+    def test_callback_subscribed_twice_to_a_pattern_is_called_twice(self):
+        callback = Mock()
+        self.pubsub.subscribe('a.*', callback)
+        self.pubsub.subscribe('a.*', callback)
+        self.pubsub.subscribe('a.b', callback)
+
+        self.pubsub.publish('a.b', SOME_MESSAGE)
+
+        assert_that(callback.call_count, equal_to(2))
+
+    def test_exact_and_wildcard_subscribers_are_called(self):
+        exact, wildcard = Mock(), Mock()
+        self.pubsub.subscribe('call.created', exact)
+        self.pubsub.subscribe('call.*', wildcard)
+
+        self.pubsub.publish('call.created', SOME_MESSAGE)
+
+        exact.assert_called_once_with(SOME_MESSAGE)
+        wildcard.assert_called_once_with(SOME_MESSAGE)
+
+    def test_unsubscribe_removes_empty_nodes(self):
+        callback = Mock()
+        self.pubsub.subscribe('call.*.updated', callback)
+
+        self.pubsub.unsubscribe('call.*.updated', callback)
+
+        assert_that(bool(self.pubsub._wildcard_subscribers), is_(False))
+
+    def test_many_wildcard_subscriptions(self):
+        callbacks = [Mock() for _ in range(5000)]
+        for i, callback in enumerate(callbacks):
+            self.pubsub.subscribe(f'user.{i}.*', callback)
+
+        self.pubsub.publish('user.42.created', SOME_MESSAGE)
+
+        callbacks[42].assert_called_once_with(SOME_MESSAGE)
+        assert_that(sum(callback.called for callback in callbacks), equal_to(1))
+
+
+class TestThreadPoolDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.pubsub = Pubsub(ThreadPoolDispatcher(max_workers=4))
+
+    def test_messages_are_delivered_in_order_to_each_subscriber(self):
+        received = {'slow': [], 'fast': []}
+        slow_started = threading.Event()
+        self.pubsub.subscribe(SOME_TOPIC, received['fast'].append)
+
+        def slow(message):
+            slow_started.wait(timeout=5)
+            received['slow'].append(message)
+
+        self.pubsub.subscribe(SOME_TOPIC, slow)
+
+        for i in range(10):
+            self.pubsub.publish(SOME_TOPIC, i)
+        slow_started.set()
+        self.pubsub.close()
+
+        assert_that(received['fast'], equal_to(list(range(10))))
+        assert_that(received['slow'], equal_to(list(range(10))))
+
+    def test_slow_subscriber_does_not_block_others(self):
+        release = threading.Event()
+        delivered = threading.Event()
+        self.pubsub.subscribe(SOME_TOPIC, lambda message: release.wait(timeout=5))
+        self.pubsub.subscribe(SOME_TOPIC, lambda message: delivered.set())
+
+        self.pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+
+        assert_that(delivered.wait(timeout=5), equal_to(True))
+        release.set()
+        self.pubsub.close()
+
+    def test_when_exception_then_exception_is_handled(self):
+        callback = Mock()
+        exception = callback.side_effect = Exception()
+        handler = Mock()
+        self.pubsub.set_exception_handler(handler)
+        self.pubsub.subscribe(SOME_TOPIC, callback)
+
+        self.pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+        self.pubsub.close()
+
+        handler.assert_called_once_with(callback, SOME_MESSAGE, exception)
+
+
+class TestThreadPoolDispatcherStatistics(unittest.TestCase):
+    def test_statistics_are_dropped_with_their_subscriber(self):
+        dispatcher = ThreadPoolDispatcher()
+        pubsub = Pubsub(dispatcher)
+
+        def callback(message):
+            pass
+
+        pubsub.subscribe(SOME_TOPIC, callback)
+        pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+        pubsub.unsubscribe(SOME_TOPIC, callback)
+        pubsub.close()
+        assert_that(dispatcher.statistics(), has_key(callback))
+
+        del callback
+        gc.collect()
+
+        assert_that(dispatcher.statistics(), equal_to({}))
+
+    def test_statistics_of_unreferenceable_subscribers_are_dropped_once_drained(
+        self,
+    ):
+        dispatcher = ThreadPoolDispatcher()
+        pubsub = Pubsub(dispatcher)
+        callback = _SlottedCallback()
+        pubsub.subscribe(SOME_TOPIC, callback)
+
+        pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+        pubsub.close()
+
+        assert_that(callback.received, contains_exactly(SOME_MESSAGE))
+        assert_that(dispatcher.statistics(), equal_to({}))
+
+
+class _SlottedCallback:
+    # without __weakref__, instances cannot be weakly referenced
+    __slots__ = ('received',)
+
+    def __init__(self):
+        self.received = []
+
+    def __call__(self, message):
+        self.received.append(message)
+
+
+class TestThreadPoolDispatcherOverflow(unittest.TestCase):
+    def setUp(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.received = []
+
+    def callback(self, message):
+        self.started.set()
+        self.release.wait(timeout=5)
+        self.received.append(message)
+
+    def _publish_while_busy(self, dispatcher, messages):
+        pubsub = Pubsub(dispatcher)
+        pubsub.subscribe(SOME_TOPIC, self.callback)
+        pubsub.publish(SOME_TOPIC, 'in-flight')
+        self.started.wait(timeout=5)
+        for message in messages:
+            pubsub.publish(SOME_TOPIC, message)
+        statistics = dispatcher.statistics()[self.callback]
+        self.release.set()
+        pubsub.close()
+        return statistics
+
+    def test_drop_oldest(self):
+        dispatcher = ThreadPoolDispatcher(
+            max_queue_size=2, overflow=OVERFLOW_DROP_OLDEST
+        )
+
+        statistics = self._publish_while_busy(dispatcher, ['1', '2', '3', '4'])
+
+        assert_that(self.received, contains_exactly('in-flight', '3', '4'))
+        assert_that(
+            statistics, has_entries(depth=2, max_depth=2, dropped=2, coalesced=0)
+        )
+
+    def test_drop_newest(self):
+        dispatcher = ThreadPoolDispatcher(
+            max_queue_size=2, overflow=OVERFLOW_DROP_NEWEST
+        )
+
+        statistics = self._publish_while_busy(dispatcher, ['1', '2', '3', '4'])
+
+        assert_that(self.received, contains_exactly('in-flight', '1', '2'))
+        assert_that(statistics, has_entries(depth=2, dropped=2))
+
+    def test_coalesce(self):
+        dispatcher = ThreadPoolDispatcher(
+            max_queue_size=2,
+            overflow=OVERFLOW_COALESCE,
+            coalesce_key=lambda message: message.split(':')[0],
+        )
+
+        statistics = self._publish_while_busy(
+            dispatcher, ['a:1', 'b:1', 'a:2', 'b:2', 'c:1']
+        )
+
+        assert_that(self.received, contains_exactly('in-flight', 'b:2', 'c:1'))
+        assert_that(statistics, has_entries(depth=2, dropped=1, coalesced=2))
+
+    def test_block(self):
+        dispatcher = ThreadPoolDispatcher(max_queue_size=1, overflow=OVERFLOW_BLOCK)
+        pubsub = Pubsub(dispatcher)
+        pubsub.subscribe(SOME_TOPIC, self.callback)
+        pubsub.publish(SOME_TOPIC, 'in-flight')
+        self.started.wait(timeout=5)
+        pubsub.publish(SOME_TOPIC, '1')
+
+        publisher = threading.Thread(target=pubsub.publish, args=(SOME_TOPIC, '2'))
+        publisher.start()
+        publisher.join(timeout=0.1)
+        assert_that(publisher.is_alive(), is_(True))
+
+        self.release.set()
+        publisher.join(timeout=5)
+        pubsub.close()
+
+        assert_that(self.received, contains_exactly('in-flight', '1', '2'))
+
+    def _publish_many_while_busy(self, dispatcher, messages, callback=None):
+        callback = callback or self.callback
+        pubsub = Pubsub(dispatcher)
+        pubsub.subscribe(SOME_TOPIC, callback)
+        pubsub.publish(SOME_TOPIC, 'in-flight')
+        self.started.wait(timeout=5)
+        pubsub.publish_many(SOME_TOPIC, messages)
+        statistics = dispatcher.statistics()[callback]
+        self.release.set()
+        pubsub.close()
+        return statistics
+
+    def test_publish_many_drop_oldest(self):
+        dispatcher = ThreadPoolDispatcher(
+            max_queue_size=2, overflow=OVERFLOW_DROP_OLDEST
+        )
+
+        statistics = self._publish_many_while_busy(dispatcher, ['1', '2', '3', '4'])
+
+        assert_that(self.received, contains_exactly('in-flight', '3', '4'))
+        assert_that(statistics, has_entries(depth=2, dropped=2))
+
+    def test_publish_many_drop_newest(self):
+        dispatcher = ThreadPoolDispatcher(
+            max_queue_size=2, overflow=OVERFLOW_DROP_NEWEST
+        )
+
+        statistics = self._publish_many_while_busy(dispatcher, ['1', '2', '3', '4'])
+
+        assert_that(self.received, contains_exactly('in-flight', '1', '2'))
+        assert_that(statistics, has_entries(depth=2, dropped=2))
+
+    def test_publish_many_coalesce(self):
+        dispatcher = ThreadPoolDispatcher(
+            max_queue_size=2,
+            overflow=OVERFLOW_COALESCE,
+            coalesce_key=lambda message: message.split(':')[0],
+        )
+
+        statistics = self._publish_many_while_busy(
+            dispatcher, ['a:1', 'b:1', 'a:2', 'b:2', 'c:1']
+        )
+
+        assert_that(self.received, contains_exactly('in-flight', 'b:2', 'c:1'))
+        assert_that(statistics, has_entries(depth=2, dropped=1, coalesced=2))
+
+    def test_publish_many_block(self):
+        dispatcher = ThreadPoolDispatcher(max_queue_size=1, overflow=OVERFLOW_BLOCK)
+        pubsub = Pubsub(dispatcher)
+        pubsub.subscribe(SOME_TOPIC, self.callback)
+        pubsub.publish(SOME_TOPIC, 'in-flight')
+        self.started.wait(timeout=5)
+
+        publisher = threading.Thread(
+            target=pubsub.publish_many, args=(SOME_TOPIC, ['1', '2'])
+        )
+        publisher.start()
+        publisher.join(timeout=0.1)
+        assert_that(publisher.is_alive(), is_(True))
+
+        self.release.set()
+        publisher.join(timeout=5)
+        pubsub.close()
+
+        assert_that(self.received, contains_exactly('in-flight', '1', '2'))
+
+    def test_publish_many_batch_receives_the_waiting_messages_together(self):
+        dispatcher = ThreadPoolDispatcher(
+            max_queue_size=2, overflow=OVERFLOW_DROP_OLDEST
+        )
+        callback = BatchCallback(self.callback)
+
+        statistics = self._publish_many_while_busy(
+            dispatcher, ['1', '2', '3', '4'], callback
+        )
+
+        assert_that(self.received, contains_exactly(['in-flight'], ['3', '4']))
+        assert_that(statistics, has_entries(dropped=2))
+
+    def test_coalesce_requires_a_key(self):
+        assert_that(
+            calling(ThreadPoolDispatcher).with_args(overflow=OVERFLOW_COALESCE),
+            raises(ValueError),
+        )
+
+
+class TestAsyncioDispatcher(unittest.TestCase):
+    def test_subscribers_are_called_from_the_loop(self):
+        received = []
+
+        async def publish_and_wait():
+            pubsub = Pubsub(AsyncioDispatcher(asyncio.get_running_loop()))
+            pubsub.subscribe(SOME_TOPIC, received.append)
+            pubsub.publish(SOME_TOPIC, 'first')
+            pubsub.publish(SOME_TOPIC, 'second')
+            assert_that(received, equal_to([]))
+            await asyncio.sleep(0)
+
+        asyncio.run(publish_and_wait())
+
+        assert_that(received, contains_exactly('first', 'second'))
+
+    def test_coroutine_subscribers_are_run_as_tasks(self):
+        received = []
+
+        async def subscriber(message):
+            await asyncio.sleep(0)
+            received.append(message)
+
+        async def publish_and_wait():
+            pubsub = Pubsub(AsyncioDispatcher(asyncio.get_running_loop()))
+            pubsub.subscribe(SOME_TOPIC, subscriber)
+            pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+            while not received:
+                await asyncio.sleep(0)
+
+        asyncio.run(asyncio.wait_for(publish_and_wait(), 5))
+
+        assert_that(received, contains_exactly(SOME_MESSAGE))
+
+    def test_coroutine_exceptions_are_handled(self):
+        handler = Mock()
+        exception = Exception()
+
+        async def subscriber(message):
+            raise exception
+
+        async def publish_and_wait():
+            pubsub = Pubsub(AsyncioDispatcher(asyncio.get_running_loop()))
+            pubsub.set_exception_handler(handler)
+            pubsub.subscribe(SOME_TOPIC, subscriber)
+            pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+            while not handler.called:
+                await asyncio.sleep(0)
+
+        asyncio.run(asyncio.wait_for(publish_and_wait(), 5))
+
+        handler.assert_called_once_with(subscriber, SOME_MESSAGE, exception)
+
+    def test_coroutine_subscribers_without_a_loop_are_reported(self):
+        handler = Mock()
+        pubsub = Pubsub()
+        pubsub.set_exception_handler(handler)
+
+        async def subscriber(message):
+            pass
+
+        pubsub.subscribe(SOME_TOPIC, subscriber)
+        pubsub.publish(SOME_TOPIC, SOME_MESSAGE)
+
+        handler.assert_called_once_with(subscriber, SOME_MESSAGE, ANY)
+        assert_that(handler.call_args.args[2], is_(TypeError))
+
+
+class TestDispatcher(unittest.TestCase):
+    def test_dispatch_must_be_implemented(self):
+        assert_that(calling(Dispatcher), raises(TypeError))
+
 
 class TestCallbackCollector(unittest.TestCase):
     def setUp(self):
@@ -185,9 +824,68 @@ class TestCallbackCollector(unittest.TestCase):
         callback = Mock()
         callback.side_effect = Exception()
         handler = Mock()
-        self.callback_collector._pubsub.set_exception_handler(handler)
+        self.callback_collector.set_exception_handler(handler)
         source_callback = self.callback_collector.new_source()
         self.callback_collector.subscribe(callback)
 
         source_callback()
         handler.assert_called_once()
+
+    def test_source_callbacks_are_collected_once(self):
+        callback = Mock()
+        source_callback_1 = self.callback_collector.new_source()
+        self.callback_collector.new_source()
+        self.callback_collector.subscribe(callback)
+
+        source_callback_1()
+        source_callback_1()
+
+        callback.assert_not_called()
+
+    def test_subscribe_after_completion_calls_immediately(self):
+        callback = Mock()
+        source_callback = self.callback_collector.new_source()
+        source_callback()
+
+        self.callback_collector.subscribe(callback)
+
+        callback.assert_called_once_with()
+
+    def test_new_source_after_completion_raises(self):
+        self.callback_collector.new_source()()
+
+        assert_that(calling(self.callback_collector.new_source), raises(RuntimeError))
+
+    def test_wait(self):
+        source_callback = self.callback_collector.new_source()
+
+        assert_that(self.callback_collector.wait(timeout=0.01), is_(False))
+
+        source_callback()
+
+        assert_that(self.callback_collector.wait(timeout=0.01), is_(True))
+        assert_that(self.callback_collector.future.done(), is_(True))
+
+    def test_await(self):
+        source_callbacks = [self.callback_collector.new_source() for _ in range(3)]
+
+        async def collect():
+            loop = asyncio.get_running_loop()
+            for source_callback in source_callbacks:
+                loop.call_soon(source_callback)
+            await asyncio.wait_for(self.callback_collector, timeout=5)
+
+        asyncio.run(collect())
+
+    def test_concurrent_sources(self):
+        callback = Mock()
+        source_callbacks = [self.callback_collector.new_source() for _ in range(100)]
+        self.callback_collector.subscribe(callback)
+
+        threads = [threading.Thread(target=source) for source in source_callbacks]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        callback.assert_called_once_with()
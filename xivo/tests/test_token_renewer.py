@@ -1,8 +1,10 @@
-# Copyright 2015-2023 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2015-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import threading
 import unittest
-from unittest.mock import Mock
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
 
 from hamcrest import assert_that, equal_to
 
@@ -72,3 +74,92 @@ class TestTokenRenewer(unittest.TestCase):
         self.token_renewer._renew_token()
 
         callback.assert_not_called()
+
+    def test_first_token_is_resolved_after_first_renewal(self):
+        self.auth_client.token.new.side_effect = [Exception(), self.token]
+
+        self.token_renewer._renew_token()
+        assert_that(self.token_renewer.first_token.done(), equal_to(False))
+
+        self.token_renewer._renew_token()
+        assert_that(self.token_renewer.first_token.result(), equal_to(self.token))
+
+    def test_start_nowait_does_not_block_on_auth(self):
+        auth_replied = threading.Event()
+
+        def new_token(expiration):
+            assert_that(auth_replied.wait(5), equal_to(True))
+            return self.token
+
+        self.auth_client.token.new.side_effect = new_token
+
+        future = self.token_renewer.start_nowait()
+        try:
+            assert_that(future.done(), equal_to(False))
+            auth_replied.set()
+            assert_that(future.result(timeout=5), equal_to(self.token))
+        finally:
+            auth_replied.set()
+            self.token_renewer.stop()
+
+        self.auth_client.token.new.assert_called_once_with(expiration=self.expiration)
+
+    def test_first_token_is_cancelled_when_stopped_before_a_token(self):
+        self.auth_client.token.new.side_effect = Exception()
+
+        future = self.token_renewer.start_nowait()
+        self.token_renewer.stop()
+
+        assert_that(future.cancelled(), equal_to(True))
+
+    def test_first_token_is_resolved_before_callbacks(self):
+        self.auth_client.token.new.return_value = self.token
+        resolved = []
+        self.token_renewer.subscribe_to_token_change(
+            lambda _: resolved.append(self.token_renewer.first_token.done())
+        )
+
+        self.token_renewer._renew_token()
+
+        assert_that(resolved, equal_to([True]))
+
+    def test_callbacks_are_dispatched_through_the_executor(self):
+        callback = Mock()
+        self.auth_client.token.new.return_value = self.token
+        executor = ThreadPoolExecutor(max_workers=1)
+        token_renewer = TokenRenewer(
+            self.auth_client, self.expiration, callback_executor=executor
+        )
+        token_renewer.subscribe_to_token_change(callback)
+
+        token_renewer._renew_token()
+        executor.shutdown(wait=True)
+
+        callback.assert_called_once_with(self.token_id)
+
+    def test_callbacks_run_inline_once_the_executor_is_shut_down(self):
+        callback = Mock()
+        self.auth_client.token.new.return_value = self.token
+        executor = ThreadPoolExecutor(max_workers=1)
+        executor.shutdown(wait=True)
+        token_renewer = TokenRenewer(
+            self.auth_client, self.expiration, callback_executor=executor
+        )
+        token_renewer.subscribe_to_token_change(callback)
+
+        token_renewer._renew_token()
+
+        callback.assert_called_once_with(self.token_id)
+
+    @patch('xivo.token_renewer.logger')
+    def test_slow_callbacks_are_logged(self, logger):
+        callback = Mock()
+        self.auth_client.token.new.return_value = self.token
+        token_renewer = TokenRenewer(
+            self.auth_client, self.expiration, slow_callback_threshold=0
+        )
+        token_renewer.subscribe_to_token_change(callback)
+
+        token_renewer._renew_token()
+
+        logger.warning.assert_called_once()
@@ -6,8 +6,10 @@ from __future__ import annotations
 import itertools
 import logging
 import threading
+import time
 import types
 from collections.abc import Callable
+from concurrent.futures import Executor, Future, InvalidStateError
 from typing import TYPE_CHECKING, TypedDict, TypeVar
 
 import requests
@@ -35,11 +37,20 @@ class TokenRenewer:
     DEFAULT_EXPIRATION = 6 * 3_600
     _RENEW_TIME_COEFFICIENT = 0.8
 
+    DEFAULT_SLOW_CALLBACK_THRESHOLD = 1.0
+
     def __init__(
-        self, auth_client: AuthClient, expiration: int = DEFAULT_EXPIRATION
+        self,
+        auth_client: AuthClient,
+        expiration: int = DEFAULT_EXPIRATION,
+        callback_executor: Executor | None = None,
+        slow_callback_threshold: float = DEFAULT_SLOW_CALLBACK_THRESHOLD,
     ) -> None:
         self._auth_client = auth_client
         self._expiration = expiration
+        self._callback_executor = callback_executor
+        self._slow_callback_threshold = slow_callback_threshold
+        self._first_token: Future[dict[str, str]] = Future()
         self._callbacks: list[CallbackDict] = []
         self._callbacks_tmp: list[CallbackDict] = []
         self._started = False
@@ -62,12 +73,32 @@ class TokenRenewer:
         with self._callback_lock:
             self._callbacks_tmp.append({'method': callback, 'details': True})
 
+    @property
+    def first_token(self) -> Future[dict[str, str]]:
+        return self._first_token
+
     def start(self) -> None:
         if self._started:
             raise Exception('token renewer already started')
 
         self._renew_token()
+        self._start_thread()
+
+    def start_nowait(self) -> Future[dict[str, str]]:
+        """Start renewing without waiting for wazo-auth.
+
+        The first token is created on the renewer thread. The returned future
+        is resolved with the first token once it has been created, before the
+        token change callbacks are called, and is cancelled if the renewer is
+        stopped before that.
+        """
+        if self._started:
+            raise Exception('token renewer already started')
+
+        self._start_thread()
+        return self._first_token
 
+    def _start_thread(self) -> None:
         self._started = True
         self._thread = threading.Thread(target=self._run, name='token-renewer')
         self._thread.start()
@@ -76,9 +107,11 @@ class TokenRenewer:
         self._stopped.set()
         logger.debug('joining token renewer thread...')
         self._thread.join()
+        self._first_token.cancel()
 
     def emit_stop(self) -> None:
         self._stopped.set()
+        self._first_token.cancel()
 
     def _run(self) -> None:
         while True:
@@ -104,8 +137,18 @@ class TokenRenewer:
             self._handle_renewal_error(error)
         else:
             self._renew_time = self._RENEW_TIME_COEFFICIENT * self._expiration
+            self._resolve_first_token(token)
             self._notify_all(token)
 
+    def _resolve_first_token(self, token: dict[str, str]) -> None:
+        if self._first_token.done():
+            return
+        try:
+            self._first_token.set_result(token)
+        except InvalidStateError:
+            # cancelled by emit_stop() while the token was being created
+            pass
+
     def _handle_renewal_error(self, error: Exception) -> None:
         response = getattr(error, 'response', None)
         status_code = getattr(response, 'status_code', '')
@@ -123,11 +166,38 @@ class TokenRenewer:
 
         for callback in callbacks:
             payload = token if callback['details'] else token['token']
-            try:
-                callback['method'](payload)
-            except Exception:
+            if self._callback_executor:
+                try:
+                    self._callback_executor.submit(
+                        self._run_callback, callback['method'], payload
+                    )
+                    continue
+                except RuntimeError as e:
+                    # the executor was shut down, the token must still be
+                    # delivered
+                    logger.warning(
+                        'cannot submit token change callback, running it inline: %s',
+                        e,
+                    )
+            self._run_callback(callback['method'], payload)
+
+    def _run_callback(self, method: Callback, payload: dict[str, str] | str) -> None:
+        start = time.monotonic()
+        try:
+            method(payload)
+        except Exception:
+            logger.warning(
+                'unexpected exception from token change callback', exc_info=True
+            )
+        finally:
+            duration = time.monotonic() - start
+            if duration >= self._slow_callback_threshold:
                 logger.warning(
-                    'unexpected exception from token change callback', exc_info=True
+                    'token change callback %s took %.3f seconds', method, duration
+                )
+            else:
+                logger.debug(
+                    'token change callback %s took %.3f seconds', method, duration
                 )
 
     def __enter__(self: Self) -> Self: